@@ -0,0 +1,199 @@
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from fish_tracker import FishTracker, load_settings
+from frame_sources import VideoSource
+from tracker_logging import setup_logging, shutdown_logging
+
+# Runs the tracker over recorded videos as fast as the machine allows:
+#
+#   python batch_process.py sessions/*.mp4                    # every core, 5-minute chunks
+#   python batch_process.py long_session.mp4 --chunk 120 --jobs 4
+#   python batch_process.py sessions/ --output results/
+#
+# Each file is cut into chunks that are tracked in parallel, one process per core.
+# A chunk starts --warmup seconds early so the background model and the motion
+# smoothing have settled by its first frame; the warm-up frames are tracked but
+# not kept. The first chunk has nothing before it, so its opening --warmup seconds
+# are fed to the background model first, as the live tracker does at startup.
+# The chunks of a file are joined back in order and written as one columnar .npz
+# per video, one array per field and one row per frame:
+#
+#   frame, t, detected, state, confidence, x, y, vx, vy, speed, heading, size
+#
+#   data = np.load('results/session.npz')
+#   data['x'][data['detected']]   # every detected x position
+#
+# t is seconds from the start of the video, computed from its frame rate, and
+# state the tracking state number (see tracking_state.py). A chunk that fails is
+# reported and left out; the frame column shows where the gap is.
+
+COLUMNS = ('frame', 't', 'detected', 'state', 'confidence', 'x', 'y', 'vx', 'vy', 'speed', 'heading', 'size')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.m4v', '.webm')
+
+def find_videos(paths):
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            videos.extend(sorted(p for p in glob.glob(os.path.join(path, '*'))
+                                 if p.lower().endswith(VIDEO_EXTENSIONS)))
+        else:
+            videos.append(path)
+    return videos
+
+def video_info(path):
+    """(frame_count, fps, width, height), or None if the file can't be opened."""
+    source = VideoSource(path)
+    if not source.open():
+        return None
+    info = (source.frame_count, source.fps, source.width, source.height)
+    source.release()
+    return info
+
+def plan_chunks(frame_count, fps, chunk_seconds):
+    """[(first_frame, end_frame)] covering the video; end_frame None = to the end."""
+    chunk_frames = int(chunk_seconds * fps)
+    if chunk_frames <= 0 or frame_count <= 0 or frame_count <= chunk_frames:
+        return [(0, None)]
+    return [(start, min(start + chunk_frames, frame_count)) for start in range(0, frame_count, chunk_frames)]
+
+def track_chunk(path, first_frame, end_frame, warmup_frames, settings):
+    """Track frames [first_frame, end_frame) of one video. Runs in a worker process."""
+    # One OpenCV thread per process: the pool already uses every core
+    cv2.setNumThreads(1)
+
+    start = max(first_frame - warmup_frames, 0)
+    source = VideoSource(path, start_frame=start)
+    if not source.open():
+        return None
+    tracker = FishTracker(settings, source.width, source.height)
+    if start == 0 and warmup_frames:
+        learn_opening(path, warmup_frames, tracker)
+
+    rows = {name: [] for name in COLUMNS}
+    index = start
+    while end_frame is None or index < end_frame:
+        ok, frame, t = source.read()
+        if not ok:
+            break
+        result = tracker.process(frame, t)
+        if index >= first_frame:
+            position = result['position']
+            rows['frame'].append(index)
+            rows['t'].append(t)
+            rows['detected'].append(result['detected'])
+            rows['state'].append(result['fish'][0]['state'])
+            rows['confidence'].append(result['confidence'])
+            for name in COLUMNS[5:]:
+                rows[name].append(position[name])
+        index += 1
+    source.release()
+
+    columns = {name: np.asarray(values, dtype=np.float32) for name, values in rows.items()}
+    columns['frame'] = columns['frame'].astype(np.int64)
+    columns['t'] = np.asarray(rows['t'], dtype=np.float64)
+    columns['detected'] = columns['detected'].astype(bool)
+    columns['state'] = columns['state'].astype(np.uint8)
+    return columns
+
+def learn_opening(path, frames, tracker):
+    """Feed the first frames of a video to the tracker's background model only."""
+    source = VideoSource(path)
+    if not source.open():
+        return
+    for _ in range(frames):
+        ok, frame, _ = source.read()
+        if not ok:
+            break
+        tracker.learn_background(frame)
+    source.release()
+
+def main():
+    parser = argparse.ArgumentParser(description="Track the fish in recorded videos using every core")
+    parser.add_argument('paths', nargs='+', help="Video files or folders of videos")
+    parser.add_argument('--output', default='batch_results', help="Folder for the .npz results")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help="Worker processes (default: all cores)")
+    parser.add_argument('--chunk', type=float, default=300.0,
+                        help="Seconds of video per work item (0 = whole files)")
+    parser.add_argument('--warmup', type=float, default=5.0,
+                        help="Seconds tracked before each chunk to settle the background model")
+    parser.add_argument('--compress', action='store_true', help="Write compressed .npz files")
+    args = parser.parse_args()
+
+    # Console only, for the tracker's own messages while loading the settings
+    setup_logging()
+    try:
+        settings = load_settings()
+    except FileNotFoundError as e:
+        print(f"❌ Configuration file not found: {e}")
+        return
+    finally:
+        shutdown_logging()
+
+    videos = find_videos(args.paths)
+    work = []
+    for path in videos:
+        info = video_info(path)
+        if info is None:
+            print(f"⚠️ Skipping {path}: can't be opened")
+            continue
+        frame_count, fps, width, height = info
+        camera = settings['camera']
+        if settings['tank_area'] and (width, height) != (camera['width'], camera['height']):
+            print(f"⚠️ {path} is {width}x{height} but the tank area was calibrated at "
+                  f"{camera['width']}x{camera['height']}")
+        for first, end in plan_chunks(frame_count, fps, args.chunk):
+            work.append((path, first, end, int(args.warmup * fps)))
+    if not work:
+        print("❌ No videos to process")
+        return
+
+    os.makedirs(args.output, exist_ok=True)
+    print(f"🔍 {len(videos)} video(s) in {len(work)} chunk(s) on {args.jobs} process(es)")
+
+    started = time.perf_counter()
+    chunks = {}
+    failed = set()  # Videos written without some of their chunks
+    total_frames = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(track_chunk, *item, settings) for item in work]
+        # Collect in submission order; a video is written once its last chunk is in
+        for i, (item, future) in enumerate(zip(work, futures)):
+            path, first, end = item[:3]
+            try:
+                columns = future.result()
+            except Exception as e:
+                print(f"❌ {path}: frames {first}-{'end' if end is None else end - 1} failed: {e}")
+                failed.add(path)
+                columns = None
+            if columns is not None:
+                chunks.setdefault(path, []).append(columns)
+            if i + 1 < len(work) and work[i + 1][0] == path:
+                continue
+            parts = chunks.pop(path, None)
+            if not parts:
+                print(f"❌ {path}: no frames could be read")
+                continue
+            joined = {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+            name = os.path.splitext(os.path.basename(path))[0] + '.npz'
+            (np.savez_compressed if args.compress else np.savez)(os.path.join(args.output, name), **joined)
+            frames = len(joined['frame'])
+            total_frames += frames
+            detected = 100 * joined['detected'].mean() if frames else 0
+            if path in failed:
+                print(f"⚠️ {path}: {frames} frames (incomplete), fish detected in {detected:.0f}% -> "
+                      f"{os.path.join(args.output, name)}")
+            else:
+                print(f"✅ {path}: {frames} frames, fish detected in {detected:.0f}% -> {os.path.join(args.output, name)}")
+
+    elapsed = time.perf_counter() - started
+    print(f"\n{total_frames} frames in {elapsed:.1f} s = {total_frames / elapsed:.0f} frames/s")
+
+if __name__ == "__main__":
+    main()
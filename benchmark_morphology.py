@@ -0,0 +1,156 @@
+import argparse
+import configparser
+import math
+import os
+import time
+
+import cv2
+import numpy as np
+
+from blob_analysis import analyze_blobs
+from mask_morphology import MaskFilter, load_morphology_settings
+
+# Times every mask clean-up variant and compares it with the legacy chain
+# (GaussianBlur + erode + dilate) on the same detection masks:
+#
+#   python benchmark_morphology.py                    # synthetic fish over a noisy background
+#   python benchmark_morphology.py --video tank.mp4   # masks from a recording of the tank
+#   python benchmark_morphology.py --camera           # masks from the configured camera
+#
+# The masks are made the way fish_tracker.py makes them (tank area, MOG2, HSV
+# thresholds from config.ini). For each variant the report shows the time per
+# frame, the overlap (IoU) with the legacy mask, how often it finds a fish when
+# the legacy chain does and doesn't, and how far the fish's centroid moves.
+
+config = configparser.ConfigParser()
+config.read(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini'))
+
+def detection_masks(frames, count):
+    """Red-and-moving masks for up to count frames, after 30 frames of background learning."""
+    lower1 = np.array([config.getint('Detection', 'h_low1', fallback=0), config.getint('Detection', 's_low', fallback=100),
+                       config.getint('Detection', 'v_low', fallback=100)])
+    upper1 = np.array([config.getint('Detection', 'h_high1', fallback=10), config.getint('Detection', 's_high', fallback=255),
+                       config.getint('Detection', 'v_high', fallback=255)])
+    lower2 = np.array([config.getint('Detection', 'h_low2', fallback=160), lower1[1], lower1[2]])
+    upper2 = np.array([config.getint('Detection', 'h_high2', fallback=180), upper1[1], upper1[2]])
+    bg_subtractor = cv2.createBackgroundSubtractorMOG2(history=200, varThreshold=25, detectShadows=False)
+
+    masks = []
+    for i, frame in enumerate(frames):
+        fg_mask = bg_subtractor.apply(frame)
+        if i < 30:
+            continue
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        red_mask = cv2.bitwise_or(cv2.inRange(hsv, lower1, upper1), cv2.inRange(hsv, lower2, upper2))
+        masks.append(cv2.bitwise_and(red_mask, fg_mask))
+        if len(masks) >= count:
+            break
+    return masks
+
+def synthetic_frames(width=640, height=480):
+    """A red fish swimming loops over a textured background, with sensor noise and glints."""
+    rng = np.random.default_rng(0)
+    background = cv2.GaussianBlur(rng.integers(60, 120, (height, width, 3), dtype=np.uint8), (9, 9), 0)
+    i = 0
+    while True:
+        frame = background.copy()
+        t = i * 0.05
+        center = (int(width / 2 + width / 5 * math.cos(t)), int(height / 2 + height / 6 * math.sin(2 * t)))
+        cv2.ellipse(frame, center, (30, 12), math.degrees(t) + 90, 0, 360, (60, 20, 200), -1)
+        noise = rng.normal(0, 6, frame.shape)
+        frame = np.clip(frame + noise, 0, 255).astype(np.uint8)
+        # Reddish specular flecks that the clean-up should remove
+        for _ in range(20):
+            x, y = rng.integers(0, width), rng.integers(0, height)
+            cv2.circle(frame, (int(x), int(y)), int(rng.integers(1, 3)), (70, 40, 210), -1)
+        yield frame
+        i += 1
+
+def capture_frames(source):
+    cap = cv2.VideoCapture(source)
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame
+    cap.release()
+
+def largest_blob(mask, min_area, max_area):
+    blobs = analyze_blobs(mask)
+    valid = np.flatnonzero((blobs['area'] > min_area) & (blobs['area'] < max_area))
+    if not len(valid):
+        return None
+    return blobs['centroid'][valid[np.argmax(blobs['area'][valid])]]
+
+def variants(base):
+    """(name, settings) for the legacy chain and the alternatives worth comparing."""
+    yield "legacy (current)", dict(base, morphology='legacy', mask_scale=1.0)
+    for mode in ('open', 'open_close'):
+        for prefilter in ('none', 'median', 'box'):
+            yield f"{mode} + {prefilter}", dict(base, morphology=mode, prefilter=prefilter, mask_scale=1.0)
+    for mode in ('legacy', 'open', 'open_close'):
+        yield f"{mode} at 0.5x", dict(base, morphology=mode, prefilter='none', mask_scale=0.5)
+    yield "open_close + median at 0.5x", dict(base, morphology='open_close', prefilter='median', mask_scale=0.5)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the mask clean-up variants against the legacy chain")
+    parser.add_argument('--video', help="Video file to take detection masks from")
+    parser.add_argument('--camera', action='store_true', help="Take detection masks from the configured camera")
+    parser.add_argument('--frames', type=int, default=300, help="Masks to benchmark")
+    parser.add_argument('--repeat', type=int, default=3, help="Timing passes over the masks")
+    args = parser.parse_args()
+
+    if args.video:
+        frames = capture_frames(args.video)
+    elif args.camera:
+        frames = capture_frames(config.getint('Camera', 'camera_index', fallback=0))
+    else:
+        frames = synthetic_frames()
+    masks = detection_masks(frames, args.frames)
+    if not masks:
+        print("❌ No frames to benchmark")
+        return
+    height, width = masks[0].shape
+    min_area = config.getint('Detection', 'min_contour_area', fallback=300)
+    max_area = config.getint('Detection', 'max_contour_area', fallback=10000)
+    base = load_morphology_settings(config)
+    print(f"🔍 {len(masks)} masks at {width}x{height}, {args.repeat} timing passes\n")
+
+    reference = None
+    print(f"{'variant':30} {'ms/frame':>9} {'p99':>7} {'speedup':>8} {'IoU':>6} {'agree':>6} {'centroid px':>12}")
+    for name, settings in variants(base):
+        mask_filter = MaskFilter(width, height, settings)
+        outputs = [mask_filter.apply(mask).copy() for mask in masks]
+
+        timings = []
+        for _ in range(args.repeat):
+            for mask in masks:
+                start = time.perf_counter()
+                mask_filter.apply(mask)
+                timings.append(time.perf_counter() - start)
+        median_ms = float(np.median(timings)) * 1000
+        p99_ms = float(np.percentile(timings, 99)) * 1000
+        centroids = [largest_blob(out, min_area, max_area) for out in outputs]
+
+        if reference is None:
+            reference = (outputs, centroids, median_ms)
+            print(f"{name:30} {median_ms:9.3f} {p99_ms:7.3f} {'1.00x':>8} {'-':>6} {'-':>6} {'-':>12}")
+            continue
+
+        ref_outputs, ref_centroids, ref_ms = reference
+        ious = []
+        for out, ref in zip(outputs, ref_outputs):
+            union = np.count_nonzero(out | ref)
+            ious.append(np.count_nonzero(out & ref) / union if union else 1.0)
+        agree = np.mean([(a is None) == (b is None) for a, b in zip(centroids, ref_centroids)])
+        shifts = [float(np.hypot(*(a - b))) for a, b in zip(centroids, ref_centroids)
+                  if a is not None and b is not None]
+        shift = f"{np.mean(shifts):.2f}" if shifts else "n/a"
+        print(f"{name:30} {median_ms:9.3f} {p99_ms:7.3f} {ref_ms / median_ms:7.2f}x "
+              f"{np.mean(ious):6.3f} {100 * agree:5.0f}% {shift:>12}")
+
+    print("\nagree = frames where the variant and the legacy chain both find a fish or both don't.")
+    print("Pick a variant with [Detection] morphology / prefilter / kernel_shape / kernel_size / mask_scale.")
+
+if __name__ == "__main__":
+    main()
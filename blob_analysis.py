@@ -0,0 +1,72 @@
+import cv2
+import numpy as np
+
+def analyze_blobs(mask, labels=None):
+    """Measure every blob in a mask in one pass.
+
+    Any non-zero pixel counts as foreground (the same rule findContours uses).
+    Returns a dict of NumPy arrays with one row per blob:
+      area        - pixel count
+      centroid    - (N, 2) true centroid (x, y), sub-pixel
+      bbox        - (N, 4) bounding box as x, y, w, h
+      orientation - angle of the major axis in radians, in (-pi/2, pi/2]
+      major_axis, minor_axis - lengths of the equivalent ellipse axes in pixels
+    labels is an optional preallocated int32 buffer the size of the mask.
+    """
+    count, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, labels=labels, connectivity=8)
+
+    # Label 0 is the background
+    area = stats[1:, cv2.CC_STAT_AREA].astype(np.float64)
+    bbox = stats[1:, :4]
+    centroid = centroids[1:]
+    n = count - 1
+
+    # Second-order central moments from a single pass over the foreground pixels
+    ys, xs = np.nonzero(labels)
+    blob_ids = labels[ys, xs] - 1
+    if n > 0:
+        dx = xs - centroid[blob_ids, 0]
+        dy = ys - centroid[blob_ids, 1]
+        mu20 = np.bincount(blob_ids, weights=dx * dx, minlength=n) / area
+        mu02 = np.bincount(blob_ids, weights=dy * dy, minlength=n) / area
+        mu11 = np.bincount(blob_ids, weights=dx * dy, minlength=n) / area
+    else:
+        mu20 = mu02 = mu11 = np.zeros(0)
+
+    orientation = 0.5 * np.arctan2(2 * mu11, mu20 - mu02)
+
+    # Eigenvalues of the covariance matrix give the ellipse axes
+    common = np.sqrt(((mu20 - mu02) / 2) ** 2 + mu11 ** 2)
+    major_axis = 4 * np.sqrt(np.maximum((mu20 + mu02) / 2 + common, 0))
+    minor_axis = 4 * np.sqrt(np.maximum((mu20 + mu02) / 2 - common, 0))
+
+    return {
+        'count': n,
+        'area': area,
+        'centroid': centroid,
+        'bbox': bbox,
+        'orientation': orientation,
+        'major_axis': major_axis,
+        'minor_axis': minor_axis
+    }
+
+def apply_homography(points, M):
+    """Apply a 3x3 perspective matrix to an (N, 2) array of points in one matrix multiply."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    projected = points @ M[:2, :2].T + M[:2, 2]
+    w = points @ M[2, :2] + M[2, 2]
+    return projected / w[:, None]
+
+def sample_point_map(point_map, points):
+    """Bilinear lookup of an (H, W, 2) coordinate table at (N, 2) sub-pixel points."""
+    h, w = point_map.shape[:2]
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    x = np.clip(points[:, 0], 0, w - 1)
+    y = np.clip(points[:, 1], 0, h - 1)
+    x0 = np.minimum(x.astype(np.intp), w - 2)
+    y0 = np.minimum(y.astype(np.intp), h - 2)
+    fx = (x - x0)[:, None]
+    fy = (y - y0)[:, None]
+    top = point_map[y0, x0] * (1 - fx) + point_map[y0, x0 + 1] * fx
+    bottom = point_map[y0 + 1, x0] * (1 - fx) + point_map[y0 + 1, x0 + 1] * fx
+    return top * (1 - fy) + bottom * fy
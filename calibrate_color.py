@@ -3,6 +3,9 @@ import numpy as np
 import os
 import sys
 import configparser
+from blob_analysis import analyze_blobs
+from camera_capture import load_camera_settings, open_camera
+from tracker_logging import setup_logging
 
 def nothing(x):
     pass
@@ -11,6 +14,9 @@ print("🐠 Fish Tank Calibration Tool 🐠")
 print("===============================")
 print("This tool helps your camera find the red fish.")
 
+# Camera messages (camera_capture.py) go to the console
+setup_logging()
+
 # Read settings file
 config = configparser.ConfigParser()
 config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini')
@@ -80,9 +86,9 @@ except ValueError:
 
 # Initialize camera
 print(f"\nStarting camera #{CAMERA_INDEX}...")
-cap = cv2.VideoCapture(CAMERA_INDEX)
+cap = open_camera(dict(load_camera_settings(config), camera_index=CAMERA_INDEX))
 
-if not cap.isOpened():
+if cap is None:
     print(f"❌ Camera #{CAMERA_INDEX} not found or can't be opened.")
     print("Tips:")
     print("- Make sure camera is connected")
@@ -92,10 +98,6 @@ if not cap.isOpened():
 
 print("✓ Camera working!")
 
-# Set camera resolution
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
-
 # Create windows with friendly names
 cv2.namedWindow('Original Image')
 cv2.namedWindow('Fish Detection Mask')
@@ -212,24 +214,21 @@ while True:
     if dilate_iter > 0:
         mask = cv2.dilate(mask, kernel, iterations=dilate_iter)
     
-    # Find contours in the mask (detected objects)
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    # Measure the objects in the mask (same blob analysis as the tracker)
+    blobs = analyze_blobs(mask)
     
     # Create a copy of the original frame to draw on
     result = frame.copy()
     
     # Check for fish-sized objects
-    valid_contours = []
-    if contours:
-        valid_contours = [c for c in contours if min_area < cv2.contourArea(c) < max_area]
-        
-        # Draw boxes around detected fish
-        for contour in valid_contours:
-            x, y, w, h = cv2.boundingRect(contour)
-            cv2.rectangle(result, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            area = cv2.contourArea(contour)
-            cv2.putText(result, f"Fish detected! Size: {area:.0f}", (x, y-10), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+    valid_blobs = np.flatnonzero((blobs['area'] > min_area) & (blobs['area'] < max_area))
+    
+    # Draw boxes around detected fish
+    for i in valid_blobs:
+        x, y, w, h = (int(v) for v in blobs['bbox'][i])
+        cv2.rectangle(result, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        cv2.putText(result, f"Fish detected! Size: {blobs['area'][i]:.0f}", (x, y-10), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
     
     # Add helpful instructions on screen
     cv2.putText(result, "FISH TANK CALIBRATION", (10, 25), 
@@ -247,8 +246,8 @@ while True:
                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
     
     # Add calibration summary
-    if len(valid_contours) > 0:
-        calibration_status = f"✓ Found {len(valid_contours)} fish-like objects"
+    if len(valid_blobs) > 0:
+        calibration_status = f"✓ Found {len(valid_blobs)} fish-like objects"
         status_color = (0, 255, 0)  # Green
     else:
         calibration_status = "❌ No fish detected - adjust sliders"
@@ -314,15 +313,13 @@ while True:
             CAMERA_INDEX = int(new_index)
             
             print(f"→ Trying camera #{CAMERA_INDEX}...")
-            cap = cv2.VideoCapture(CAMERA_INDEX)
-            if not cap.isOpened():
+            cap = open_camera(dict(load_camera_settings(config), camera_index=CAMERA_INDEX))
+            if cap is None:
                 print(f"❌ Camera #{CAMERA_INDEX} not found. Returning to previous camera.")
                 CAMERA_INDEX = config.getint('Camera', 'camera_index')
-                cap = cv2.VideoCapture(CAMERA_INDEX)
+                cap = open_camera(dict(load_camera_settings(config), camera_index=CAMERA_INDEX))
             else:
                 print(f"✓ Camera #{CAMERA_INDEX} working!")
-                cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
-                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
             
             # Recreate windows
             cv2.namedWindow('Original Image')
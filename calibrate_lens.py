@@ -0,0 +1,165 @@
+import cv2
+import numpy as np
+import glob
+import os
+import sys
+import configparser
+from camera_capture import load_camera_settings, open_camera
+from tracker_logging import setup_logging
+
+print("🔭 Lens Distortion Calibration Tool 🔭")
+print("=====================================")
+print("This tool measures how much your camera lens bends straight lines,")
+print("so the fish tracker can correct positions near the tank edges.")
+
+# Camera messages (camera_capture.py) go to the console
+setup_logging()
+
+# Read settings file
+config = configparser.ConfigParser()
+config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini')
+config.read(config_file)
+
+CAMERA_INDEX = config.getint('Camera', 'camera_index', fallback=0)
+
+# Checkerboard size counts INNER corners (a board of 10x7 squares has 9x6 inner corners)
+BOARD_COLS = config.getint('Lens', 'board_cols', fallback=9)
+BOARD_ROWS = config.getint('Lens', 'board_rows', fallback=6)
+
+# Folder with saved checkerboard photos (can be given on the command line)
+image_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lens_images')
+
+def capture_images():
+    """Save checkerboard photos from the camera into image_dir."""
+    os.makedirs(image_dir, exist_ok=True)
+
+    print(f"\nStarting camera #{CAMERA_INDEX}...")
+    cap = open_camera(load_camera_settings(config))
+    if cap is None:
+        print(f"❌ Camera #{CAMERA_INDEX} not found or can't be opened.")
+        sys.exit(1)
+
+    print("\n📸 Hold the printed checkerboard in front of the camera.")
+    print("- Press SPACE to save a photo (move the board around: corners, edges, tilted)")
+    print("- Press 'Q' when you have 10-20 photos")
+
+    saved = len(glob.glob(os.path.join(image_dir, '*.jpg')))
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            print("❌ Can't get image from camera")
+            break
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        found, corners = cv2.findChessboardCorners(gray, (BOARD_COLS, BOARD_ROWS),
+                                                   cv2.CALIB_CB_FAST_CHECK)
+
+        display = frame.copy()
+        if found:
+            cv2.drawChessboardCorners(display, (BOARD_COLS, BOARD_ROWS), corners, found)
+        cv2.putText(display, f"Saved: {saved}  SPACE = save, Q = done", (10, 30),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0) if found else (0, 0, 255), 2)
+        cv2.imshow('Lens Calibration', display)
+
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord(' '):
+            if found:
+                path = os.path.join(image_dir, f"board_{saved:03d}.jpg")
+                cv2.imwrite(path, frame)
+                saved += 1
+                print(f"✓ Saved {path}")
+            else:
+                print("⚠️ Checkerboard not visible - photo not saved")
+        elif key == ord('q') or key == ord('Q'):
+            break
+
+    cap.release()
+    cv2.destroyAllWindows()
+
+# Collect photos, offering to take some if there are none yet
+image_paths = sorted(glob.glob(os.path.join(image_dir, '*.jpg')) + glob.glob(os.path.join(image_dir, '*.png')))
+if not image_paths:
+    print(f"\nNo checkerboard photos found in {image_dir}")
+    answer = input("Take some now with the camera? (y/n): ")
+    if answer.strip().lower() != 'y':
+        sys.exit(0)
+    capture_images()
+    image_paths = sorted(glob.glob(os.path.join(image_dir, '*.jpg')))
+
+# Find the checkerboard corners in every photo
+print(f"\n🔍 Looking for a {BOARD_COLS}x{BOARD_ROWS} checkerboard in {len(image_paths)} photos...")
+
+board_points = np.zeros((BOARD_ROWS * BOARD_COLS, 3), np.float32)
+board_points[:, :2] = np.mgrid[0:BOARD_COLS, 0:BOARD_ROWS].T.reshape(-1, 2)
+
+object_points = []
+image_points = []
+image_size = None
+criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+for path in image_paths:
+    image = cv2.imread(path)
+    if image is None:
+        print(f"⚠️ Can't read {path}")
+        continue
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if image_size is None:
+        image_size = gray.shape[::-1]
+    elif gray.shape[::-1] != image_size:
+        print(f"⚠️ Skipping {path}: size {gray.shape[::-1]} differs from {image_size}")
+        continue
+
+    found, corners = cv2.findChessboardCorners(gray, (BOARD_COLS, BOARD_ROWS), None)
+    if found:
+        corners = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
+        object_points.append(board_points)
+        image_points.append(corners)
+        print(f"✓ {os.path.basename(path)}")
+    else:
+        print(f"✗ {os.path.basename(path)} - checkerboard not found")
+
+if len(image_points) < 5:
+    print(f"\n❌ Only {len(image_points)} usable photos. Need at least 5 (10-20 is better).")
+    sys.exit(1)
+
+# Solve for the camera matrix and distortion coefficients
+rms, camera_matrix, dist_coeffs, _, _ = cv2.calibrateCamera(object_points, image_points, image_size, None, None)
+k1, k2, p1, p2, k3 = dist_coeffs.ravel()[:5]
+
+print(f"\n📐 Calibration finished using {len(image_points)} photos")
+print(f"Reprojection error: {rms:.3f} pixels (below 0.5 is very good, above 1.0 retake photos)")
+print(f"Focal length: fx={camera_matrix[0, 0]:.1f}, fy={camera_matrix[1, 1]:.1f}")
+print(f"Distortion: k1={k1:.4f}, k2={k2:.4f}, p1={p1:.4f}, p2={p2:.4f}, k3={k3:.4f}")
+
+answer = input("\nSave this lens calibration to config.ini? (y/n): ")
+if answer.strip().lower() == 'y':
+    try:
+        if 'Lens' not in config:
+            config.add_section('Lens')
+
+        config['Lens']['enabled'] = 'true'
+        config['Lens']['board_cols'] = str(BOARD_COLS)
+        config['Lens']['board_rows'] = str(BOARD_ROWS)
+        config['Lens']['image_width'] = str(image_size[0])
+        config['Lens']['image_height'] = str(image_size[1])
+        config['Lens']['fx'] = f"{camera_matrix[0, 0]:.6f}"
+        config['Lens']['fy'] = f"{camera_matrix[1, 1]:.6f}"
+        config['Lens']['cx'] = f"{camera_matrix[0, 2]:.6f}"
+        config['Lens']['cy'] = f"{camera_matrix[1, 2]:.6f}"
+        config['Lens']['k1'] = f"{k1:.8f}"
+        config['Lens']['k2'] = f"{k2:.8f}"
+        config['Lens']['p1'] = f"{p1:.8f}"
+        config['Lens']['p2'] = f"{p2:.8f}"
+        config['Lens']['k3'] = f"{k3:.8f}"
+        config['Lens']['rms_error'] = f"{rms:.4f}"
+
+        with open(config_file, 'w') as f:
+            config.write(f)
+
+        print("\n✅ Lens calibration saved!")
+        print("→ Re-run calibrate_tank_area.py if the tank corners look off, then start the tracker.")
+    except Exception as e:
+        print(f"\n❌ Error saving calibration: {e}")
+else:
+    print("\n→ Exiting without saving.")
@@ -4,6 +4,8 @@ import json
 import os
 import configparser
 import sys
+from camera_capture import load_camera_settings, open_camera
+from tracker_logging import setup_logging
 
 # Global variables
 points = []  # To store the 4 corner points
@@ -12,6 +14,9 @@ drawing = False  # Flag for drawing reference lines
 frame_copy = None  # Copy of the current frame for drawing
 tank_area_defined = False  # Flag to check if tank area is defined
 
+# Camera messages (camera_capture.py) go to the console
+setup_logging()
+
 # Read configuration
 config = configparser.ConfigParser()
 config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini')
@@ -87,9 +92,9 @@ except ValueError:
 
 # Initialize camera
 print(f"\nStarting camera #{CAMERA_INDEX}...")
-cap = cv2.VideoCapture(CAMERA_INDEX)
+cap = open_camera(dict(load_camera_settings(config), camera_index=CAMERA_INDEX))
 
-if not cap.isOpened():
+if cap is None:
     print(f"❌ Camera #{CAMERA_INDEX} not found or can't be opened.")
     print("Tips:")
     print("- Make sure camera is connected")
@@ -99,10 +104,6 @@ if not cap.isOpened():
 
 print("✓ Camera working!")
 
-# Set camera resolution
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
-
 # Create a named window
 cv2.namedWindow('Fish Tank Calibration')
 
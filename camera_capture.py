@@ -0,0 +1,189 @@
+import logging
+import platform
+
+import cv2
+
+log = logging.getLogger('camera_capture')
+
+# Opens the camera with the capture settings from the [Camera] section:
+#
+#   fourcc       pixel format to ask for (MJPG, YUYV, ...), empty = driver default
+#   fps          frame rate to ask for, 0 = driver default
+#   buffer_size  frames the driver may queue, 1 = always the newest frame, 0 = default
+#   backend      auto, v4l2, gstreamer, dshow, msmf or avfoundation
+#   stall_timeout, reconnect_delay, reconnect_max_delay
+#                seconds without frames before the camera is reopened, and the
+#                backoff between attempts (see frame_sources.SupervisedSource)
+#
+# Drivers silently ignore what they can't do, so every setting is read back and
+# the granted mode is logged. If the camera delivers no frames in the requested
+# mode, it is reopened with the driver defaults.
+
+BACKENDS = {
+    'auto': cv2.CAP_ANY,
+    'v4l2': cv2.CAP_V4L2,
+    'gstreamer': cv2.CAP_GSTREAMER,
+    'dshow': cv2.CAP_DSHOW,
+    'msmf': cv2.CAP_MSMF,
+    'avfoundation': cv2.CAP_AVFOUNDATION
+}
+
+def load_camera_settings(config):
+    """Capture settings from a ConfigParser, with defaults for keys older configs lack."""
+    return {
+        'camera_index': config.getint('Camera', 'camera_index', fallback=0),
+        'width': config.getint('Camera', 'width', fallback=640),
+        'height': config.getint('Camera', 'height', fallback=480),
+        'fourcc': config.get('Camera', 'fourcc', fallback='').strip().upper(),
+        'fps': config.getfloat('Camera', 'fps', fallback=0),
+        'buffer_size': config.getint('Camera', 'buffer_size', fallback=0),
+        'backend': config.get('Camera', 'backend', fallback='auto').strip().lower(),
+        'stall_timeout': config.getfloat('Camera', 'stall_timeout', fallback=2.0),
+        'reconnect_delay': config.getfloat('Camera', 'reconnect_delay', fallback=0.5),
+        'reconnect_max_delay': config.getfloat('Camera', 'reconnect_max_delay', fallback=10.0)
+    }
+
+def fourcc_to_str(value):
+    value = int(value)
+    return "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4)).strip('\0 ') or "?"
+
+def choose_mode(settings):
+    """Adjust fourcc/fps to a mode list_cameras.py found the camera supports.
+
+    Without an inventory entry the settings are used as they are. With one, a
+    requested frame rate the format can't reach at this resolution switches to a
+    format that can (e.g. YUYV 640x480 only does 15 fps but MJPG does 30).
+    """
+    try:
+        from list_cameras import find_camera
+        camera = find_camera(settings['camera_index'])
+    except Exception:
+        camera = None
+    if not camera or not camera.get('modes') or not settings['fps']:
+        return settings
+
+    candidates = [mode for mode in camera['modes']
+                  if mode['width'] == settings['width'] and mode['height'] == settings['height']
+                  and any(fps >= settings['fps'] - 0.5 for fps in mode['fps'])]
+    if not candidates or any(mode['fourcc'] == settings['fourcc'] for mode in candidates):
+        return settings
+
+    # Prefer MJPG (low USB bandwidth), then whatever else reaches the frame rate
+    candidates.sort(key=lambda mode: mode['fourcc'] != 'MJPG')
+    log.info("%s can't do %g fps at %dx%d, using %s", settings['fourcc'] or 'Default format', settings['fps'],
+             settings['width'], settings['height'], candidates[0]['fourcc'], extra={'key': 'camera_capture:mode'})
+    return dict(settings, fourcc=candidates[0]['fourcc'])
+
+def gstreamer_pipeline(settings):
+    """Low-latency V4L2 pipeline: appsink keeps only the newest buffer_size frames."""
+    caps = f"width={settings['width']},height={settings['height']}"
+    if settings['fps']:
+        caps += f",framerate={int(settings['fps'])}/1"
+    if settings['fourcc'] == 'MJPG':
+        source = f"image/jpeg,{caps} ! jpegdec"
+    else:
+        source = f"video/x-raw,{caps}"
+    buffers = settings['buffer_size'] or 1
+    return (f"v4l2src device=/dev/video{settings['camera_index']} ! {source} ! videoconvert ! "
+            f"video/x-raw,format=BGR ! appsink drop=true max-buffers={buffers} sync=false")
+
+def _configure(cap, settings):
+    # The format has to be set before the size for V4L2 to apply both
+    if settings['fourcc']:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*settings['fourcc']))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, settings['width'])
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, settings['height'])
+    if settings['fps']:
+        cap.set(cv2.CAP_PROP_FPS, settings['fps'])
+    if settings['buffer_size']:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, settings['buffer_size'])
+
+def _open(settings, backend):
+    if backend == 'gstreamer' and platform.system() == 'Linux':
+        return cv2.VideoCapture(gstreamer_pipeline(settings), cv2.CAP_GSTREAMER), False
+    return cv2.VideoCapture(settings['camera_index'], BACKENDS.get(backend, cv2.CAP_ANY)), True
+
+def enable_raw_yuyv(cap):
+    """Switch a YUYV capture to raw frames (CAP_PROP_CONVERT_RGB off).
+
+    Returns True if the camera now delivers 2-byte-per-pixel YUYV frames; otherwise
+    conversion is switched back on and False is returned.
+    """
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC)) == 'YUYV' and cap.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+        ret, frame = cap.read()
+        if ret and frame.size == width * height * 2:
+            log.info("Using raw YUYV frames (no BGR conversion)", extra={'key': 'camera_capture:raw_yuyv'})
+            return True
+    cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+    log.info("Camera can't deliver raw YUYV frames, converting to BGR", extra={'key': 'camera_capture:raw_yuyv'})
+    return False
+
+def describe_capture(cap):
+    """The mode the driver actually granted."""
+    try:
+        backend = cap.getBackendName()
+    except Exception:
+        backend = "?"
+    return {
+        'backend': backend,
+        'fourcc': fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC)),
+        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'fps': cap.get(cv2.CAP_PROP_FPS),
+        'buffer_size': int(cap.get(cv2.CAP_PROP_BUFFERSIZE))
+    }
+
+def open_camera(settings):
+    """Open and configure the camera. Returns the VideoCapture, or None if it can't be opened.
+
+    Tries the configured backend first and the default one after it; if frames
+    don't arrive in the requested format and frame rate, falls back to the
+    driver's defaults at the requested resolution.
+    """
+    settings = choose_mode(settings)
+    backends = [settings['backend']] + (['auto'] if settings['backend'] != 'auto' else [])
+
+    for backend in backends:
+        if backend not in BACKENDS:
+            log.warning("Unknown camera backend '%s', using auto", backend, extra={'key': 'camera_capture:backend'})
+            continue
+
+        attempts = [settings]
+        if settings['fourcc'] or settings['fps']:
+            attempts.append(dict(settings, fourcc='', fps=0))
+
+        for attempt in attempts:
+            cap, configurable = _open(attempt, backend)
+            if not cap.isOpened():
+                cap.release()
+                break  # Backend unavailable; the next attempt wouldn't help
+            if configurable:
+                _configure(cap, attempt)
+
+            ret, _ = cap.read()
+            if ret:
+                granted = describe_capture(cap)
+                log.info("Camera %d via %s: %s %dx%d @ %g fps, buffer %s", settings['camera_index'],
+                         granted['backend'], granted['fourcc'], granted['width'], granted['height'], granted['fps'],
+                         granted['buffer_size'] or 'default',
+                         extra={'key': 'camera_capture:granted', 'fields': {'camera': granted}})
+                if attempt is not settings:
+                    log.warning("Requested %s @ %g fps delivered no frames, using driver defaults",
+                                settings['fourcc'] or 'default format', settings['fps'],
+                                extra={'key': 'camera_capture:fallback'})
+                elif settings['fourcc'] and granted['fourcc'] not in ('?', settings['fourcc']):
+                    log.warning("Requested %s, driver chose %s", settings['fourcc'], granted['fourcc'],
+                                extra={'key': 'camera_capture:fourcc'})
+                if settings['fps'] and granted['fps'] and abs(granted['fps'] - settings['fps']) > 0.5:
+                    log.warning("Requested %g fps, driver reports %g fps", settings['fps'], granted['fps'],
+                                extra={'key': 'camera_capture:fps'})
+                return cap
+            cap.release()
+
+        if backend != 'auto':
+            log.warning("Could not get frames from camera %d via %s, trying auto", settings['camera_index'], backend,
+                        extra={'key': 'camera_capture:backend'})
+
+    return None
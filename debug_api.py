@@ -1,9 +1,27 @@
+import argparse
 import requests
+import threading
 import time
 import json
 import configparser
 import os
 
+import numpy as np
+
+from position_protocol import decode_record
+
+# Checks that the fish position API is reachable, or load-tests it:
+#
+#   python debug_api.py                                   # connection and config checks
+#   python debug_api.py --load --clients 20 --rate 30     # 20 displays polling at 30 Hz
+#   python debug_api.py --load --endpoint position.bin --host 192.168.1.20
+#
+# Each load client keeps one keep-alive connection (requests.Session) and polls on
+# a fixed schedule. The report covers throughput, latency percentiles, errors and
+# freshness: how old the position was when it arrived (receive time minus the
+# frame's capture time "t"). Freshness compares two clocks, so measure from
+# another machine only if both are NTP-synchronized.
+
 # Get server port from config
 config = configparser.ConfigParser()
 config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini')
@@ -14,97 +32,225 @@ try:
         server_port = config.getint('Server', 'port')
     else:
         server_port = 5000
-except:
+except Exception:
     server_port = 5000
 
-print(f"🔍 Testing fish position API on port {server_port}")
-print("-------------------------------------")
-
-# Try to connect to the API
-api_url = f"http://localhost:{server_port}/position"
-print(f"Connecting to: {api_url}")
-
-success = False
-attempts = 0
-max_attempts = 10
-
-while not success and attempts < max_attempts:
-    try:
-        response = requests.get(api_url, timeout=0.5)
-        if response.status_code == 200:
-            data = response.json()
-            print(f"✅ Connection successful!")
-            print(f"Fish position: x={data['x']:.2f}, y={data['y']:.2f}")
-            success = True
-        else:
-            print(f"❌ Connection failed with status code {response.status_code}")
+def check_api(api_url, session):
+    """The original connection, config.json and update checks."""
+    print(f"🔍 Testing fish position API at {api_url}")
+    print("-------------------------------------")
+
+    success = False
+    attempts = 0
+    max_attempts = 10
+
+    while not success and attempts < max_attempts:
+        try:
+            response = session.get(api_url, timeout=0.5)
+            if response.status_code == 200:
+                data = response.json()
+                print(f"✅ Connection successful!")
+                print(f"Fish position: x={data['x']:.2f}, y={data['y']:.2f}")
+                success = True
+            else:
+                print(f"❌ Connection failed with status code {response.status_code}")
+                attempts += 1
+        except requests.exceptions.ConnectionError:
+            print(f"❌ Connection failed - server not responding (attempt {attempts+1}/{max_attempts})")
             attempts += 1
-    except requests.exceptions.ConnectionError:
-        print(f"❌ Connection failed - server not responding (attempt {attempts+1}/{max_attempts})")
-        attempts += 1
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        attempts += 1
-    
-    if not success and attempts < max_attempts:
-        print("Retrying in 1 second...")
-        time.sleep(1)
-
-if not success:
-    print("\n❗ Could not connect to the fish position API. Possible issues:")
-    print("1. Fish tracker is not running")
-    print("2. Server port is incorrect (check config.ini)")
-    print("3. Server is running but has an error")
-    print("\nTry running fish_tracker.py directly to see if there are errors.")
-else:
-    print("\nNow checking if config.json is correctly created...")
-    try:
-        with open('config.json', 'r') as f:
-            config_json = json.load(f)
-            print("✅ config.json exists and is valid JSON")
-            if 'Server' in config_json and 'port' in config_json['Server']:
-                print(f"✅ Server port in config.json: {config_json['Server']['port']}")
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            attempts += 1
+
+        if not success and attempts < max_attempts:
+            print("Retrying in 1 second...")
+            time.sleep(1)
+
+    if not success:
+        print("\n❗ Could not connect to the fish position API. Possible issues:")
+        print("1. Fish tracker is not running")
+        print("2. Server port is incorrect (check config.ini)")
+        print("3. Server is running but has an error")
+        print("\nTry running fish_tracker.py directly to see if there are errors.")
+    else:
+        print("\nNow checking if config.json is correctly created...")
+        try:
+            with open('config.json', 'r') as f:
+                config_json = json.load(f)
+                print("✅ config.json exists and is valid JSON")
+                if 'Server' in config_json and 'port' in config_json['Server']:
+                    print(f"✅ Server port in config.json: {config_json['Server']['port']}")
+                else:
+                    print("❌ Server port not found in config.json")
+        except FileNotFoundError:
+            print("❌ config.json not found - this file is needed for the web interface")
+        except json.JSONDecodeError:
+            print("❌ config.json exists but is not valid JSON")
+        except Exception as e:
+            print(f"❌ Error reading config.json: {e}")
+
+    print("\nNow monitoring fish position for 5 seconds to check for updates...")
+    start_time = time.time()
+    positions = []
+
+    while time.time() - start_time < 5:
+        try:
+            response = session.get(api_url, timeout=0.5)
+            if response.status_code == 200:
+                data = response.json()
+                positions.append((data['x'], data['y']))
+                age = f" ({(time.time() - data['t']) * 1000:.0f} ms old)" if 't' in data else ""
+                print(f"Position: x={data['x']:.2f}, y={data['y']:.2f}{age}")
+            time.sleep(0.5)
+        except Exception:
+            pass
+
+    if len(positions) > 1:
+        # Check if the position is changing
+        is_changing = any(p1 != p2 for p1, p2 in zip(positions, positions[1:]))
+        if is_changing:
+            print("✅ Fish position is updating correctly")
+        else:
+            print("⚠️ Fish position is not changing - fish might not be detected")
+    else:
+        print("❌ Couldn't get multiple position updates")
+
+    print("\n🔍 API Debug Summary:")
+    if success:
+        print("✅ API connection: Working")
+    else:
+        print("❌ API connection: Failed")
+
+    print("\nIf API is working but effects still don't appear, check:")
+    print("1. Open browser console (F12) to see any JavaScript errors")
+    print("2. Make sure the port in index.html matches the port in config.json")
+    print("3. Try refreshing the page after fish_tracker.py is running")
+
+class LoadClient(threading.Thread):
+    """One simulated display polling the API at a fixed rate over a keep-alive connection."""
+
+    def __init__(self, url, rate, stop_at, timeout, binary):
+        super().__init__()
+        self.daemon = True
+        self.url = url
+        self.period = 1.0 / rate
+        self.stop_at = stop_at
+        self.timeout = timeout
+        self.binary = binary
+        self.latencies = []
+        self.freshness = []
+        self.seqs = set()
+        self.errors = {}
+        self.late_ticks = 0  # Requests that started after their scheduled time
+
+    def run(self):
+        session = requests.Session()
+        next_tick = time.perf_counter()
+        while time.time() < self.stop_at:
+            start = time.perf_counter()
+            try:
+                response = session.get(self.url, timeout=self.timeout)
+                received = time.time()
+                latency = time.perf_counter() - start
+                if response.status_code != 200:
+                    self._error(f"HTTP {response.status_code}")
+                else:
+                    if self.binary:
+                        record = decode_record(response.content)
+                        seq, captured = record['seq'], record['t']
+                    else:
+                        data = response.json()
+                        seq, captured = data.get('seq'), data.get('t')
+                    self.latencies.append(latency)
+                    if captured is not None:
+                        self.freshness.append(received - captured)
+                    self.seqs.add(seq)
+            except requests.exceptions.Timeout:
+                self._error("timeout")
+            except requests.exceptions.ConnectionError:
+                self._error("connection")
+            except ValueError:
+                self._error("bad payload")
+            except requests.exceptions.RequestException as e:
+                # Anything else requests can raise (e.g. a connection dropped mid-body)
+                self._error(type(e).__name__)
+
+            next_tick += self.period
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
             else:
-                print("❌ Server port not found in config.json")
-    except FileNotFoundError:
-        print("❌ config.json not found - this file is needed for the web interface")
-    except json.JSONDecodeError:
-        print("❌ config.json exists but is not valid JSON")
-    except Exception as e:
-        print(f"❌ Error reading config.json: {e}")
-
-print("\nNow monitoring fish position for 5 seconds to check for updates...")
-start_time = time.time()
-positions = []
-
-while time.time() - start_time < 5:
-    try:
-        response = requests.get(api_url, timeout=0.5)
-        if response.status_code == 200:
-            data = response.json()
-            positions.append((data['x'], data['y']))
-            print(f"Position: x={data['x']:.2f}, y={data['y']:.2f}")
-        time.sleep(0.5)
-    except:
-        pass
-
-if len(positions) > 1:
-    # Check if the position is changing
-    is_changing = any(p1 != p2 for p1, p2 in zip(positions, positions[1:]))
-    if is_changing:
-        print("✅ Fish position is updating correctly")
+                # Can't keep up: count it and don't try to catch up with a burst
+                self.late_ticks += 1
+                next_tick = time.perf_counter()
+        session.close()
+
+    def _error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+def format_ms(values):
+    if len(values) == 0:
+        return "n/a"
+    ms = np.asarray(values) * 1000
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return f"p50={p50:.1f} ms, p90={p90:.1f} ms, p99={p99:.1f} ms, max={ms.max():.1f} ms"
+
+def run_load(url, clients, rate, duration, timeout):
+    binary = url.endswith('.bin')
+    print(f"🔍 Load test: {clients} client(s) x {rate:g} req/s for {duration:g} s against {url}")
+
+    stop_at = time.time() + duration
+    workers = [LoadClient(url, rate, stop_at, timeout, binary) for _ in range(clients)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = [v for w in workers for v in w.latencies]
+    freshness = [v for w in workers for v in w.freshness]
+    errors = {}
+    for w in workers:
+        for kind, n in w.errors.items():
+            errors[kind] = errors.get(kind, 0) + n
+    failed = sum(errors.values())
+    total = len(latencies) + failed
+    late = sum(w.late_ticks for w in workers)
+    frames_seen = len(set().union(*(w.seqs for w in workers)))
+
+    print("\n🔍 Load Test Summary:")
+    print(f"Requests:   {total} in {elapsed:.1f} s = {total / elapsed:.0f} req/s "
+          f"(target {clients * rate:g} req/s)")
+    print(f"Latency:    {format_ms(latencies)}")
+    print(f"Freshness:  {format_ms(freshness)}")
+    print(f"Frames:     {frames_seen} distinct ({frames_seen / elapsed:.1f}/s)")
+    if failed:
+        detail = ", ".join(f"{kind}: {n}" for kind, n in sorted(errors.items()))
+        print(f"❌ Errors:   {failed} ({100 * failed / max(total, 1):.1f}%) - {detail}")
     else:
-        print("⚠️ Fish position is not changing - fish might not be detected")
-else:
-    print("❌ Couldn't get multiple position updates")
-
-print("\n🔍 API Debug Summary:")
-if success:
-    print("✅ API connection: Working")
-else:
-    print("❌ API connection: Failed")
-
-print("\nIf API is working but effects still don't appear, check:")
-print("1. Open browser console (F12) to see any JavaScript errors")
-print("2. Make sure the port in index.html matches the port in config.json")
-print("3. Try refreshing the page after fish_tracker.py is running")
+        print("✅ Errors:   none")
+    if late:
+        print(f"⚠️ {late} request(s) started late - the server or this machine can't sustain the target rate")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check or load-test the fish position API")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=server_port)
+    parser.add_argument('--load', action='store_true', help="Run a load test instead of the connection checks")
+    parser.add_argument('--clients', type=int, default=4, help="load: concurrent clients (displays)")
+    parser.add_argument('--rate', type=float, default=30.0, help="load: requests per second per client")
+    parser.add_argument('--duration', type=float, default=10.0, help="load: seconds to run")
+    parser.add_argument('--endpoint', default='position', choices=['position', 'position.bin'])
+    parser.add_argument('--timeout', type=float, default=1.0, help="Request timeout in seconds")
+    args = parser.parse_args()
+
+    api_url = f"http://{args.host}:{args.port}/{args.endpoint}"
+    if args.load:
+        run_load(api_url, args.clients, args.rate, args.duration, args.timeout)
+    else:
+        with requests.Session() as session:
+            check_api(f"http://{args.host}:{args.port}/position", session)
+
+if __name__ == "__main__":
+    main()
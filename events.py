@@ -0,0 +1,189 @@
+import collections
+import logging
+import threading
+
+import cv2
+import numpy as np
+
+log = logging.getLogger('events')
+
+# Turns the tracker's per-frame results into discrete events for the displays:
+#
+#   zone_enter / zone_exit    the fish entered or left a polygon zone
+#   burst_start / burst_end   a burst of fast swimming began or ended
+#   idle_start / idle_end     the fish stayed (nearly) still for a while, or moved again
+#   fish_lost / fish_found    the fish disappeared from view, or came back
+#
+# Every condition has hysteresis so a fish hovering at a threshold doesn't make
+# a stream of events: zones have a margin the fish must cross in both directions,
+# speed events have separate start and end speeds, and lost/found/idle must
+# persist for a minimum time. Events are evaluated on every tracker frame, so
+# short bursts aren't missed between display polls.
+#
+# Zones are polygons in normalized tank coordinates, one per line in [Zones]:
+#
+#   [Zones]
+#   castle = 0.1,0.6 0.3,0.6 0.3,0.9 0.1,0.9
+#
+# Each event is a dict with 'id', 'type', 't' (frame capture time), 'seq', the
+# fish position 'x', 'y', and type-specific fields.
+
+def parse_zones(config):
+    """{name: (N, 2) float32 polygon} from the [Zones] section."""
+    zones = {}
+    if 'Zones' not in config:
+        return zones
+    for name, value in config.items('Zones'):
+        try:
+            points = [tuple(float(v) for v in pair.split(',')) for pair in value.split()]
+        except ValueError:
+            log.warning("Zone '%s' is not a list of x,y points, ignoring it", name)
+            continue
+        if len(points) < 3 or any(len(p) != 2 for p in points):
+            log.warning("Zone '%s' needs at least three x,y points, ignoring it", name)
+            continue
+        zones[name] = np.array(points, dtype=np.float32)
+    return zones
+
+def load_event_settings(config):
+    """Event engine settings from a ConfigParser, with defaults for older configs."""
+    return {
+        'zones': parse_zones(config),
+        'zone_margin': config.getfloat('Events', 'zone_margin', fallback=0.02),
+        'burst_speed': config.getfloat('Events', 'burst_speed', fallback=0.6),
+        'burst_end_speed': config.getfloat('Events', 'burst_end_speed', fallback=0.4),
+        'idle_speed': config.getfloat('Events', 'idle_speed', fallback=0.03),
+        'idle_time': config.getfloat('Events', 'idle_time', fallback=5.0),
+        'lost_time': config.getfloat('Events', 'lost_time', fallback=1.0),
+        'found_time': config.getfloat('Events', 'found_time', fallback=0.3)
+    }
+
+class EventEngine:
+    """Edge-triggered events with hysteresis from a stream of tracker results."""
+
+    def __init__(self, settings, history=256):
+        self.settings = settings
+        self.zones = settings['zones']
+        self.next_id = 1
+        self.recent = collections.deque(maxlen=history)  # For clients that poll /events
+        self.lock = threading.Lock()
+
+        self.present = False  # Fish currently considered in view
+        self.presence_since = None  # When the detected/undetected state last flipped
+        self.inside = set()  # Zones the fish is in
+        self.burst = None  # (start time, peak speed) while bursting
+        self.still_since = None  # When the fish last became slow
+        self.idle_since = None  # Set once idle_start has been sent
+
+    def update(self, result):
+        """Evaluate one tracker result. Returns the list of new events."""
+        s = self.settings
+        t = result['t']
+        position = result['position']
+        x, y, speed = position['x'], position['y'], position['speed']
+        events = []
+
+        def emit(kind, **fields):
+            events.append(dict(type=kind, t=t, seq=result['seq'], x=x, y=y, **fields))
+
+        # Lost/found: the detection state has to hold for lost_time / found_time
+        detected = result['detected']
+        if detected != self.present:
+            if self.presence_since is None:
+                self.presence_since = t
+            if t - self.presence_since >= (s['found_time'] if detected else s['lost_time']):
+                self.present = detected
+                self.presence_since = None
+                if detected:
+                    emit('fish_found')
+                else:
+                    emit('fish_lost')
+                    # Nothing else is known about a fish that isn't there
+                    for name in sorted(self.inside):
+                        emit('zone_exit', zone=name)
+                    self.inside.clear()
+                    if self.burst:
+                        emit('burst_end', duration=t - self.burst[0], peak_speed=self.burst[1])
+                        self.burst = None
+                    if self.idle_since is not None:
+                        emit('idle_end', duration=t - self.idle_since)
+                    self.idle_since = self.still_since = None
+        else:
+            self.presence_since = None
+
+        if not self.present or not detected:
+            self._store(events)
+            return events
+
+        # Zones: signed distance to the edge, positive inside; the fish has to be
+        # zone_margin inside to enter and zone_margin outside to leave
+        for name, polygon in self.zones.items():
+            distance = cv2.pointPolygonTest(polygon, (float(x), float(y)), True)
+            if name not in self.inside and distance >= s['zone_margin']:
+                self.inside.add(name)
+                emit('zone_enter', zone=name)
+            elif name in self.inside and distance <= -s['zone_margin']:
+                self.inside.discard(name)
+                emit('zone_exit', zone=name)
+
+        # Bursts: start above burst_speed, end below burst_end_speed
+        if self.burst is None and speed >= s['burst_speed']:
+            self.burst = (t, speed)
+            emit('burst_start', speed=speed)
+        elif self.burst is not None:
+            if speed < s['burst_end_speed']:
+                emit('burst_end', duration=t - self.burst[0], peak_speed=self.burst[1])
+                self.burst = None
+            elif speed > self.burst[1]:
+                self.burst = (self.burst[0], speed)
+
+        # Idle: slower than idle_speed for idle_time; ends above twice that speed
+        if speed < s['idle_speed']:
+            if self.still_since is None:
+                self.still_since = t
+            if self.idle_since is None and t - self.still_since >= s['idle_time']:
+                self.idle_since = self.still_since
+                emit('idle_start', since=self.still_since)
+        elif speed > 2 * s['idle_speed']:
+            if self.idle_since is not None:
+                emit('idle_end', duration=t - self.idle_since)
+            self.idle_since = self.still_since = None
+
+        self._store(events)
+        return events
+
+    def _store(self, events):
+        if not events:
+            return
+        with self.lock:
+            for event in events:
+                event['id'] = self.next_id
+                self.next_id += 1
+                self.recent.append(event)
+
+    def since(self, last_id):
+        """Stored events newer than last_id (clients poll with the last id they saw)."""
+        with self.lock:
+            return [event for event in self.recent if event['id'] > last_id]
+
+    def state(self):
+        with self.lock:
+            return {
+                'present': self.present,
+                'zones': sorted(self.inside),
+                'bursting': self.burst is not None,
+                'idle': self.idle_since is not None,
+                'last_id': self.next_id - 1
+            }
+
+    def add_routes(self, app):
+        """Serve /events?since=<id> (JSON list) and /events/state from a Flask app."""
+        from flask import jsonify, request
+
+        @app.route('/events')
+        def get_events():
+            return jsonify(self.since(request.args.get('since', 0, type=int)))
+
+        @app.route('/events/state')
+        def get_event_state():
+            return jsonify(self.state())
@@ -1,111 +1,250 @@
 import cv2
 import numpy as np
 import time
-from flask import Flask, jsonify
-from flask_cors import CORS
-import threading
 import configparser
+import logging
 import os
+import signal
 import sys
+from blob_analysis import analyze_blobs, apply_homography, sample_point_map
+from position_protocol import FLAG_DETECTED, FLAG_STALE
+from tracking_state import TrackState, TENTATIVE, LOCKED, COASTING, load_tracking_settings, default_tracking_settings
+from position_multicast import DEFAULT_GROUP, DEFAULT_PORT
+from frame_context import FrameContext
+from mask_morphology import MaskFilter, load_morphology_settings
+from camera_capture import load_camera_settings
+from yuv_planes import bgr_planes, yuyv_planes
+from metrics import TrackerMetrics
+from tracker_logging import setup_logging, shutdown_logging, load_logging_settings
 
-# Read configuration
-config = configparser.ConfigParser()
-config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini')
-
-if not os.path.exists(config_file):
-    print(f"Error: Configuration file not found: {config_file}")
-    print("Please run calibrate_tank_area.py first to set up your fish tank area.")
-    sys.exit(1)
-
-try:
-    config.read(config_file)
-    
-    # Camera settings
-    CAMERA_INDEX = config.getint('Camera', 'camera_index')
-    CAMERA_WIDTH = config.getint('Camera', 'width')
-    CAMERA_HEIGHT = config.getint('Camera', 'height')
-    
-    # Detection settings
-    MIN_CONTOUR_AREA = config.getint('Detection', 'min_contour_area')
-    MAX_CONTOUR_AREA = config.getint('Detection', 'max_contour_area')
-    H_LOW1 = config.getint('Detection', 'h_low1')
-    H_HIGH1 = config.getint('Detection', 'h_high1')
-    H_LOW2 = config.getint('Detection', 'h_low2')
-    H_HIGH2 = config.getint('Detection', 'h_high2')
-    S_LOW = config.getint('Detection', 's_low')
-    S_HIGH = config.getint('Detection', 's_high')
-    V_LOW = config.getint('Detection', 'v_low')
-    V_HIGH = config.getint('Detection', 'v_high')
-    BLUR_SIZE = config.getint('Detection', 'blur_size')
-    ERODE_ITERATIONS = config.getint('Detection', 'erode_iterations')
-    DILATE_ITERATIONS = config.getint('Detection', 'dilate_iterations')
-    
-    # Tank area settings
-    if 'TankArea' in config:
-        TANK_AREA = [
-            (config.getint('TankArea', 'top_left_x'), config.getint('TankArea', 'top_left_y')),
-            (config.getint('TankArea', 'top_right_x'), config.getint('TankArea', 'top_right_y')),
-            (config.getint('TankArea', 'bottom_right_x'), config.getint('TankArea', 'bottom_right_y')),
-            (config.getint('TankArea', 'bottom_left_x'), config.getint('TankArea', 'bottom_left_y'))
+# Red fish tracker.
+#
+# Run it (python fish_tracker.py) to track the fish from the configured camera
+# and serve its position to the web effects. Importing it starts nothing: the
+# pieces can be used on their own, e.g. to process a recording offline:
+#
+#   from fish_tracker import FishTracker, load_settings
+#   from frame_sources import VideoSource
+#
+#   source = VideoSource('tank.mp4')
+#   source.open()
+#   tracker = FishTracker(load_settings(), source.width, source.height)
+#   while True:
+#       ok, frame, t = source.read()
+#       if not ok:
+#           break
+#       result = tracker.process(frame, t)
+#
+# FishTracker is the detection engine (one frame in, one result out).
+# TrackerService runs it on a frame source (frame_sources.py) and publishes every
+# result through position_server.py, the trajectory recorder and the debug windows.
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini')
+LIVENESS_TIMEOUT = 10.0  # Seconds without a completed loop step before /healthz fails
+FRAME_LOG_SAMPLE = 30  # One frame in this many is logged at debug level
+
+log = logging.getLogger('fish_tracker')  # Set up by main(), see tracker_logging.py
+
+def default_settings():
+    """Settings used when config.ini can't be read."""
+    return {
+        'camera': {'camera_index': 0, 'width': 640, 'height': 480,
+                   'fourcc': '', 'fps': 0, 'buffer_size': 0, 'backend': 'auto',
+                   'stall_timeout': 2.0, 'reconnect_delay': 0.5, 'reconnect_max_delay': 10.0},
+        'min_contour_area': 300,
+        'max_contour_area': 10000,
+        'hsv_ranges': [((0, 100, 100), (10, 255, 255)), ((160, 100, 100), (180, 255, 255))],
+        'color_space': 'hsv',
+        'cr_low': 150,
+        'cr_high': 255,
+        'morphology': {'morphology': 'legacy', 'kernel_shape': 'ellipse', 'kernel_size': 5,
+                       'prefilter': 'none', 'mask_scale': 1.0, 'blur_size': 7,
+                       'erode_iterations': 1, 'dilate_iterations': 2},
+        'tracking': default_tracking_settings(),
+        'glare': None,
+        'tank_area': None,
+        'lens': None,
+        'server': {'port': 5000, 'ws_port': 5001, 'web': True, 'multicast': None},
+        'recording': None,
+        'occupancy': None,
+        'events': None
+    }
+
+def load_settings(config_file=CONFIG_FILE):
+    """Tracker settings from config.ini.
+
+    Raises FileNotFoundError if the file doesn't exist; if it can't be parsed the
+    defaults are used.
+    """
+    if not os.path.exists(config_file):
+        raise FileNotFoundError(config_file)
+
+    config = configparser.ConfigParser()
+    try:
+        config.read(config_file)
+        settings = {}
+
+        # Camera settings (resolution, format, frame rate, buffering, backend)
+        settings['camera'] = load_camera_settings(config)
+
+        # Detection settings (red appears at both ends of the hue spectrum in HSV)
+        settings['min_contour_area'] = config.getint('Detection', 'min_contour_area')
+        settings['max_contour_area'] = config.getint('Detection', 'max_contour_area')
+        s_low, s_high = config.getint('Detection', 's_low'), config.getint('Detection', 's_high')
+        v_low, v_high = config.getint('Detection', 'v_low'), config.getint('Detection', 'v_high')
+        settings['hsv_ranges'] = [
+            ((config.getint('Detection', 'h_low1'), s_low, v_low), (config.getint('Detection', 'h_high1'), s_high, v_high)),
+            ((config.getint('Detection', 'h_low2'), s_low, v_low), (config.getint('Detection', 'h_high2'), s_high, v_high))
         ]
-        TANK_AREA_DEFINED = all(p != (0, 0) for p in TANK_AREA[1:])
-    else:
-        # Default to full frame if not defined
-        TANK_AREA = [(0, 0), (CAMERA_WIDTH, 0), (CAMERA_WIDTH, CAMERA_HEIGHT), (0, CAMERA_HEIGHT)]
-        TANK_AREA_DEFINED = False
-    
-    # Server settings
-    SERVER_PORT = config.getint('Server', 'port')
-    
-    print(f"Configuration loaded from {config_file}")
-    print(f"Using camera index: {CAMERA_INDEX}")
-    
-    if TANK_AREA_DEFINED:
-        print("Fish tank area loaded from calibration.")
-    else:
-        print("No fish tank area defined. Will use full camera view.")
-    
-except Exception as e:
-    print(f"Error reading configuration: {e}")
-    print("Using default settings")
-    
-    # Default settings if config file can't be read
-    CAMERA_INDEX = 0
-    CAMERA_WIDTH = 640
-    CAMERA_HEIGHT = 480
-    MIN_CONTOUR_AREA = 300
-    MAX_CONTOUR_AREA = 10000
-    H_LOW1 = 0
-    H_HIGH1 = 10
-    H_LOW2 = 160
-    H_HIGH2 = 180
-    S_LOW = 100
-    S_HIGH = 255
-    V_LOW = 100
-    V_HIGH = 255
-    BLUR_SIZE = 7
-    ERODE_ITERATIONS = 1
-    DILATE_ITERATIONS = 2
-    SERVER_PORT = 5000
-    TANK_AREA = [(0, 0), (CAMERA_WIDTH, 0), (CAMERA_WIDTH, CAMERA_HEIGHT), (0, CAMERA_HEIGHT)]
-    TANK_AREA_DEFINED = False
-
-# Setup perspective transformation if tank area is defined
-def setup_perspective_transform():
-    if not TANK_AREA_DEFINED:
-        return None
-    
+        # 'hsv' (default) or 'ycrcb': threshold red on the Cr plane alone, background on luma
+        settings['color_space'] = config.get('Detection', 'color_space', fallback='hsv').strip().lower()
+        settings['cr_low'] = config.getint('Detection', 'cr_low', fallback=150)
+        settings['cr_high'] = config.getint('Detection', 'cr_high', fallback=255)
+        settings['morphology'] = load_morphology_settings(config)  # Mask clean-up, see mask_morphology.py
+
+        # Tracking state machine: confirmation, search window, coasting (see tracking_state.py)
+        settings['tracking'] = load_tracking_settings(config)
+
+        # Learned suppression of glare and reflections (see glare.py)
+        settings['glare'] = None
+        if config.getboolean('Glare', 'enabled', fallback=False):
+            from glare import load_glare_settings
+            settings['glare'] = load_glare_settings(config)
+
+        # Tank area settings (None = full camera view)
+        settings['tank_area'] = None
+        if 'TankArea' in config:
+            tank_area = [
+                (config.getint('TankArea', 'top_left_x'), config.getint('TankArea', 'top_left_y')),
+                (config.getint('TankArea', 'top_right_x'), config.getint('TankArea', 'top_right_y')),
+                (config.getint('TankArea', 'bottom_right_x'), config.getint('TankArea', 'bottom_right_y')),
+                (config.getint('TankArea', 'bottom_left_x'), config.getint('TankArea', 'bottom_left_y'))
+            ]
+            if all(p != (0, 0) for p in tank_area[1:]):
+                settings['tank_area'] = tank_area
+
+        # Server settings: Flask port, binary push channel (0 disables) and multicast
+        # (one datagram per frame for any number of display PCs)
+        multicast = None
+        if config.getboolean('Multicast', 'enabled', fallback=False):
+            multicast = {
+                'group': config.get('Multicast', 'group', fallback=DEFAULT_GROUP),
+                'port': config.getint('Multicast', 'port', fallback=DEFAULT_PORT),
+                'ttl': config.getint('Multicast', 'ttl', fallback=1),
+                'interface': config.get('Multicast', 'interface', fallback='0.0.0.0')
+            }
+        settings['server'] = {
+            'port': config.getint('Server', 'port'),
+            'ws_port': config.getint('Server', 'ws_port', fallback=5001),
+            'web': config.getboolean('Server', 'web', fallback=True),
+            'multicast': multicast
+        }
+
+        # Trajectory recording (one fixed-width row per fish per frame, see trajectory_log.py)
+        settings['recording'] = None
+        if config.getboolean('Recording', 'enabled', fallback=False):
+            from trajectory_log import recording_directory
+            settings['recording'] = {
+                'directory': recording_directory(config_file, config),
+                'rotate_bytes': config.getint('Recording', 'rotate_mb', fallback=64) * 1024 * 1024,
+                'flush_interval': config.getfloat('Recording', 'flush_interval', fallback=1.0)
+            }
+
+        # Occupancy heatmap and dwell statistics (see occupancy.py)
+        settings['occupancy'] = None
+        if config.getboolean('Occupancy', 'enabled', fallback=False):
+            path = config.get('Occupancy', 'file', fallback='occupancy.npz')
+            if not os.path.isabs(path):
+                path = os.path.join(os.path.dirname(os.path.abspath(config_file)), path)
+            settings['occupancy'] = {
+                'grid_width': config.getint('Occupancy', 'grid_width', fallback=64),
+                'grid_height': config.getint('Occupancy', 'grid_height', fallback=48),
+                'half_life': config.getfloat('Occupancy', 'half_life', fallback=3600.0),
+                'save_interval': config.getfloat('Occupancy', 'save_interval', fallback=60.0),
+                'file': path
+            }
+
+        # Event detection: zones, speed bursts, idle, lost/found (see events.py)
+        settings['events'] = None
+        if config.getboolean('Events', 'enabled', fallback=False):
+            from events import load_event_settings
+            settings['events'] = load_event_settings(config)
+
+        # Lens calibration (written by calibrate_lens.py)
+        settings['lens'] = None
+        if config.getboolean('Lens', 'enabled', fallback=False):
+            settings['lens'] = {
+                'image_size': (config.getint('Lens', 'image_width'), config.getint('Lens', 'image_height')),
+                'camera_matrix': np.array([
+                    [config.getfloat('Lens', 'fx'), 0, config.getfloat('Lens', 'cx')],
+                    [0, config.getfloat('Lens', 'fy'), config.getfloat('Lens', 'cy')],
+                    [0, 0, 1]
+                ], dtype=np.float64),
+                'dist_coeffs': np.array([config.getfloat('Lens', k) for k in ('k1', 'k2', 'p1', 'p2', 'k3')],
+                                        dtype=np.float64)
+            }
+
+        log.info("Configuration loaded from %s", config_file)
+        log.info("Using camera index: %d", settings['camera']['camera_index'])
+
+        if settings['tank_area']:
+            log.info("Fish tank area loaded from calibration.")
+        else:
+            log.info("No fish tank area defined. Will use full camera view.")
+
+        if settings['lens']:
+            log.info("Lens distortion correction loaded from calibration.")
+
+        return settings
+
+    except Exception as e:
+        log.error("Could not read the configuration: %s", e)
+        log.info("Using default settings")
+        return default_settings()
+
+# Scale the lens calibration to the resolution the camera actually delivers
+def get_lens_camera_matrix(lens, frame_width, frame_height):
+    K = lens['camera_matrix'].copy()
+    K[0] *= frame_width / lens['image_size'][0]
+    K[1] *= frame_height / lens['image_size'][1]
+    K[2] = [0, 0, 1]
+    return K
+
+# Setup perspective transformation if tank area is defined (or the lens needs correcting)
+def setup_perspective_transform(tank_area, lens, frame_width, frame_height):
+    if not tank_area:
+        if not lens:
+            return None
+        # No tank area: undistort the full camera view, normalized by the frame size
+        transform = {
+            'matrix': np.eye(3),
+            'width': frame_width,
+            'height': frame_height,
+            'points': None
+        }
+        transform.update(setup_lens_maps(lens, transform['matrix'], frame_width, frame_height,
+                                         frame_width, frame_height))
+        return transform
+
+    # Source points (from calibration)
+    src_pts = np.array(tank_area, dtype=np.float32)
+
+    # The corners were clicked on the distorted image, so straighten them first
+    if lens:
+        K = get_lens_camera_matrix(lens, frame_width, frame_height)
+        src_pts = cv2.undistortPoints(src_pts.reshape(-1, 1, 2), K, lens['dist_coeffs'], P=K).reshape(-1, 2)
+
     # Calculate width and height for the corrected view
     width = int(max(
-        np.sqrt((TANK_AREA[1][0] - TANK_AREA[0][0])**2 + (TANK_AREA[1][1] - TANK_AREA[0][1])**2),
-        np.sqrt((TANK_AREA[2][0] - TANK_AREA[3][0])**2 + (TANK_AREA[2][1] - TANK_AREA[3][1])**2)
+        np.sqrt((src_pts[1][0] - src_pts[0][0])**2 + (src_pts[1][1] - src_pts[0][1])**2),
+        np.sqrt((src_pts[2][0] - src_pts[3][0])**2 + (src_pts[2][1] - src_pts[3][1])**2)
     ))
-    
+
     height = int(max(
-        np.sqrt((TANK_AREA[3][0] - TANK_AREA[0][0])**2 + (TANK_AREA[3][1] - TANK_AREA[0][1])**2),
-        np.sqrt((TANK_AREA[2][0] - TANK_AREA[1][0])**2 + (TANK_AREA[2][1] - TANK_AREA[1][1])**2)
+        np.sqrt((src_pts[3][0] - src_pts[0][0])**2 + (src_pts[3][1] - src_pts[0][1])**2),
+        np.sqrt((src_pts[2][0] - src_pts[1][0])**2 + (src_pts[2][1] - src_pts[1][1])**2)
     ))
-    
+
     # Define destination points (perspective corrected)
     dst_pts = np.array([
         [0, 0],
@@ -113,284 +252,822 @@ def setup_perspective_transform():
         [width, height],
         [0, height]
     ], dtype=np.float32)
-    
-    # Source points (from calibration)
-    src_pts = np.array(TANK_AREA, dtype=np.float32)
-    
+
     # Calculate transformation matrix
     M = cv2.getPerspectiveTransform(src_pts, dst_pts)
-    
-    return {
+
+    transform = {
         'matrix': M,
         'width': width,
         'height': height,
-        'points': TANK_AREA
+        'points': tank_area
     }
 
-# Apply mask to restrict detection to tank area only
-def apply_tank_area_mask(frame):
-    if not TANK_AREA_DEFINED:
-        return frame
-    
-    # Create a mask of the tank area
-    mask = np.zeros(frame.shape[:2], dtype=np.uint8)
-    points = np.array(TANK_AREA, dtype=np.int32).reshape((-1, 1, 2))
-    cv2.fillPoly(mask, [points], 255)
-    
-    # Apply mask to frame
-    return cv2.bitwise_and(frame, frame, mask=mask)
-
-# Initialize Flask app for communication
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
-fish_position = {"x": 0.5, "y": 0.5}  # Default position (center)
-last_valid_position = {"x": 0.5, "y": 0.5}  # Keep track of last valid detection
-position_history = []  # Track recent positions for smoothing
-
-# Create a thread for the Flask server
-def run_server():
-    app.run(host='0.0.0.0', port=SERVER_PORT)
-
-
-@app.route('/position')
-def get_position():
-    return jsonify(fish_position)
-
-# Start the server in a separate thread
-server_thread = threading.Thread(target=run_server)
-server_thread.daemon = True
-server_thread.start()
-
-# Initialize camera
-print(f"Attempting to open camera with index {CAMERA_INDEX}...")
-cap = cv2.VideoCapture(CAMERA_INDEX)
-
-# Check if camera opened successfully
-if not cap.isOpened():
-    print(f"Error: Could not open camera with index {CAMERA_INDEX}.")
-    print("Available camera indices might be different. Try updating the 'camera_index' in config.ini.")
-    sys.exit(1)
-
-# Set camera resolution to optimize performance
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
-
-# Initialize background subtractor for motion detection
-bg_subtractor = cv2.createBackgroundSubtractorMOG2(history=200, varThreshold=25, detectShadows=False)
-
-# Parameters for red fish detection (red appears at both ends of the hue spectrum in HSV)
-lower_red1 = np.array([H_LOW1, S_LOW, V_LOW])
-upper_red1 = np.array([H_HIGH1, S_HIGH, V_HIGH])
-lower_red2 = np.array([H_LOW2, S_LOW, V_LOW])
-upper_red2 = np.array([H_HIGH2, S_HIGH, V_HIGH])
-
-# Ensure blur size is odd
-if BLUR_SIZE % 2 == 0:
-    BLUR_SIZE += 1
-
-detect_confidence = 0  # Counter to track consecutive detections
-
-# Set up perspective transformation
-perspective_transform = setup_perspective_transform()
-if perspective_transform:
-    print(f"Perspective transformation set up with dimensions {perspective_transform['width']}x{perspective_transform['height']}")
-
-print(f"Red fish tracking started using camera {CAMERA_INDEX}. Press 'q' to quit.")
-print(f"Red detection ranges: H({H_LOW1}-{H_HIGH1} and {H_LOW2}-{H_HIGH2}), S({S_LOW}-{S_HIGH}), V({V_LOW}-{V_HIGH})")
-print(f"Contour area limits: {MIN_CONTOUR_AREA} - {MAX_CONTOUR_AREA}")
-print(f"Server running on port {SERVER_PORT}")
-
-# Function to check if a detection is valid (not a sudden jump)
-def is_valid_detection(x, y, prev_x, prev_y, threshold=0.2):
-    # Calculate normalized distance
-    distance = np.sqrt((x - prev_x)**2 + (y - prev_y)**2)
-    return distance < threshold
+    if lens:
+        transform.update(setup_lens_maps(lens, M, width, height, frame_width, frame_height))
+
+    return transform
+
+# Build the lens lookup tables once, with the homography fused in
+def setup_lens_maps(lens, M, width, height, frame_width, frame_height):
+    K = get_lens_camera_matrix(lens, frame_width, frame_height)
+
+    # Corrected view: a single remap does undistortion and perspective warp.
+    # initUndistortRectifyMap inverts (newCameraMatrix * R), so R = M * K with an
+    # identity new camera matrix maps tank pixels straight back to raw pixels.
+    view_map1, view_map2 = cv2.initUndistortRectifyMap(
+        K, lens['dist_coeffs'], M @ K, np.eye(3), (width, height), cv2.CV_16SC2)
+
+    # Point table: raw pixel -> normalized tank coordinates, used for the centroid only
+    xs, ys = np.meshgrid(np.arange(frame_width, dtype=np.float32),
+                         np.arange(frame_height, dtype=np.float32))
+    raw_pts = np.stack([xs, ys], axis=-1).reshape(-1, 1, 2)
+    undistorted = cv2.undistortPoints(raw_pts, K, lens['dist_coeffs'], P=K)
+    tank_pts = cv2.perspectiveTransform(undistorted, M).reshape(frame_height, frame_width, 2)
+    tank_pts /= np.array([width, height], dtype=np.float32)
+
+    return {
+        'view_maps': (view_map1, view_map2),
+        'point_map': tank_pts.astype(np.float32)
+    }
+
+# Convert raw camera pixels (N x 2) to normalized tank coordinates (0-1 range) in one batch
+def map_points_to_tank(points, frame_shape, perspective_transform):
+    if perspective_transform and 'point_map' in perspective_transform:
+        # Undistort and transform in one table lookup
+        return sample_point_map(perspective_transform['point_map'], points)
+    elif perspective_transform:
+        # Transform to corrected view space and normalize by its dimensions
+        transformed = apply_homography(points, perspective_transform['matrix'])
+        return transformed / (perspective_transform['width'], perspective_transform['height'])
+    else:
+        # If no perspective correction, just use the original frame dimensions
+        return np.asarray(points, dtype=np.float64) / (frame_shape[1], frame_shape[0])
+
+def boxes_overlap(a, b):
+    """True if two (x, y, w, h) pixel boxes share any pixel."""
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
 
 # Function to get smooth position based on recent history
 def get_smooth_position(positions, current_pos):
     # Add current position to history
     positions.append(current_pos.copy())
-    
+
     # Keep only the last 5 positions
     if len(positions) > 5:
         positions.pop(0)
-    
+
     # Calculate weighted average (more recent positions have higher weight)
     weights = np.linspace(0.5, 1.0, len(positions))
     x_avg = sum(p["x"] * w for p, w in zip(positions, weights)) / sum(weights)
     y_avg = sum(p["y"] * w for p, w in zip(positions, weights)) / sum(weights)
-    
+
     return {"x": x_avg, "y": y_avg}
 
-# Allow background subtractor to learn the background
-print("Learning background... Please wait.")
-for i in range(30):
-    ret, frame = cap.read()
-    if ret:
-        # Apply tank area mask
-        masked_frame = apply_tank_area_mask(frame)
-        bg_subtractor.apply(masked_frame)
-        time.sleep(0.05)
-
-# Main processing loop
-while True:
-    # Capture frame
-    ret, frame = cap.read()
-    if not ret:
-        print("Error: Failed to capture image")
-        break
-    
-    # Apply mask to restrict detection to tank area
-    masked_frame = apply_tank_area_mask(frame)
-    
-    # Apply background subtraction to isolate moving objects
-    fg_mask = bg_subtractor.apply(masked_frame)
-    
-    # Convert to HSV for better color filtering
-    hsv = cv2.cvtColor(masked_frame, cv2.COLOR_BGR2HSV)
-    
-    # Create mask for red color (combining both red ranges)
-    mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
-    mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
-    red_mask = cv2.bitwise_or(mask1, mask2)
-    
-    # Combine with foreground mask to get only moving red objects
-    # We use a reduced weight for the foreground mask to not be too strict
-    combined_mask = cv2.bitwise_and(red_mask, fg_mask)
-    
-    # Apply morphological operations to remove noise
-    kernel = np.ones((5,5), np.uint8)
-    mask = cv2.GaussianBlur(combined_mask, (BLUR_SIZE, BLUR_SIZE), 0)
-    mask = cv2.erode(mask, kernel, iterations=ERODE_ITERATIONS)
-    mask = cv2.dilate(mask, kernel, iterations=DILATE_ITERATIONS)
-    
-    # Find contours in the mask
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    # Create debug visualization
-    debug_view = frame.copy()
-    
-    # Add tank area boundary to debug view
-    if TANK_AREA_DEFINED:
-        # Draw the tank area boundary
-        pts = np.array(TANK_AREA, np.int32).reshape((-1, 1, 2))
-        cv2.polylines(debug_view, [pts], True, (0, 255, 255), 2)
-    
-    # Add mask visualization to debug view (red overlay)
-    mask_overlay = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
-    mask_overlay[:,:,0] = 0  # Set blue channel to 0
-    mask_overlay[:,:,1] = 0  # Set green channel to 0
-    
-    # Apply mask overlay only in tank area
-    if TANK_AREA_DEFINED:
-        tank_mask = np.zeros(frame.shape[:2], dtype=np.uint8)
-        pts = np.array(TANK_AREA, np.int32).reshape((-1, 1, 2))
-        cv2.fillPoly(tank_mask, [pts], 255)
-        mask_overlay_region = cv2.bitwise_and(mask_overlay, mask_overlay, mask=tank_mask)
-        debug_view = cv2.addWeighted(debug_view, 1.0, mask_overlay_region, 0.5, 0)
-    else:
-        debug_view = cv2.addWeighted(debug_view, 1.0, mask_overlay, 0.5, 0)
-    
-    fish_detected = False
-    
-    # If perspective correction is available, create a corrected view
-    if perspective_transform and TANK_AREA_DEFINED:
-        corrected_view = cv2.warpPerspective(frame, perspective_transform['matrix'], 
-                                             (perspective_transform['width'], perspective_transform['height']))
-    
-    # Process contours to find the fish
-    if contours:
-        # Find the largest contour that meets our size criteria
-        valid_contours = [c for c in contours if MIN_CONTOUR_AREA < cv2.contourArea(c) < MAX_CONTOUR_AREA]
-        
-        if valid_contours:
-            # Get the largest valid contour
-            fish_contour = max(valid_contours, key=cv2.contourArea)
-            
-            # Get bounding rectangle
-            x, y, w, h = cv2.boundingRect(fish_contour)
-            
-            # Calculate center of the fish
-            fish_center_x = x + w//2
-            fish_center_y = y + h//2
-            
-            # Convert to normalized coordinates (0-1 range)
-            if perspective_transform and TANK_AREA_DEFINED:
-                # Transform point to corrected view space
-                pts = np.array([[fish_center_x, fish_center_y]], dtype=np.float32)
-                pts = pts.reshape(-1, 1, 2)
-                transformed_pts = cv2.perspectiveTransform(pts, perspective_transform['matrix'])
-                transformed_x = transformed_pts[0][0][0]
-                transformed_y = transformed_pts[0][0][1]
-                
-                # Normalize using the transformed view dimensions
-                norm_x = transformed_x / perspective_transform['width']
-                norm_y = transformed_y / perspective_transform['height']
-            else:
-                # If no perspective correction, just use the original frame dimensions
-                norm_x = fish_center_x / frame.shape[1]
-                norm_y = fish_center_y / frame.shape[0]
-            
-            # Check if detection is valid (not a sudden jump)
-            if is_valid_detection(norm_x, norm_y, last_valid_position["x"], last_valid_position["y"]) or detect_confidence > 3:
-                # Update last valid position
-                last_valid_position["x"] = norm_x
-                last_valid_position["y"] = norm_y
-                
-                # Get smoothed position
-                smooth_position = get_smooth_position(position_history, last_valid_position)
-                
-                # Update global fish position with the smoothed values
-                fish_position["x"] = smooth_position["x"]
-                fish_position["y"] = smooth_position["y"]
-                
-                # Mark as detected and increase confidence
-                fish_detected = True
-                detect_confidence = min(detect_confidence + 1, 10)
-                
+# Below this speed (tank widths per second) the direction of travel is too noisy to orient the heading
+MIN_HEADING_SPEED = 0.05
+
+# Function to update velocity, heading and size from consecutive smoothed positions.
+# axis is the fish's body axis in tank space (ambiguous by 180 degrees), size its length.
+def update_motion(motion, x, y, t, axis=None, size=None):
+    if motion["t"] is not None and t > motion["t"]:
+        dt = t - motion["t"]
+        # Light exponential smoothing keeps frame-to-frame jitter out of the velocity
+        motion["vx"] = 0.5 * motion["vx"] + 0.5 * (x - motion["x"]) / dt
+        motion["vy"] = 0.5 * motion["vy"] + 0.5 * (y - motion["y"]) / dt
+    motion["t"], motion["x"], motion["y"] = t, x, y
+
+    speed = np.hypot(motion["vx"], motion["vy"])
+    if axis is not None:
+        # Point the body axis the way the fish is swimming (or was last facing)
+        if speed > MIN_HEADING_SPEED:
+            ref_x, ref_y = motion["vx"], motion["vy"]
+        else:
+            ref_x, ref_y = np.cos(motion["heading"]), np.sin(motion["heading"])
+        if axis[0] * ref_x + axis[1] * ref_y < 0:
+            axis = (-axis[0], -axis[1])
+        motion["heading"] = float(np.arctan2(axis[1], axis[0]))
+    elif speed > MIN_HEADING_SPEED:
+        motion["heading"] = float(np.arctan2(motion["vy"], motion["vx"]))
+
+    if size is not None:
+        motion["size"] = size
+
+    return {
+        "x": float(x),
+        "y": float(y),
+        "vx": float(motion["vx"]),
+        "vy": float(motion["vy"]),
+        "speed": float(speed),
+        "heading": motion["heading"],
+        "size": float(motion["size"])
+    }
+
+class FishTracker:
+    """Finds the red fish in one frame at a time and estimates its motion.
+
+    process(frame, t) returns a result dict:
+      seq, t       frame number and capture time
+      detected     True if the fish was found in this frame
+      state        tracking state name (searching, tentative, locked, coasting, lost)
+      confidence   how sure the tracker is of the position, 0-1
+      position     x, y, vx, vy, speed, heading, size (normalized tank units)
+      fish         the list published to the displays and the trajectory log, with
+                   the state number (tracking_state.py) and confidence
+      candidate    the blob considered this frame as bbox, center and accepted, or None
+      roi          the (x0, y0, x1, y1) window that was searched, None = whole frame
+
+    Once locked on, only a window around the fish is searched, on colour alone;
+    the background model is then refreshed every background_interval frames.
+    """
+
+    def __init__(self, settings, frame_width, frame_height, raw_yuyv=False):
+        self.settings = settings
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.raw_yuyv = raw_yuyv
+        self.color_space = settings['color_space']
+        self.tank_area = settings['tank_area']
+
+        # Perspective transformation (for the resolution the source actually delivers)
+        self.perspective_transform = setup_perspective_transform(self.tank_area, settings['lens'],
+                                                                 frame_width, frame_height)
+
+        # Every per-frame buffer, allocated once for this resolution
+        self.ctx = FrameContext(frame_width, frame_height, self.tank_area,
+                                (self.perspective_transform['width'], self.perspective_transform['height'])
+                                if self.perspective_transform else None)
+        self.mask_filter = MaskFilter(frame_width, frame_height, settings['morphology'])
+        self.glare = None
+        if settings.get('glare'):
+            from glare import GlareMask
+            self.glare = GlareMask(frame_width, frame_height, settings['glare'])
+
+        # Parameters for red fish detection
+        (self.lower_red1, self.upper_red1), (self.lower_red2, self.upper_red2) = \
+            [(np.array(low), np.array(high)) for low, high in settings['hsv_ranges']]
+
+        self.view = None  # The last frame as BGR, for the debug views
+        self.mask = None  # The last cleaned-up detection mask
+        self.timings = {'detect': 0.0, 'track': 0.0}  # Seconds spent on the last frame
+        self.track = TrackState(settings['tracking'], frame_width, frame_height)
+        self.reset()
+
+    def reset(self):
+        """Forget the background model and the fish's history."""
+        # Background subtractor for motion detection
+        self.bg_subtractor = cv2.createBackgroundSubtractorMOG2(history=200, varThreshold=25, detectShadows=False)
+        self.fish_position = {"x": 0.5, "y": 0.5, "vx": 0.0, "vy": 0.0,  # Default position (center), at rest
+                              "speed": 0.0, "heading": 0.0, "size": 0.0}
+        self.motion = {"t": None, "x": 0.5, "y": 0.5, "vx": 0.0, "vy": 0.0, "heading": 0.0, "size": 0.0}
+        self.position_history = []  # Track recent positions for smoothing
+        self.track.reset()
+        self.seq = 0
+
+    def describe(self):
+        lines = []
+        if self.perspective_transform:
+            lines.append(f"Perspective transformation set up with dimensions "
+                         f"{self.perspective_transform['width']}x{self.perspective_transform['height']}")
+            if 'point_map' in self.perspective_transform:
+                lines.append("Lens undistortion tables built and fused with the perspective transform")
+        lines.append(f"Mask clean-up: {self.mask_filter.describe()}")
+        if self.color_space == 'ycrcb':
+            lines.append(f"Red detection range: Cr({self.settings['cr_low']}-{self.settings['cr_high']})")
+        else:
+            (h1, s1, v1), (h1b, s1b, v1b) = self.lower_red1, self.upper_red1
+            h2, h2b = self.lower_red2[0], self.upper_red2[0]
+            lines.append(f"Red detection ranges: H({h1}-{h1b} and {h2}-{h2b}), S({s1}-{s1b}), V({v1}-{v1b})")
+        if self.glare:
+            lines.append(f"Glare suppression: {self.glare.describe()}")
+        lines.append(f"Contour area limits: {self.settings['min_contour_area']} - {self.settings['max_contour_area']}")
+        tracking = self.settings['tracking']
+        lines.append(f"Tracking: lock after {tracking['lock_frames']} frames, coast {tracking['coast_time']:g} s, "
+                     f"gate {tracking['gate']:g}" + (", window search when locked" if tracking['roi'] else ""))
+        return lines
+
+    # Split a captured frame into (view, luma, cr) for the YCrCb path; view is BGR for display
+    def _ycrcb_planes(self, frame):
+        ctx = self.ctx
+        if self.raw_yuyv:
+            luma, cr = yuyv_planes(frame, self.frame_width, self.frame_height, ctx.luma, ctx.cr, ctx.cr_half)
+            return cv2.cvtColor(luma, cv2.COLOR_GRAY2BGR, dst=ctx.gray_view), luma, cr
+        luma, cr = bgr_planes(frame, ctx.ycrcb, ctx.luma, ctx.cr)
+        return frame, luma, cr
+
+    def learn_background(self, frame):
+        """Feed a frame to the background model only (no detection)."""
+        if self.color_space == 'ycrcb':
+            self.bg_subtractor.apply(self._ycrcb_planes(frame)[1], self.ctx.fg_mask)
+        else:
+            # Apply tank area mask
+            masked_frame = self.ctx.mask_tank(frame, self.ctx.masked)
+            self.bg_subtractor.apply(masked_frame, self.ctx.fg_mask)
+
+    def detection_mask(self, frame, roi=None, learn=True):
+        """The cleaned-up mask of moving red pixels; also keeps the BGR view for display.
+
+        With roi = (x0, y0, x1, y1) only red inside that window is looked for (see _window_mask).
+        learn=False keeps the window search from updating the background model, for a
+        frame the model has already seen.
+        """
+        if roi is not None:
+            return self._window_mask(frame, roi, learn)
+        ctx = self.ctx
+        if self.color_space == 'ycrcb':
+            # Single-channel path: motion from luma, red from Cr, tank area applied to the red mask
+            view, luma, cr = self._ycrcb_planes(frame)
+            fg_mask = self.bg_subtractor.apply(luma, ctx.fg_mask)
+            red_mask = ctx.mask_tank(cv2.inRange(cr, self.settings['cr_low'], self.settings['cr_high'],
+                                                 dst=ctx.cr_mask), ctx.red_mask)
+        else:
+            view = frame
+
+            # Apply mask to restrict detection to tank area
+            masked_frame = ctx.mask_tank(frame, ctx.masked)
+
+            # Apply background subtraction to isolate moving objects
+            fg_mask = self.bg_subtractor.apply(masked_frame, ctx.fg_mask)
+
+            # Convert to HSV for better color filtering
+            hsv = cv2.cvtColor(masked_frame, cv2.COLOR_BGR2HSV, dst=ctx.hsv)
+
+            # Create mask for red color (combining both red ranges)
+            mask1 = cv2.inRange(hsv, self.lower_red1, self.upper_red1, dst=ctx.mask1)
+            mask2 = cv2.inRange(hsv, self.lower_red2, self.upper_red2, dst=ctx.mask2)
+            red_mask = cv2.bitwise_or(mask1, mask2, dst=ctx.red_mask)
+
+        # Combine with foreground mask to get only moving red objects
+        combined_mask = cv2.bitwise_and(red_mask, fg_mask, dst=ctx.combined)
+
+        # Drop what lies in learned glare and reflection cells
+        if self.glare and not self._glare_learning():
+            self.glare.apply(combined_mask)
+
+        # Apply morphological operations to remove noise
+        self.view = view
+        self.mask = self.mask_filter.apply(combined_mask)
+        return self.mask
+
+    # Every update_interval frames the glare mask is learned from an unsuppressed frame,
+    # so suppressed cells are checked as often as the rest
+    def _glare_learning(self):
+        return self.seq % self.settings['glare']['update_interval'] == 0
+
+    def _valid_bboxes(self, blobs):
+        """Bounding boxes of the blobs within the contour area limits."""
+        area = blobs['area']
+        return blobs['bbox'][(area > self.settings['min_contour_area']) & (area < self.settings['max_contour_area'])]
+
+    # Detection while locked on: the fish is known to be in the window, so colour alone
+    # is enough there, and a fish resting long enough to fade into the background model
+    # is still found. The model is kept current for when the full frame is searched again.
+    def _window_mask(self, frame, roi, learn=True):
+        ctx = self.ctx
+        x0, y0, x1, y1 = roi
+        window = np.s_[y0:y1, x0:x1]
+        refresh = learn and self.seq % max(self.settings['tracking']['background_interval'], 1) == 0
+        if self.color_space == 'ycrcb':
+            view, luma, cr = self._ycrcb_planes(frame)
+            if refresh:
+                self.bg_subtractor.apply(luma, ctx.fg_mask)
+            red_mask = ctx.mask_tank(cv2.inRange(cr[window], self.settings['cr_low'], self.settings['cr_high'],
+                                                 dst=ctx.cr_mask[window]), ctx.red_mask[window], roi)
+        else:
+            view = frame
+            if refresh:
+                self.learn_background(frame)
+            masked_window = ctx.mask_tank(frame[window], ctx.masked[window], roi)
+            hsv = cv2.cvtColor(masked_window, cv2.COLOR_BGR2HSV, dst=ctx.hsv[window])
+            mask1 = cv2.inRange(hsv, self.lower_red1, self.upper_red1, dst=ctx.mask1[window])
+            mask2 = cv2.inRange(hsv, self.lower_red2, self.upper_red2, dst=ctx.mask2[window])
+            red_mask = cv2.bitwise_or(mask1, mask2, dst=ctx.red_mask[window])
+
+        self.view = view
+        self.mask = self.mask_filter.apply(red_mask, roi)
+        return self.mask
+
+    def process(self, frame, frame_time=None):
+        """Track the fish in one frame. frame_time defaults to now."""
+        if frame_time is None:
+            frame_time = time.time()
+        track = self.track
+        started = time.perf_counter()
+        roi = track.search_roi(frame_time)
+        learning = self.glare is not None and self._glare_learning()
+        decoys = None
+        if learning and roi is not None:
+            # Reflections show up anywhere in the tank, not just in the window around the
+            # fish: glare-learning frames are also detected in full, for the decoys
+            decoys = self._valid_bboxes(analyze_blobs(self.detection_mask(frame), self.ctx.labels))
+        mask = self.detection_mask(frame, roi, learn=decoys is None)
+        detected_at = time.perf_counter()
+
+        # Measure all blobs in the mask (or the searched window of it) in a single pass
+        if roi is None:
+            blobs = analyze_blobs(mask, self.ctx.labels)
+        else:
+            x0, y0, x1, y1 = roi
+            blobs = analyze_blobs(mask[y0:y1, x0:x1], self.ctx.labels[y0:y1, x0:x1])
+            blobs['centroid'] = blobs['centroid'] + (x0, y0)
+            blobs['bbox'] = blobs['bbox'] + (x0, y0, 0, 0)
+
+        measurement = None
+        candidate = None
+
+        # Process blobs to find the fish, keeping those that meet our size criteria
+        valid_blobs = np.flatnonzero((blobs['area'] > self.settings['min_contour_area']) &
+                                     (blobs['area'] < self.settings['max_contour_area']))
+
+        if len(valid_blobs):
+            # Convert all candidate centroids to normalized tank coordinates at once
+            tank_positions = map_points_to_tank(blobs['centroid'][valid_blobs], mask.shape,
+                                                self.perspective_transform)
+
+            # The state machine picks the blob: the largest while searching, the one
+            # nearest the predicted position once there is a fish to follow
+            chosen = track.select(tank_positions, blobs['area'][valid_blobs], frame_time)
+            best = chosen if chosen is not None else int(np.argmax(blobs['area'][valid_blobs]))
+            fish_blob = valid_blobs[best]
+            fish_center_x, fish_center_y = blobs['centroid'][fish_blob]
+            bbox = tuple(int(v) for v in blobs['bbox'][fish_blob])
+            candidate = {'bbox': bbox, 'center': (float(fish_center_x), float(fish_center_y)), 'accepted': False}
+            if chosen is not None:
+                measurement = {'position': (float(tank_positions[best][0]), float(tank_positions[best][1])),
+                               'center': candidate['center'], 'size': float(max(bbox[2], bbox[3]))}
+
+        was_following = track.state in (LOCKED, COASTING)
+        fish_detected = track.update(frame_time, measurement)
+
+        if learning:
+            # Other red blobs seen while the fish is locked on are reflections or decoys
+            if fish_detected:
+                if decoys is None:
+                    decoys = self._valid_bboxes(blobs)
+                for bbox in decoys:
+                    if not boxes_overlap(bbox, candidate['bbox']):
+                        self.glare.add_decoy(tuple(int(v) for v in bbox))
+            self.glare.observe(self.view)
+
+        if fish_detected:
+            candidate['accepted'] = True
+            if not was_following:
+                # Newly confirmed: start from the fish instead of gliding over from the old position
+                self.position_history = []
+                self.motion.update(t=None, vx=0.0, vy=0.0)
+
+            # Get smoothed position
+            smooth_position = get_smooth_position(self.position_history,
+                                                  dict(zip(("x", "y"), measurement['position'])))
+
+            # Body axis in tank space: map both ends of the blob's major axis.
+            # Nearly round blobs have no reliable axis, so fall back to the direction of travel.
+            half_axis = blobs['major_axis'][fish_blob] / 2
+            angle = blobs['orientation'][fish_blob]
+            ends = map_points_to_tank([
+                (fish_center_x - half_axis * np.cos(angle), fish_center_y - half_axis * np.sin(angle)),
+                (fish_center_x + half_axis * np.cos(angle), fish_center_y + half_axis * np.sin(angle))
+            ], mask.shape, self.perspective_transform)
+            axis_x, axis_y = ends[1] - ends[0]
+            elongated = blobs['minor_axis'][fish_blob] < 0.8 * blobs['major_axis'][fish_blob]
+
+            # Publish the smoothed position with its motion features (swap the whole dict
+            # so the server thread never sees a half-updated position)
+            self.fish_position = update_motion(self.motion, smooth_position["x"], smooth_position["y"],
+                                               frame_time, axis=(axis_x, axis_y) if elongated else None,
+                                               size=float(np.hypot(axis_x, axis_y)))
+
+        # If fish not detected, hold the position and let the published velocity die away
+        else:
+            self._hold_position()
+
+        self.timings['detect'] = detected_at - started
+        self.timings['track'] = time.perf_counter() - detected_at
+        return self._result(frame_time, fish_detected, candidate, roi)
+
+    def predict(self, frame_time=None):
+        """The result for a moment without a frame (e.g. the camera dropped out):
+        the last position, held and marked stale, as for a frame with no fish."""
+        if frame_time is None:
+            frame_time = time.time()
+        self.track.update(frame_time, None)
+        self._hold_position()
+        return self._result(frame_time, False)
+
+    def _hold_position(self):
+        if self.fish_position["speed"] > 0:
+            self.motion["vx"] *= 0.8
+            self.motion["vy"] *= 0.8
+            self.fish_position = dict(self.fish_position, vx=self.motion["vx"], vy=self.motion["vy"],
+                                      speed=float(np.hypot(self.motion["vx"], self.motion["vy"])))
+
+    def _result(self, frame_time, fish_detected, candidate=None, roi=None):
+        self.seq += 1
+        track = self.track
+        confidence = track.confidence
+        return {
+            'seq': self.seq,
+            't': frame_time,
+            'detected': fish_detected,
+            'state': track.name,
+            'confidence': confidence,
+            'position': self.fish_position,
+            'fish': [dict(self.fish_position, flags=FLAG_DETECTED if fish_detected else FLAG_STALE,
+                          state=track.state, confidence=confidence)],
+            'candidate': candidate,
+            'roi': roi
+        }
+
+    def draw_debug(self, result, label=None):
+        """Debug views of the last processed frame: (annotated frame, corrected tank view or None)."""
+        ctx = self.ctx
+
+        # The frame with the mask overlaid in red (tank area only)
+        debug_view = ctx.draw_overlay(self.view, self.mask)
+
+        # Add tank area boundary to debug view
+        if self.tank_area:
+            pts = np.array(self.tank_area, np.int32).reshape((-1, 1, 2))
+            cv2.polylines(debug_view, [pts], True, (0, 255, 255), 2)
+
+        # Cells suppressed as glare or reflections
+        if self.glare and self.glare.contours:
+            cv2.polylines(debug_view, self.glare.contours, True, (255, 0, 255), 1)
+
+        # The window searched while locked on
+        if result['roi']:
+            x0, y0, x1, y1 = result['roi']
+            cv2.rectangle(debug_view, (x0, y0), (x1, y1), (255, 255, 0), 1)
+
+        candidate = result['candidate']
+        if candidate:
+            x, y, w, h = candidate['bbox']
+            if candidate['accepted']:
                 # Draw rectangle around the fish
                 cv2.rectangle(debug_view, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                cv2.circle(debug_view, (fish_center_x, fish_center_y), 5, (0, 0, 255), -1)
-                cv2.putText(debug_view, f"Fish: {fish_position['x']:.2f}, {fish_position['y']:.2f}", 
-                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                cv2.circle(debug_view, (int(candidate['center'][0]), int(candidate['center'][1])), 5, (0, 0, 255), -1)
+            elif self.track.state == TENTATIVE:
+                # A candidate waiting for confirmation
+                cv2.rectangle(debug_view, (x, y), (x+w, y+h), (0, 255, 255), 2)
+                cv2.putText(debug_view, f"Tentative {self.track.hits}/{self.settings['tracking']['lock_frames']}",
+                           (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
             else:
-                # Draw rectangle with different color to show invalid detection
+                # Draw rectangle with different color to show a rejected detection (too far from the fish)
                 cv2.rectangle(debug_view, (x, y), (x+w, y+h), (0, 165, 255), 2)
-                cv2.putText(debug_view, "Invalid detection", (x, y-10), 
+                cv2.putText(debug_view, "Rejected", (x, y-10),
                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 165, 255), 2)
-    
-    # If fish not detected, decrease confidence
-    if not fish_detected:
-        detect_confidence = max(detect_confidence - 1, 0)
-        cv2.putText(debug_view, f"No detection (conf: {detect_confidence})", 
-                   (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-    
-    # Add camera index information to the debug view
-    cv2.putText(debug_view, f"Camera: {CAMERA_INDEX}", (frame.shape[1]-150, 30), 
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-    
-    # Display the debug view
-    cv2.imshow('Red Fish Tracker', debug_view)
-    
-    # If we have a corrected view, display that too (resized for visibility)
-    if perspective_transform and TANK_AREA_DEFINED:
-        # Resize if too big
-        h, w = corrected_view.shape[:2]
-        max_height = 300
-        if h > max_height:
-            ratio = max_height / h
-            corrected_view = cv2.resize(corrected_view, (int(w * ratio), max_height))
-        
-        cv2.imshow('Corrected Tank View', corrected_view)
-    
-    # Break the loop with 'q' key
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-    
-    # Add a small delay to reduce CPU usage
-    time.sleep(0.01)
-
-# Release resources
-cap.release()
-cv2.destroyAllWindows()
-print("Fish tracking stopped.")
\ No newline at end of file
+
+        if result['detected']:
+            cv2.putText(debug_view, f"Fish: {result['position']['x']:.2f}, {result['position']['y']:.2f} "
+                                    f"({result['confidence']:.2f})",
+                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        else:
+            cv2.putText(debug_view, f"{result['state'].capitalize()} (conf: {result['confidence']:.2f})",
+                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+        if label:
+            cv2.putText(debug_view, label, (debug_view.shape[1]-150, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+        # If perspective correction is available, create a corrected view
+        corrected_view = None
+        transform = self.perspective_transform
+        if transform:
+            if 'view_maps' in transform:
+                corrected_view = cv2.remap(self.view, *transform['view_maps'], cv2.INTER_LINEAR, dst=ctx.corrected)
+            else:
+                corrected_view = cv2.warpPerspective(self.view, transform['matrix'],
+                                                     (transform['width'], transform['height']), dst=ctx.corrected)
+            # Resize if too big (to at most 300 px high)
+            if ctx.corrected_small is not None:
+                h, w = ctx.corrected_small.shape[:2]
+                corrected_view = cv2.resize(corrected_view, (w, h), dst=ctx.corrected_small)
+
+        return debug_view, corrected_view
+
+class TrackerService:
+    """Runs a FishTracker on a frame source and publishes every result.
+
+    Lifecycle: start() opens the source, learns the background and starts the
+    position server and recorder; step() processes one frame; run() steps until
+    the source ends, stop() is called or 'q' is pressed in the debug window;
+    stop() releases everything.
+
+    With a SupervisedSource, a camera dropout doesn't end run(): until frames come
+    back, step() publishes the last position marked stale (FishTracker.predict).
+    health() (and /health) reports uptime, frame counts and the capture status;
+    /healthz, /readyz and /metrics are for monitoring (see metrics.py).
+    """
+
+    def __init__(self, settings, source, display=True, serve=True):
+        self.settings = settings
+        self.source = source
+        self.display = display
+        self.serve = serve
+        self.tracker = None
+        self.position_server = None
+        self.trajectory_recorder = None
+        self.occupancy = None
+        self.occupancy_saved = 0.0
+        self.events = None
+        self.running = False
+        self.started_at = None
+        self.ready = False  # Background learned
+        self.last_step = None  # When the loop last completed a step (liveness)
+        self.frames = 0  # Frames tracked
+        self.missed_frames = 0  # Stale results published while the source had no frame
+        self.last_state = None  # Tracking state of the previous step, to log changes
+        # Seconds start() took: to open the camera ('camera'), until serving ('server'),
+        # learning the background ('background') and in all ('total')
+        self.startup = {}
+        self.metrics = TrackerMetrics()
+
+    def start(self):
+        """Returns False if the frame source can't be opened."""
+        started = time.perf_counter()
+        log.info("Opening %s...", self.source.name)
+        if not self.source.open():
+            return False
+        self.startup['camera'] = time.perf_counter() - started
+
+        self.tracker = FishTracker(self.settings, self.source.width, self.source.height, self.source.raw_yuyv)
+        for line in self.tracker.describe():
+            log.info(line)
+
+        # Serve positions over HTTP (/position, /position.bin), the WebSocket push channel
+        # for high-rate consumers and, if enabled, multicast for display PCs running the
+        # position_multicast.py relay, plus the display pages themselves. It starts once
+        # every route is added (below).
+        if self.serve:
+            from position_server import PositionServer
+            server = self.settings['server']
+            self.position_server = PositionServer(server['port'], server['ws_port'], server['multicast'],
+                                                  server['web'])
+            self.add_routes(self.position_server.app)
+
+        # Trajectory recorder (writes from its own thread, the loop only queues rows)
+        recording = self.settings['recording']
+        if recording:
+            from trajectory_log import TrajectoryRecorder
+            self.trajectory_recorder = TrajectoryRecorder(recording['directory'], recording['rotate_bytes'],
+                                                          recording['flush_interval'])
+            self.trajectory_recorder.start()
+            log.info("Recording trajectories to %s", recording['directory'])
+
+        # Occupancy heatmap, continued from the last saved one
+        occupancy = self.settings['occupancy']
+        if occupancy:
+            from occupancy import OccupancyMap
+            self.occupancy = OccupancyMap(occupancy['grid_width'], occupancy['grid_height'], occupancy['half_life'])
+            if self.occupancy.load(occupancy['file']):
+                log.info("Occupancy heatmap continued from %s", occupancy['file'])
+            self.occupancy_saved = time.monotonic()
+            if self.position_server:
+                self.occupancy.add_routes(self.position_server.app)
+
+        # Events, pushed over the WebSocket as they happen and kept for /events
+        if self.settings['events']:
+            from events import EventEngine
+            self.events = EventEngine(self.settings['events'])
+            if self.position_server:
+                self.events.add_routes(self.position_server.app)
+            log.info("Event detection on, %d zone(s)", len(self.events.zones))
+
+        # Serving starts before the background is learned; /readyz says when positions are real
+        if self.position_server:
+            self.position_server.start()
+            log.info("Server running on port %d", self.settings['server']['port'])
+        self.startup['server'] = time.perf_counter() - started
+
+        # Allow background subtractor to learn the background
+        log.info("Learning background... Please wait.")
+        learning = time.perf_counter()
+        for i in range(30):
+            ret, frame, _ = self.source.read()
+            if ret:
+                self.tracker.learn_background(frame)
+                if self.source.live:
+                    time.sleep(0.05)
+        self.startup['background'] = time.perf_counter() - learning
+        self.startup['total'] = time.perf_counter() - started
+        log.info("Started in %.1f s (camera %.1f s, background %.1f s)", self.startup['total'],
+                 self.startup['camera'], self.startup['background'], extra={'fields': {'startup': self.startup}})
+
+        self.started_at = self.last_step = time.monotonic()
+        self.ready = True
+        self.running = True
+        return True
+
+    def step(self):
+        """Process and publish one frame. Returns the result, or None when the source has ended."""
+        stages = self.metrics.stages
+        started = time.perf_counter()
+        ret, frame, frame_time = self.source.read()
+        captured = time.perf_counter()
+        if ret:
+            if ((self.source.width, self.source.height, self.source.raw_yuyv) !=
+                    (self.tracker.frame_width, self.tracker.frame_height, self.tracker.raw_yuyv)):
+                # The camera came back at a different resolution or pixel format
+                log.warning("Frame format changed to %dx%d %s, restarting the tracker", self.source.width,
+                            self.source.height, 'YUYV' if self.source.raw_yuyv else 'BGR')
+                self.tracker = FishTracker(self.settings, self.source.width, self.source.height, self.source.raw_yuyv)
+            result = self.tracker.process(frame, frame_time)
+            self.frames += 1
+            stages['capture'].observe(captured - started)
+            stages['detect'].observe(self.tracker.timings['detect'])
+            stages['track'].observe(self.tracker.timings['track'])
+        elif hasattr(self.source, 'health'):
+            # Supervised source without a frame right now: keep the displays fed
+            result = self.tracker.predict(frame_time)
+            self.missed_frames += 1
+        else:
+            return None
+
+        # Publish the frame's result, stamped so displays can place it on their own timeline
+        if self.position_server:
+            self.position_server.publish(result['seq'], result['t'], result['fish'])
+        if self.trajectory_recorder:
+            self.trajectory_recorder.record(result['seq'], result['t'], result['fish'])
+        if self.events:
+            for event in self.events.update(result):
+                if self.position_server:
+                    self.position_server.publish_event(event)
+        if self.occupancy:
+            position = result['position']
+            self.occupancy.update(result['t'], position['x'], position['y'], position['speed'], result['detected'])
+            if time.monotonic() - self.occupancy_saved > self.settings['occupancy']['save_interval']:
+                self._save_occupancy()
+
+        published = time.perf_counter()
+        if ret:
+            stages['publish'].observe(published - captured - self.tracker.timings['detect'] -
+                                      self.tracker.timings['track'])
+
+        if self.display and ret:
+            debug_view, corrected_view = self.tracker.draw_debug(result, f"Camera: {self.settings['camera']['camera_index']}"
+                                                                 if self.source.live else None)
+            cv2.imshow('Red Fish Tracker', debug_view)
+            if corrected_view is not None:
+                cv2.imshow('Corrected Tank View', corrected_view)
+            stages['display'].observe(time.perf_counter() - published)
+
+        self.metrics.frame(result, ret)
+        self._log_frame(result, ret)
+        self.last_step = time.monotonic()
+        return result
+
+    def _log_frame(self, result, processed):
+        """Tracking state changes at info level, a sample of the frames at debug level."""
+        state = result['state']
+        if state != self.last_state:
+            self.last_state = state
+            log.info("Tracking state: %s", state, extra={'key': 'state', 'fields': {
+                'seq': result['seq'], 'state': state, 'confidence': round(result['confidence'], 3)}})
+        if log.isEnabledFor(logging.DEBUG):
+            timings = self.tracker.timings
+            log.debug("Frame %d: %s, confidence %.2f, detection %.1f ms", result['seq'], state,
+                      result['confidence'], 1000 * timings['detect'],
+                      extra={'key': 'frame', 'sample': FRAME_LOG_SAMPLE, 'fields': {
+                'seq': result['seq'], 'state': state, 'confidence': round(result['confidence'], 3),
+                'detected': result['detected'], 'x': result['position']['x'], 'y': result['position']['y'],
+                'processed': processed, 'detect_ms': round(1000 * timings['detect'], 2),
+                'track_ms': round(1000 * timings['track'], 2)}})
+
+    def run(self):
+        while self.running:
+            if self.step() is None:
+                if self.source.live:
+                    log.error("Failed to capture image")
+                break
+
+            # Break the loop with 'q' key
+            if self.display and cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+
+            # Add a small delay to reduce CPU usage
+            if self.source.live:
+                time.sleep(0.01)
+        self.running = False
+
+    def health(self):
+        """Uptime, start-up times, frame counters, tracking state and, for a supervised source, the capture status."""
+        tracker = self.tracker
+        health = {
+            'running': self.running,
+            'uptime': time.monotonic() - self.started_at if self.started_at else 0.0,
+            'frames': self.frames,
+            'missed_frames': self.missed_frames,
+            'tracking': {'state': tracker.track.name, 'confidence': tracker.track.confidence} if tracker else None,
+            'source': self.source.name,
+            'startup': self.startup
+        }
+        if hasattr(self.source, 'health'):
+            health['capture'] = self.source.health()
+        return health
+
+    def readiness(self):
+        """(ready, reasons not ready): the background is learned and the camera delivers frames."""
+        reasons = []
+        if not self.running or not self.ready:
+            reasons.append('background not learned' if not self.ready else 'not running')
+        if hasattr(self.source, 'health'):
+            status = self.source.health()['status']
+            if status != 'running':
+                reasons.append(f'camera {status}')
+        return not reasons, reasons
+
+    def alive(self):
+        """True while the loop keeps stepping (it steps at least every 0.1 s, camera or not)."""
+        return self.running and self.last_step is not None and \
+            time.monotonic() - self.last_step < LIVENESS_TIMEOUT
+
+    def add_routes(self, app):
+        """Serve /health, /healthz, /readyz and /metrics from a Flask app, and count its requests."""
+        from flask import Response, jsonify
+
+        self.metrics.add_request_hooks(app)
+
+        @app.route('/health')
+        def get_health():
+            return jsonify(self.health())
+
+        # Liveness: the tracking loop hasn't hung
+        @app.route('/healthz')
+        def healthz():
+            alive = self.alive()
+            return jsonify({'status': 'ok' if alive else 'stuck'}), 200 if alive else 503
+
+        # Readiness: positions are real (background learned, camera delivering frames)
+        @app.route('/readyz')
+        def readyz():
+            ready, reasons = self.readiness()
+            return jsonify({'status': 'ready' if ready else 'not ready', 'reasons': reasons}), 200 if ready else 503
+
+        @app.route('/metrics')
+        def metrics():
+            return Response(self.metrics.render(self.health()), mimetype='text/plain; version=0.0.4')
+
+    def _save_occupancy(self):
+        self.occupancy_saved = time.monotonic()
+        try:
+            self.occupancy.save(self.settings['occupancy']['file'])
+        except OSError as e:
+            log.warning("Could not save the occupancy heatmap: %s", e)
+
+    def stop(self):
+        self.running = False
+        if self.occupancy:
+            self._save_occupancy()
+        if self.position_server:
+            self.position_server.stop()
+        if self.trajectory_recorder:
+            self.trajectory_recorder.stop()
+            log.info("Recorded %d rows to %d file(s)", self.trajectory_recorder.rows_written,
+                     len(self.trajectory_recorder.files))
+        self.source.release()
+        if self.display:
+            cv2.destroyAllWindows()
+
+def main():
+    if hasattr(signal, 'SIGBREAK'):
+        # Windows: Ctrl+Break (how launcher.py stops the tracker) quits like Ctrl+C, saving state
+        signal.signal(signal.SIGBREAK, signal.default_int_handler)
+    setup_logging(load_logging_settings(CONFIG_FILE))
+    try:
+        run_tracker()
+    finally:
+        shutdown_logging()
+
+def run_tracker():
+    try:
+        settings = load_settings()
+    except FileNotFoundError as e:
+        log.error("Configuration file not found: %s", e)
+        log.info("Please run calibrate_tank_area.py first to set up your fish tank area.")
+        sys.exit(1)
+
+    from frame_sources import CameraSource, SupervisedSource
+    camera = settings['camera']
+
+    # On the YCrCb path a YUYV camera can hand over its raw frames, skipping the BGR conversion.
+    # The camera is reopened in the background if it drops out or stops delivering frames.
+    raw_yuyv = settings['color_space'] == 'ycrcb' and camera['fourcc'] == 'YUYV'
+    source = SupervisedSource(lambda: CameraSource(camera, raw_yuyv=raw_yuyv), camera['stall_timeout'],
+                              camera['reconnect_delay'], camera['reconnect_max_delay'])
+    service = TrackerService(settings, source)
+    if not service.start():
+        log.error("Could not open camera with index %d.", camera['camera_index'])
+        log.info("Available camera indices might be different. Try updating the 'camera_index' in config.ini.")
+        sys.exit(1)
+
+    log.info("Red fish tracking started using camera %d. Press 'q' to quit.", camera['camera_index'])
+    try:
+        service.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        log.info("Fish tracking stopped.")
+
+if __name__ == "__main__":
+    main()
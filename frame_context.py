@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+
+# Every per-frame image buffer of the tracking loop, allocated once.
+#
+# OpenCV returns a freshly allocated array from each call unless it is given a
+# dst= of the right size and type. At 640x480 the loop went through a dozen
+# full-frame arrays per frame; on the Pi that churn shows up as page faults and
+# allocator stalls in the latency spikes. The loop now writes every stage into
+# the buffers below (the mask clean-up keeps its own, see mask_morphology.py), so
+# steady-state memory stays flat.
+#
+# Masked operations are done as a plain AND with a precomputed tank mask rather
+# than with mask=, because OpenCV leaves dst untouched outside the mask and a
+# reused buffer would keep the previous frame's pixels there.
+
+class FrameContext:
+    """Preallocated buffers for one camera resolution and tank area."""
+
+    def __init__(self, width, height, tank_area=None, output_size=None):
+        self.width = width
+        self.height = height
+        gray = (height, width)
+        color = (height, width, 3)
+
+        # Tank area as a 1- and 3-channel 0/255 mask (None = whole frame)
+        self.tank_mask = None
+        self.tank_mask_bgr = None
+        if tank_area:
+            self.tank_mask = np.zeros(gray, dtype=np.uint8)
+            points = np.array(tank_area, dtype=np.int32).reshape((-1, 1, 2))
+            cv2.fillPoly(self.tank_mask, [points], 255)
+            self.tank_mask_bgr = cv2.cvtColor(self.tank_mask, cv2.COLOR_GRAY2BGR)
+
+        # HSV path
+        self.masked = np.empty(color, dtype=np.uint8)
+        self.hsv = np.empty(color, dtype=np.uint8)
+        self.mask1 = np.empty(gray, dtype=np.uint8)
+        self.mask2 = np.empty(gray, dtype=np.uint8)
+
+        # YCrCb / raw YUYV path
+        self.ycrcb = np.empty(color, dtype=np.uint8)
+        self.luma = np.empty(gray, dtype=np.uint8)
+        self.cr = np.empty(gray, dtype=np.uint8)
+        self.cr_half = np.empty((height, width // 2), dtype=np.uint8)
+        self.gray_view = np.empty(color, dtype=np.uint8)
+        self.cr_mask = np.empty(gray, dtype=np.uint8)
+
+        # Shared mask stages
+        self.fg_mask = np.empty(gray, dtype=np.uint8)
+        self.red_mask = np.empty(gray, dtype=np.uint8)
+        self.combined = np.empty(gray, dtype=np.uint8)
+        self.labels = np.empty(gray, dtype=np.int32)
+
+        # Debug display: the red channel of the overlay is the only one ever written
+        self.debug = np.empty(color, dtype=np.uint8)
+        self.overlay = np.zeros(color, dtype=np.uint8)
+
+        # Perspective-corrected view and its on-screen copy (at most 300 px high)
+        self.corrected = None
+        self.corrected_small = None
+        if output_size:
+            out_w, out_h = output_size
+            self.corrected = np.empty((out_h, out_w, 3), dtype=np.uint8)
+            if out_h > 300:
+                self.corrected_small = np.empty((300, int(out_w * 300 / out_h), 3), dtype=np.uint8)
+
+    def mask_tank(self, src, dst, roi=None):
+        """src restricted to the tank area, written to dst (src itself if there is no tank area).
+
+        With roi = (x0, y0, x1, y1), src and dst are that window of the frame.
+        """
+        if self.tank_mask is None:
+            return src
+        tank_mask = self.tank_mask_bgr if src.ndim == 3 else self.tank_mask
+        if roi is not None:
+            tank_mask = tank_mask[roi[1]:roi[3], roi[0]:roi[2]]
+        return cv2.bitwise_and(src, tank_mask, dst=dst)
+
+    def draw_overlay(self, view, mask):
+        """Copy view into the debug buffer and blend the mask over it in red."""
+        np.copyto(self.debug, view)
+        self.overlay[:, :, 2] = mask
+        overlay = self.mask_tank(self.overlay, self.overlay)
+        return cv2.addWeighted(self.debug, 1.0, overlay, 0.5, 0, dst=self.debug)
@@ -0,0 +1,294 @@
+import logging
+import threading
+import time
+
+import cv2
+
+from camera_capture import open_camera, enable_raw_yuyv
+
+log = logging.getLogger('frame_sources')
+
+# Where FishTracker's frames come from. Every source has the same small interface:
+#
+#   open()     -> True if frames can be read
+#   read()     -> (ok, frame, timestamp), timestamp in seconds
+#   release()
+#   width, height, raw_yuyv, live, name
+#
+# Live sources stamp frames with the wall clock. Recorded ones stamp them from
+# the file's frame rate, so velocities come out right however fast the frames
+# are processed.
+#
+# SupervisedSource wraps a live source so that a camera dropping out doesn't end
+# tracking: read() returns (False, None, now) while there are no frames, and the
+# camera is reopened in the background until it is back.
+
+READ_WAIT = 0.1  # Seconds read() waits for a frame before reporting none (keeps callers ticking)
+
+class CameraSource:
+    """The configured camera, negotiated through camera_capture.open_camera."""
+
+    live = True
+
+    def __init__(self, settings, raw_yuyv=False):
+        self.settings = settings
+        self.want_raw_yuyv = raw_yuyv
+        self.raw_yuyv = False
+        self.cap = None
+        self.width = settings['width']
+        self.height = settings['height']
+        self.name = f"camera {settings['camera_index']}"
+
+    def open(self):
+        self.cap = open_camera(self.settings)
+        if self.cap is None:
+            return False
+        # Use the resolution the camera actually granted
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or self.settings['width']
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or self.settings['height']
+        if self.want_raw_yuyv:
+            self.raw_yuyv = enable_raw_yuyv(self.cap)
+        return True
+
+    def read(self):
+        ret, frame = self.cap.read()
+        return ret, frame, time.time()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+class VideoSource:
+    """A video file, optionally looped; frames are stamped at the file's frame rate.
+
+    start_frame seeks before the first read; timestamps count from the start of
+    the file either way.
+    """
+
+    live = False
+    raw_yuyv = False
+
+    def __init__(self, path, loop=False, start_time=0.0, start_frame=0):
+        self.path = path
+        self.loop = loop
+        self.start_time = start_time
+        self.start_frame = start_frame
+        self.cap = None
+        self.index = start_frame
+        self.frame_count = 0
+        self.width = self.height = 0
+        self.fps = 0.0
+        self.name = path
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.path)
+        if not self.cap.isOpened():
+            self.cap.release()
+            self.cap = None
+            return False
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if self.start_frame:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+        return True
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if not ret and self.loop and self.index:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        if not ret:
+            return False, None, None
+        timestamp = self.start_time + self.index / self.fps
+        self.index += 1
+        return True, frame, timestamp
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+class ArraySource:
+    """Frames already in memory (benchmarks, tests, embedding), stamped at a fixed rate."""
+
+    live = False
+    raw_yuyv = False
+
+    def __init__(self, frames, fps=30.0, loop=False, start_time=0.0):
+        self.frames = frames
+        self.fps = fps
+        self.loop = loop
+        self.start_time = start_time
+        self.index = 0
+        self.height, self.width = frames[0].shape[:2] if len(frames) else (0, 0)
+        self.name = f"{len(frames)} frames"
+
+    def open(self):
+        return len(self.frames) > 0
+
+    def read(self):
+        if self.index >= len(self.frames) and not self.loop:
+            return False, None, None
+        frame = self.frames[self.index % len(self.frames)]
+        timestamp = self.start_time + self.index / self.fps
+        self.index += 1
+        return True, frame, timestamp
+
+    def release(self):
+        pass
+
+class SupervisedSource:
+    """A live source read on its own thread and reopened when it fails or stalls.
+
+    make_source() returns a new, unopened source (e.g. a CameraSource). A failed
+    read, or no frame for stall_timeout seconds, releases the device and reopens
+    it, waiting reconnect_delay seconds after the first failed attempt and doubling
+    up to reconnect_max_delay. A read stuck in the driver is abandoned to its thread
+    (which releases the device if it ever returns) and a fresh one takes over.
+    """
+
+    live = True
+
+    def __init__(self, make_source, stall_timeout=2.0, reconnect_delay=0.5, reconnect_max_delay=10.0):
+        self.make_source = make_source
+        self.stall_timeout = stall_timeout
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_max_delay = reconnect_max_delay
+
+        first = make_source()
+        self.pending = first  # Opened by open(), then handed to the reader thread
+        self.name = first.name
+        self.width, self.height = first.width, first.height
+        self.raw_yuyv = False
+
+        self.condition = threading.Condition()
+        self.stopped = threading.Event()
+        self.generation = 0  # Bumped to retire a reader thread
+        self.frame = None
+        self.frame_time = None
+        self.frame_id = 0
+        self.taken_id = 0
+
+        # Health counters
+        self.status = 'stopped'  # running, reconnecting or stopped
+        self.opened_at = None
+        self.connected_at = None
+        self.last_frame_at = None
+        self.frames = 0
+        self.dropped = 0  # Frames replaced by a newer one before read() took them
+        self.read_failures = 0
+        self.stalls = 0
+        self.reconnects = 0
+        self.last_error = None
+
+    def open(self):
+        """Open the device once, synchronously; after that, failures are handled in the background."""
+        if not self.pending.open():
+            return False
+        source, self.pending = self.pending, None
+        self.width, self.height, self.raw_yuyv = source.width, source.height, source.raw_yuyv
+        now = time.monotonic()
+        self.opened_at = self.connected_at = self.last_frame_at = now
+        self.status = 'running'
+        self._start_reader(source)
+        return True
+
+    def _start_reader(self, source=None):
+        thread = threading.Thread(target=self._read_loop, args=(self.generation, source), daemon=True)
+        thread.start()
+        self.thread = thread
+
+    def _current(self, generation):
+        return generation == self.generation and not self.stopped.is_set()
+
+    def _read_loop(self, generation, source):
+        delay = 0.0
+        while self._current(generation):
+            if source is None:
+                # Reopen, backing off while the device stays away
+                if self.stopped.wait(delay):
+                    break
+                delay = min(max(delay * 2, self.reconnect_delay), self.reconnect_max_delay)
+                source = self.make_source()
+                if not source.open():
+                    source = None
+                    with self.condition:
+                        self.last_error = f"could not open {self.name}"
+                    continue
+                with self.condition:
+                    if not self._current(generation):
+                        break
+                    self.reconnects += 1
+                    self.width, self.height, self.raw_yuyv = source.width, source.height, source.raw_yuyv
+                    self.connected_at = self.last_frame_at = time.monotonic()
+                    self.status = 'running'
+                log.info("Reconnected to %s", self.name)
+                delay = 0.0
+
+            ok, frame, t = source.read()
+            if not self._current(generation):
+                break
+            if not ok:
+                source.release()
+                source = None
+                with self.condition:
+                    self.read_failures += 1
+                    self.status = 'reconnecting'
+                    self.last_error = f"read from {self.name} failed"
+                log.warning("Lost %s, reconnecting...", self.name)
+                continue
+
+            with self.condition:
+                self.frame, self.frame_time = frame, t
+                self.frame_id += 1
+                self.frames += 1
+                self.last_frame_at = time.monotonic()
+                self.condition.notify_all()
+        if source is not None:
+            source.release()
+
+    def read(self):
+        """The newest frame, or (False, None, now) if none arrived within READ_WAIT."""
+        with self.condition:
+            if self.condition.wait_for(lambda: self.frame_id != self.taken_id, timeout=READ_WAIT):
+                self.dropped += self.frame_id - self.taken_id - 1
+                self.taken_id = self.frame_id
+                return True, self.frame, self.frame_time
+
+            # A device that stops delivering without an error is given up on
+            if self.status == 'running' and time.monotonic() - self.last_frame_at > self.stall_timeout:
+                self.stalls += 1
+                self.generation += 1
+                self.status = 'reconnecting'
+                self.last_error = f"no frame from {self.name} for {self.stall_timeout:g} s"
+                log.warning("%s, reconnecting...", self.last_error)
+                self._start_reader()
+        return False, None, time.time()
+
+    def health(self):
+        """Capture status and counters, ages in seconds."""
+        now = time.monotonic()
+        with self.condition:
+            return {
+                'status': self.status,
+                'uptime': now - self.opened_at if self.opened_at else 0.0,
+                'connected_for': now - self.connected_at if self.status == 'running' and self.connected_at else 0.0,
+                'last_frame_age': now - self.last_frame_at if self.last_frame_at else None,
+                'frames': self.frames,
+                'dropped': self.dropped,
+                'read_failures': self.read_failures,
+                'stalls': self.stalls,
+                'reconnects': self.reconnects,
+                'last_error': self.last_error
+            }
+
+    def release(self):
+        self.stopped.set()
+        with self.condition:
+            self.generation += 1
+            self.status = 'stopped'
+        if self.opened_at is not None:
+            self.thread.join(timeout=self.stall_timeout)
@@ -0,0 +1,132 @@
+import cv2
+import numpy as np
+
+# Suppression of glare and reflections, learned while the tracker runs.
+#
+# Two things in a tank look like the fish to the detector: the fish's own mirror
+# image in the glass, which is red and moves with it, and bright spots of light on
+# the water or glass. The frame is divided into cells of cell_size pixels and two
+# slow averages are kept per cell:
+#
+#   glare    the fraction of its pixels that are bright and colourless (V at least
+#            glare_value, S at most glare_saturation), i.e. stationary highlights
+#   mirror   how often a red blob was seen there while the tracker was locked on
+#            the fish somewhere else - reflections and other decoys
+#
+# Cells whose glare or mirror average passes its threshold, and their neighbours
+# (reflections move about), are removed from the detection mask; they are released
+# again once the average falls to half of it. At most max_coverage of the frame is
+# ever suppressed, the worst cells first. The mask applies to full-frame searches:
+# once the tracker is locked on, its gate keeps decoys out and the fish must stay
+# visible wherever it swims.
+#
+# Learning runs on every update_interval-th frame, which is detected without the
+# mask so that suppressed cells keep being sampled like the rest, and over the whole
+# frame even while the tracker searches only a window around the fish, so mirror
+# images on the far walls are seen. The mask is
+# cached at full resolution and only rebuilt when a cell changes, so every other
+# frame costs one AND.
+
+def load_glare_settings(config):
+    """Glare suppression settings from the [Glare] section, with defaults for older configs."""
+    return {
+        'cell_size': config.getint('Glare', 'cell_size', fallback=8),
+        'update_interval': config.getint('Glare', 'update_interval', fallback=15),
+        'history': config.getint('Glare', 'history', fallback=240),
+        'glare_value': config.getint('Glare', 'glare_value', fallback=230),
+        'glare_saturation': config.getint('Glare', 'glare_saturation', fallback=40),
+        'glare_threshold': config.getfloat('Glare', 'glare_threshold', fallback=0.5),
+        'mirror_threshold': config.getfloat('Glare', 'mirror_threshold', fallback=0.1),
+        'max_coverage': config.getfloat('Glare', 'max_coverage', fallback=0.15)
+    }
+
+class GlareMask:
+    """Learned low-resolution mask of glare and reflection cells, cached at full resolution."""
+
+    def __init__(self, width, height, settings):
+        self.settings = settings
+        self.cell = max(settings['cell_size'], 1)
+        self.width = width
+        self.height = height
+        self.grid_size = (max(width // self.cell, 1), max(height // self.cell, 1))
+        grid = (self.grid_size[1], self.grid_size[0])
+
+        self.rate = 1.0 / max(settings['history'], 1)
+        self.glare = np.zeros(grid, dtype=np.float32)
+        self.mirror = np.zeros(grid, dtype=np.float32)
+        self.hits = np.zeros(grid, dtype=np.uint8)  # Decoy blobs in the observed frame
+        self.updates = 0
+
+        self.hsv = np.empty((height, width, 3), dtype=np.uint8)
+        self.bright = np.empty((height, width), dtype=np.uint8)
+        self.fraction = np.empty(grid, dtype=np.uint8)
+        self.bright_low = np.array([0, 0, settings['glare_value']], dtype=np.uint8)
+        self.bright_high = np.array([180, settings['glare_saturation'], 255], dtype=np.uint8)
+
+        self.suppress = np.zeros(grid, dtype=bool)
+        self.keep = np.full((height, width), 255, dtype=np.uint8)  # 0 where suppressed
+        self.contours = []  # Outline of the suppressed cells in frame pixels, for the debug view
+
+    @property
+    def suppressed(self):
+        """Fraction of the frame currently suppressed."""
+        return float(self.suppress.mean())
+
+    def describe(self):
+        s = self.settings
+        return (f"{self.cell} px cells, learned every {s['update_interval']} frames, "
+                f"at most {100 * s['max_coverage']:.0f}% of the frame")
+
+    def add_decoy(self, bbox):
+        """Record a red blob that wasn't the fish in the frame about to be observed
+        (x, y, w, h in frame pixels)."""
+        x, y, w, h = bbox
+        cv2.rectangle(self.hits, (x // self.cell, y // self.cell),
+                      ((x + w - 1) // self.cell, (y + h - 1) // self.cell), 1, -1)
+
+    def observe(self, view):
+        """Learn from one BGR frame (call every update_interval frames)."""
+        hsv = cv2.cvtColor(view, cv2.COLOR_BGR2HSV, dst=self.hsv)
+        bright = cv2.inRange(hsv, self.bright_low, self.bright_high, dst=self.bright)
+        # Area averaging turns the 0/255 mask into the bright fraction of each cell
+        cv2.resize(bright, self.grid_size, dst=self.fraction, interpolation=cv2.INTER_AREA)
+
+        self.glare += self.rate * (self.fraction * (1 / 255) - self.glare)
+        self.mirror += self.rate * (self.hits - self.mirror)
+        self.hits.fill(0)
+        self.updates += 1
+
+        # Wait until the averages mean something
+        if self.updates * 4 >= self.settings['history']:
+            self._rebuild()
+
+    def _rebuild(self):
+        s = self.settings
+        score = np.maximum(self.glare / s['glare_threshold'], self.mirror / s['mirror_threshold'])
+        suppress = (score >= 1.0) | (self.suppress & (score >= 0.5))
+        score = cv2.dilate(score, None)  # Neighbours rank with the worst cell next to them
+        suppress = cv2.dilate(suppress.astype(np.uint8), None).astype(bool)
+
+        limit = int(s['max_coverage'] * score.size)
+        if np.count_nonzero(suppress) > limit:
+            # Keep the worst cells only
+            ranked = np.where(suppress, score, 0).ravel()
+            worst = np.argsort(ranked)[::-1][:limit]
+            suppress = np.zeros_like(suppress)
+            suppress.ravel()[worst] = True
+
+        if np.array_equal(suppress, self.suppress):
+            return
+        self.suppress = suppress
+        small = np.where(suppress, 0, 255).astype(np.uint8)
+        cv2.resize(small, (self.grid_size[0] * self.cell, self.grid_size[1] * self.cell),
+                   dst=self.keep[:self.grid_size[1] * self.cell, :self.grid_size[0] * self.cell],
+                   interpolation=cv2.INTER_NEAREST)
+        contours, _ = cv2.findContours(255 - small, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        self.contours = [c * self.cell for c in contours]
+
+    def apply(self, mask):
+        """mask with the suppressed cells cleared, in place."""
+        if not self.contours:
+            return mask
+        return cv2.bitwise_and(mask, self.keep, dst=mask)
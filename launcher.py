@@ -0,0 +1,244 @@
+import argparse
+import configparser
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from tracker_logging import setup_logging, shutdown_logging, load_logging_settings
+
+# Starts the fish tank as one process tree and keeps it running:
+#
+#   python launcher.py                # tracker and kiosk browser (start_fish_tank.sh)
+#   python launcher.py --no-kiosk     # browser in a normal window
+#   python launcher.py --no-browser
+#
+# The tracker (fish_tracker.py) runs as a child process. It serves the positions,
+# the display pages and config.json on one port (see position_server.py), so no
+# separate web server is needed. The launcher restarts it when it exits with an
+# error, isn't running within startup_timeout, or fails health_failures /healthz
+# checks in a row. Restarts back off from restart_delay to restart_max_delay. The
+# browser is opened the first time the tracker reports /readyz.
+#
+# SIGINT (Ctrl+C) or SIGTERM (stop_fish_tank.sh) stops the tracker as Ctrl+C would,
+# so it saves its state, then closes the browser. On Windows the tracker runs in a
+# process group of its own and is sent Ctrl+Break instead. A tracker that hasn't
+# exited after stop_timeout is killed. The tracker quitting by itself (the 'q' key) stops
+# the launcher too.
+#
+# Every start of the tracker is timed, from launch until it answers, is running
+# and is ready, together with the tracker's own breakdown from /health.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILE = os.path.join(BASE_DIR, 'config.ini')
+POLL_INTERVAL = 0.5  # Seconds between checks while the tracker starts
+STABLE_TIME = 60.0  # A tracker running this long resets the restart back-off
+
+log = logging.getLogger('launcher')
+
+# Requests go straight to the local tracker, never through an http_proxy from the environment
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+def load_launcher_settings(config_file=CONFIG_FILE):
+    """[Launcher] settings and the tracker's port, with defaults for older configs."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return {
+        'port': config.getint('Server', 'port', fallback=5000),
+        'browser': config.getboolean('Launcher', 'browser', fallback=True),
+        'health_interval': config.getfloat('Launcher', 'health_interval', fallback=10.0),
+        'health_failures': config.getint('Launcher', 'health_failures', fallback=3),
+        'startup_timeout': config.getfloat('Launcher', 'startup_timeout', fallback=120.0),
+        'stop_timeout': config.getfloat('Launcher', 'stop_timeout', fallback=10.0),
+        'restart_delay': config.getfloat('Launcher', 'restart_delay', fallback=1.0),
+        'restart_max_delay': config.getfloat('Launcher', 'restart_max_delay', fallback=60.0)
+    }
+
+def fetch(url, timeout=5.0):
+    """(HTTP status, JSON body or None) of a GET; status None if nothing answered."""
+    try:
+        with _opener.open(url, timeout=timeout) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except (OSError, ValueError):
+        return None, None
+
+def open_browser(url, kiosk=True):
+    """Start Chrome/Chromium on the display page; returns its process where it can be followed."""
+    options = ['--kiosk', '--incognito'] if kiosk else []
+    if sys.platform == 'darwin':
+        subprocess.Popen(['open', '-a', 'Google Chrome', '--args'] + options + [url])
+        return None
+    if sys.platform.startswith('win'):
+        subprocess.Popen(' '.join(['start', 'chrome'] + options + [url]), shell=True)
+        return None
+    for command in ('chromium-browser', 'chromium', 'google-chrome'):
+        if shutil.which(command):
+            return subprocess.Popen([command] + options + [url])
+    log.warning("No Chromium or Chrome found, open %s in a browser", url)
+    return None
+
+class TrackerSupervisor:
+    """Runs fish_tracker.py and restarts it when it fails, until stop()."""
+
+    def __init__(self, settings, command=None, on_ready=None):
+        self.settings = settings
+        self.command = command or [sys.executable, os.path.join(BASE_DIR, 'fish_tracker.py')]
+        self.url = f"http://127.0.0.1:{settings['port']}"
+        self.on_ready = on_ready  # Called (once) the first time the tracker is ready
+        self.stopping = threading.Event()
+        self.process = None
+        self.starts = 0
+
+    def stop(self):
+        """Ask run() to stop the tracker and return (safe from signal handlers)."""
+        self.stopping.set()
+
+    def run(self):
+        """Supervise the tracker until stop() or until it quits by itself (blocks)."""
+        delay = self.settings['restart_delay']
+        try:
+            while not self.stopping.is_set():
+                started = time.monotonic()
+                failure = self._run_once()
+                if failure is None:
+                    break
+                if time.monotonic() - started >= STABLE_TIME:
+                    delay = self.settings['restart_delay']
+                log.warning("Tracker %s, restarting it in %.1f s", failure, delay)
+                self._terminate()
+                if self.stopping.wait(delay):
+                    break
+                delay = min(delay * 2, self.settings['restart_max_delay'])
+        finally:
+            self._terminate()
+
+    def _run_once(self):
+        """Start the tracker and watch it. Returns why it failed, or None once it should stop."""
+        s = self.settings
+        options = {'cwd': BASE_DIR}
+        # Ctrl+C in the terminal reaches only the launcher, which then stops the tracker once
+        if os.name == 'posix':
+            options['start_new_session'] = True
+        else:
+            # Windows can only signal a process group (Ctrl+Break), so the tracker gets its own
+            options['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+        self.process = subprocess.Popen(self.command, **options)
+        self.starts += 1
+        started = time.monotonic()
+        answered = running = ready = None  # Seconds after launch
+        failures = 0
+        next_check = started
+
+        while not self.stopping.wait(POLL_INTERVAL):
+            code = self.process.poll()
+            if code == 0:
+                log.info("Tracker quit")
+                return None
+            if code is not None:
+                return f"exited with code {code}"
+
+            now = time.monotonic()
+            if running is None:
+                # Starting: the server answers /healthz with 503 until the background is learned
+                status, _ = fetch(self.url + '/healthz', timeout=POLL_INTERVAL * 2)
+                if status is not None and answered is None:
+                    answered = now - started
+                if status == 200:
+                    running = now - started
+                    next_check = now + s['health_interval']
+                elif now - started > s['startup_timeout']:
+                    return f"not running after {s['startup_timeout']:.0f} s"
+                continue
+
+            if ready is None:
+                status, _ = fetch(self.url + '/readyz', timeout=POLL_INTERVAL * 2)
+                if status == 200:
+                    ready = now - started
+                    self._report_startup(answered, running, ready)
+                    if self.on_ready:
+                        self.on_ready()
+                        self.on_ready = None
+
+            if now >= next_check:
+                next_check = now + s['health_interval']
+                status, _ = fetch(self.url + '/healthz')
+                failures = 0 if status == 200 else failures + 1
+                if failures >= s['health_failures']:
+                    return f"failed {failures} health checks in a row"
+        return None
+
+    def _report_startup(self, answered, running, ready):
+        _, health = fetch(self.url + '/health')
+        phases = (health or {}).get('startup') or {}
+        if phases:
+            # What start() didn't take went to starting Python, imports and loading settings
+            log.info("Tracker ready %.1f s after launch (loading %.1f s, camera %.1f s, background %.1f s, "
+                     "serving after %.1f s)", ready, max(running - phases['total'], 0.0), phases['camera'],
+                     phases['background'], answered, extra={'fields': {
+                         'start': self.starts, 'answered': round(answered, 3), 'running': round(running, 3),
+                         'ready': round(ready, 3), 'tracker': phases}})
+        else:
+            log.info("Tracker ready %.1f s after launch (serving after %.1f s)", ready, answered)
+
+    def _terminate(self):
+        """Stop the tracker as Ctrl+C would, killing it if it doesn't exit in time."""
+        process = self.process
+        if process is None or process.poll() is not None:
+            return
+        if os.name == 'posix':
+            process.send_signal(signal.SIGINT)
+        else:
+            process.send_signal(signal.CTRL_BREAK_EVENT)
+        try:
+            process.wait(self.settings['stop_timeout'])
+        except subprocess.TimeoutExpired:
+            log.warning("Tracker didn't stop within %.0f s, killing it", self.settings['stop_timeout'])
+            process.kill()
+            process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fish tracker and the display browser, restarting the tracker if it fails")
+    parser.add_argument('--no-browser', action='store_true', help="Don't open a browser")
+    parser.add_argument('--no-kiosk', action='store_true', help="Open the browser in a normal window")
+    args = parser.parse_args()
+
+    launched = time.monotonic()
+    settings = load_launcher_settings()
+    # Console, and a log file of its own next to the tracker's
+    logging_settings = load_logging_settings(CONFIG_FILE)
+    if logging_settings['file']:
+        logging_settings['file'] = os.path.join(os.path.dirname(logging_settings['file']), 'launcher.log')
+    setup_logging(logging_settings)
+
+    browser = []
+    url = f"http://localhost:{settings['port']}/"
+
+    def on_ready():
+        if settings['browser'] and not args.no_browser:
+            browser.append(open_browser(url, kiosk=not args.no_kiosk))
+        log.info("Fish tank started in %.1f s at %s. Press Ctrl+C to stop.", time.monotonic() - launched, url)
+
+    supervisor = TrackerSupervisor(settings, on_ready=on_ready)
+    signal.signal(signal.SIGINT, lambda signum, frame: supervisor.stop())
+    signal.signal(signal.SIGTERM, lambda signum, frame: supervisor.stop())
+
+    try:
+        supervisor.run()
+    finally:
+        for process in browser:
+            if process is not None and process.poll() is None:
+                process.terminate()
+        log.info("Fish tank stopped.")
+        shutdown_logging()
+
+if __name__ == "__main__":
+    main()
@@ -5,48 +5,169 @@ import subprocess
 import sys
 import re
 import json
+import time
+import argparse
+import threading
 
-def list_cameras_opencv():
-    """Test camera indices using OpenCV until failure."""
-    available_cameras = []
-    index = 0
-    
-    while True:
-        cap = cv2.VideoCapture(index)
+# Cameras are probed in parallel, each with its own timeout, so an absent or hung
+# device doesn't hold up the rest. The results (including the supported modes) are
+# saved to camera_inventory.json keyed by device identity; the tracker and the
+# calibration tools read that file instead of probing again.
+
+INVENTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'camera_inventory.json')
+INVENTORY_VERSION = 1
+PROBE_TIMEOUT = 5.0  # Seconds before a device that hasn't answered is given up on
+MAX_INDEX = 10
+
+# Tried with cap.set() when the platform can't list modes itself
+COMMON_RESOLUTIONS = [(320, 240), (640, 480), (800, 600), (1280, 720), (1920, 1080)]
+COMMON_FOURCCS = ['MJPG', 'YUYV']
+
+def run_with_timeout(probe, sources, timeout=PROBE_TIMEOUT):
+    """Call probe(source) for every source concurrently.
+
+    Returns {source: result} for the probes that finished in time; sources that
+    timed out are left out. Probes run on daemon threads, so a driver call that
+    never returns can't keep the program alive.
+    """
+    results = {}
+    lock = threading.Lock()
+
+    def worker(source):
+        try:
+            result = probe(source)
+        except Exception as e:
+            result = {"error": str(e)}
+        with lock:
+            results[source] = result
+
+    threads = []
+    for source in sources:
+        thread = threading.Thread(target=worker, args=(source,))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+    with lock:
+        finished = dict(results)
+    for source in sources:
+        if source not in finished:
+            print(f"⚠️ Camera {source} did not answer within {timeout:g} s, skipping it")
+    return finished
+
+def fourcc_to_str(value):
+    value = int(value)
+    return "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4)).strip('\0 ') or "Unknown"
+
+def probe_camera(source, probe_modes=False):
+    """Open one camera, grab a frame and report its current (and optionally supported) modes."""
+    cap = cv2.VideoCapture(source)
+    try:
         if not cap.isOpened():
-            break
-        
+            return None
         ret, frame = cap.read()
-        if ret:
-            # Get camera name if possible
-            name = f"Camera #{index}"
-            try:
-                name = cap.getBackendName() + " - " + name
-            except:
-                pass
-                
-            # Get resolution if possible
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            resolution = f"{width}x{height}" if width > 0 and height > 0 else "Unknown"
-            
-            available_cameras.append({
-                "index": index,
-                "name": name,
-                "resolution": resolution,
-                "path": str(index)  # On Windows/Mac, the path is just the index
-            })
-            
+        if not ret:
+            return None
+
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        info = {
+            "resolution": f"{width}x{height}" if width > 0 and height > 0 else "Unknown",
+            "fps": round(cap.get(cv2.CAP_PROP_FPS), 2),
+            "fourcc": fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC))
+        }
+        try:
+            info["backend"] = cap.getBackendName()
+        except Exception:
+            pass
+
+        if probe_modes:
+            info["modes"] = probe_modes_opencv(cap)
+        return info
+    finally:
         cap.release()
-        index += 1
-        
-        # Set a reasonable limit to avoid trying too many indices
-        if index > 10:
-            break
-            
+
+def probe_modes_opencv(cap):
+    """Find supported modes by asking for common ones and keeping what the driver grants."""
+    modes = {}
+    for fourcc in COMMON_FOURCCS:
+        for width, height in COMMON_RESOLUTIONS:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            granted = (fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC)),
+                       int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                       int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            if granted[1] > 0 and granted[2] > 0:
+                modes[granted] = round(cap.get(cv2.CAP_PROP_FPS), 2)
+    return [{"fourcc": f, "width": w, "height": h, "fps": [fps] if fps > 0 else []}
+            for (f, w, h), fps in sorted(modes.items())]
+
+def parse_v4l2_formats(output):
+    """Parse `v4l2-ctl --list-formats-ext` into [{fourcc, width, height, fps: [...]}]."""
+    modes = []
+    fourcc = None
+    mode = None
+    for line in output.splitlines():
+        match = re.search(r"\[\d+\]: '(\w+)'", line)
+        if match:
+            fourcc = match.group(1)
+            continue
+        match = re.search(r"Size: \w+ (\d+)x(\d+)", line)
+        if match and fourcc:
+            mode = {"fourcc": fourcc, "width": int(match.group(1)), "height": int(match.group(2)), "fps": []}
+            modes.append(mode)
+            continue
+        match = re.search(r"Interval: \w+ [\d.]+s \(([\d.]+) fps\)", line)
+        if match and mode:
+            mode["fps"].append(float(match.group(1)))
+    return modes
+
+def v4l2_modes(device_path):
+    """Supported modes from v4l2-ctl, or None if it isn't installed."""
+    try:
+        output = subprocess.check_output(['v4l2-ctl', '--device', device_path, '--list-formats-ext'],
+                                         stderr=subprocess.STDOUT, text=True, timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return parse_v4l2_formats(output)
+
+def linux_identity(dev):
+    """Stable identity for /dev/videoN: card name plus the physical (USB port) path from sysfs."""
+    sys_dir = f'/sys/class/video4linux/{dev}'
+    name = f"Camera {dev}"
+    try:
+        with open(os.path.join(sys_dir, 'name')) as f:
+            name = f.read().strip()
+    except OSError:
+        pass
+    device_link = os.path.join(sys_dir, 'device')
+    location = os.path.realpath(device_link) if os.path.exists(device_link) else f'/dev/{dev}'
+    return name, f"v4l2:{name}@{location}"
+
+def list_cameras_opencv(probe_modes=False, timeout=PROBE_TIMEOUT):
+    """Test camera indices 0-MAX_INDEX with OpenCV, all at once."""
+    results = run_with_timeout(lambda index: probe_camera(index, probe_modes), range(MAX_INDEX + 1), timeout)
+
+    available_cameras = []
+    for index, info in sorted(results.items()):
+        if not info or "error" in info:
+            continue
+        camera = {
+            "index": index,
+            "name": f"{info.get('backend', 'OpenCV')} - Camera #{index}",
+            "path": str(index),  # On Windows/Mac, the path is just the index
+            "identity": f"opencv:{index}"
+        }
+        camera.update(info)
+        available_cameras.append(camera)
     return available_cameras
 
-def list_cameras_windows():
+def list_cameras_windows(probe_modes=False, timeout=PROBE_TIMEOUT):
     """List cameras on Windows using DirectShow through PowerShell."""
     try:
         # PowerShell command to get the list of camera devices
@@ -55,163 +176,229 @@ def list_cameras_windows():
         $cameras = Get-WmiObject Win32_PnPEntity | Where-Object { $_.Name -match 'Camera|Webcam' -or $_.PNPClass -eq 'Image' };
         $cameras | Select-Object Name, DeviceID | ConvertTo-Json
         """
-        
-        # Run the PowerShell command
-        result = subprocess.run(
-            ["powershell", "-Command", ps_cmd],
-            capture_output=True, 
-            text=True
-        )
-        
-        if result.returncode != 0 or not result.stdout.strip():
-            return []
-            
+
+        # Ask PowerShell while the OpenCV probes run
+        listing = {}
+
+        def run_powershell():
+            try:
+                listing["result"] = subprocess.run(["powershell", "-Command", ps_cmd],
+                                                   capture_output=True, text=True, timeout=timeout)
+            except (OSError, subprocess.SubprocessError):
+                pass
+
+        thread = threading.Thread(target=run_powershell)
+        thread.daemon = True
+        thread.start()
+        opencv_cameras = list_cameras_opencv(probe_modes, timeout)
+        thread.join(timeout)
+        result = listing.get("result")
+
+        if result is None or result.returncode != 0 or not result.stdout.strip():
+            return opencv_cameras
+
         # Parse the JSON output
         devices = json.loads(result.stdout)
         if not isinstance(devices, list):
             devices = [devices]
-            
-        # Get OpenCV cameras to match with DirectShow devices
-        opencv_cameras = list_cameras_opencv()
-        
-        # Create the final list combining information
+
+        # Combine the DirectShow names with what OpenCV found at the same index
         cameras = []
         for i, device in enumerate(devices):
             camera_info = {
-                "index": i if i < len(opencv_cameras) else i,
+                "index": i,
                 "name": device.get("Name", f"Camera #{i}"),
                 "device_id": device.get("DeviceID", "Unknown"),
+                "identity": f"dshow:{device.get('DeviceID', i)}",
                 "path": str(i) if i < len(opencv_cameras) else "Unknown"
             }
-            
+
             if i < len(opencv_cameras):
-                camera_info["resolution"] = opencv_cameras[i]["resolution"]
-                
+                for key in ("resolution", "fps", "fourcc", "backend", "modes"):
+                    if key in opencv_cameras[i]:
+                        camera_info[key] = opencv_cameras[i][key]
+
             cameras.append(camera_info)
-            
+
         return cameras
     except Exception as e:
         print(f"Error listing Windows cameras: {e}")
-        return list_cameras_opencv()  # Fallback to OpenCV method
+        return list_cameras_opencv(probe_modes, timeout)  # Fallback to OpenCV method
 
-def list_cameras_linux():
-    """List camera devices on Linux by checking /dev/video* devices."""
+def list_cameras_linux(probe_modes=False, timeout=PROBE_TIMEOUT):
+    """List camera devices on Linux by probing every /dev/video* device in parallel."""
     try:
-        # Find all video devices
+        devs = sorted((dev for dev in os.listdir('/dev') if re.fullmatch(r'video\d+', dev)),
+                      key=lambda dev: int(dev[5:]))
+
+        def probe(dev):
+            device_path = f'/dev/{dev}'
+            # v4l2-ctl lists modes without touching the stream; fall back to cap.set probing
+            modes = v4l2_modes(device_path) if probe_modes else None
+            info = probe_camera(device_path, probe_modes and modes is None)
+            if info and modes is not None:
+                info["modes"] = modes
+            return info
+
+        results = run_with_timeout(probe, devs, timeout)
+
         video_devices = []
-        for dev in os.listdir('/dev'):
-            if dev.startswith('video'):
-                try:
-                    device_path = f'/dev/{dev}'
-                    # Check if it's a camera by trying to open it
-                    cap = cv2.VideoCapture(device_path)
-                    if cap.isOpened():
-                        ret, frame = cap.read()
-                        if ret:
-                            # Try to get resolution
-                            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                            resolution = f"{width}x{height}" if width > 0 and height > 0 else "Unknown"
-                            
-                            # Try to get camera name using v4l2-ctl if available
-                            name = f"Camera {dev}"
-                            try:
-                                v4l2_output = subprocess.check_output(
-                                    ['v4l2-ctl', '--device', device_path, '--all'], 
-                                    stderr=subprocess.STDOUT,
-                                    text=True
-                                )
-                                for line in v4l2_output.split('\n'):
-                                    if 'Card type:' in line:
-                                        name = line.split('Card type:')[1].strip()
-                                        break
-                            except:
-                                pass
-                                
-                            video_devices.append({
-                                "index": int(dev.replace('video', '')),
-                                "name": name,
-                                "path": device_path,
-                                "resolution": resolution
-                            })
-                    cap.release()
-                except:
-                    pass
-                    
+        for dev in devs:
+            info = results.get(dev)
+            if not info or "error" in info:
+                # Not a capture node (e.g. a metadata device), or it timed out
+                continue
+            name, identity = linux_identity(dev)
+            camera = {
+                "index": int(dev.replace('video', '')),
+                "name": name,
+                "path": f'/dev/{dev}',
+                "identity": identity
+            }
+            camera.update(info)
+            video_devices.append(camera)
+
         return video_devices
     except Exception as e:
         print(f"Error listing Linux cameras: {e}")
-        return list_cameras_opencv()  # Fallback to OpenCV method
+        return list_cameras_opencv(probe_modes, timeout)  # Fallback to OpenCV method
 
-def list_cameras_macos():
+def list_cameras_macos(probe_modes=False, timeout=PROBE_TIMEOUT):
     """List cameras on macOS using AVFoundation through Python."""
     try:
         # First try the OpenCV method
-        opencv_cameras = list_cameras_opencv()
-        
+        opencv_cameras = list_cameras_opencv(probe_modes, timeout)
+
         # Then try to enhance with system_profiler
         try:
             result = subprocess.run(
                 ["system_profiler", "SPCameraDataType", "-json"],
                 capture_output=True,
-                text=True
+                text=True,
+                timeout=timeout
             )
-            
+
             if result.returncode == 0 and result.stdout.strip():
                 camera_data = json.loads(result.stdout).get("SPCameraDataType", [])
-                
+
                 for i, camera in enumerate(camera_data):
                     if i < len(opencv_cameras):
                         opencv_cameras[i]["name"] = camera.get("_name", opencv_cameras[i]["name"])
                         opencv_cameras[i]["model"] = camera.get("model", "Unknown")
-        except:
+                        unique_id = camera.get("spcamera_unique-id")
+                        if unique_id:
+                            opencv_cameras[i]["identity"] = f"avfoundation:{unique_id}"
+        except Exception:
             pass
-            
+
         return opencv_cameras
     except Exception as e:
         print(f"Error listing macOS cameras: {e}")
-        return list_cameras_opencv()  # Fallback to OpenCV method
+        return list_cameras_opencv(probe_modes, timeout)  # Fallback to OpenCV method
 
-def main():
-    """Main function to list cameras based on the platform."""
+def list_cameras(probe_modes=False, timeout=PROBE_TIMEOUT):
+    """Probe the cameras with the best method for this platform."""
     os_name = platform.system().lower()
-    
-    print(f"Detecting cameras on {platform.system()}...")
-    
     if os_name == 'windows':
-        cameras = list_cameras_windows()
+        return list_cameras_windows(probe_modes, timeout)
     elif os_name == 'darwin':  # macOS
-        cameras = list_cameras_macos()
+        return list_cameras_macos(probe_modes, timeout)
     elif os_name == 'linux':
-        cameras = list_cameras_linux()
-    else:
-        cameras = list_cameras_opencv()
-    
-    if not cameras:
-        print("No cameras detected.")
-        return
-    
-    print(f"\nFound {len(cameras)} camera(s):")
-    print("=" * 50)
-    
+        return list_cameras_linux(probe_modes, timeout)
+    return list_cameras_opencv(probe_modes, timeout)
+
+def save_inventory(cameras, path=INVENTORY_FILE):
+    """Merge probed cameras into the inventory file, keyed by device identity."""
+    inventory = load_inventory(path)
+    probed_at = time.strftime('%Y-%m-%d %H:%M:%S')
+    for camera in cameras:
+        entry = dict(camera, probed_at=probed_at)
+        previous = inventory["devices"].get(camera["identity"], {})
+        if "modes" not in entry and "modes" in previous:
+            entry["modes"] = previous["modes"]  # Keep modes from an earlier --modes run
+        inventory["devices"][camera["identity"]] = entry
+    inventory["platform"] = platform.system()
+    with open(path, 'w') as f:
+        json.dump(inventory, f, indent=2)
+    return inventory
+
+def load_inventory(path=INVENTORY_FILE):
+    """The saved inventory ({"devices": {identity: info}}), empty if there is none yet."""
+    try:
+        with open(path) as f:
+            inventory = json.load(f)
+        if inventory.get("version") == INVENTORY_VERSION:
+            return inventory
+    except (OSError, ValueError):
+        pass
+    return {"version": INVENTORY_VERSION, "devices": {}}
+
+def find_camera(index, path=INVENTORY_FILE):
+    """Cached info for the camera at an OpenCV index or device path, or None.
+
+    Prefers the most recently probed entry, since indices can move when devices
+    are plugged into different ports.
+    """
+    matches = [camera for camera in load_inventory(path)["devices"].values()
+               if camera.get("index") == index or camera.get("path") == str(index)]
+    if not matches:
+        return None
+    return max(matches, key=lambda camera: camera.get("probed_at", ""))
+
+def print_cameras(cameras):
     for i, camera in enumerate(cameras):
         print(f"Camera {i+1}:")
         print(f"  • Index for OpenCV: {camera.get('index', 'Unknown')}")
         print(f"  • Name: {camera.get('name', 'Unknown')}")
         print(f"  • Path/ID: {camera.get('path', 'Unknown')}")
         if 'resolution' in camera:
-            print(f"  • Resolution: {camera['resolution']}")
+            print(f"  • Resolution: {camera['resolution']} {camera.get('fourcc', '')} @ {camera.get('fps', 0):g} fps")
+        if camera.get('modes'):
+            print("  • Modes:")
+            for mode in camera['modes']:
+                rates = ", ".join(f"{fps:g}" for fps in mode['fps']) or "?"
+                print(f"      {mode['fourcc']} {mode['width']}x{mode['height']} @ {rates} fps")
         print("-" * 50)
-    
+
+def main():
+    """Main function to list cameras based on the platform."""
+    parser = argparse.ArgumentParser(description="List cameras and save them to camera_inventory.json")
+    parser.add_argument('--modes', action='store_true', help="Also list supported resolutions, frame rates and formats")
+    parser.add_argument('--timeout', type=float, default=PROBE_TIMEOUT, help="Seconds to wait for each camera")
+    parser.add_argument('--cached', action='store_true', help="Show the saved inventory without probing")
+    args = parser.parse_args()
+
+    os_name = platform.system().lower()
+
+    if args.cached:
+        cameras = list(load_inventory()["devices"].values())
+        print(f"Cameras from {INVENTORY_FILE}:")
+    else:
+        print(f"Detecting cameras on {platform.system()}...")
+        start = time.monotonic()
+        cameras = list_cameras(args.modes, args.timeout)
+        print(f"Probed in {time.monotonic() - start:.1f} s")
+        if cameras:
+            save_inventory(cameras)
+            print(f"Saved to {INVENTORY_FILE}")
+
+    if not cameras:
+        print("No cameras detected.")
+        return
+
+    print(f"\nFound {len(cameras)} camera(s):")
+    print("=" * 50)
+    print_cameras(cameras)
+
     print("\nTo use a specific camera in your fish_tracker.py script, modify this line:")
     print('cap = cv2.VideoCapture(0)  # Replace 0 with the index or path from above')
     print("\nFor example:")
     print('cap = cv2.VideoCapture(1)  # For the second camera')
-    
+
     if os_name == 'windows':
         print("\nOn Windows, you can also use:")
         print('cap = cv2.VideoCapture(cv2.CAP_DSHOW + camera_index)  # For better performance with DirectShow')
-    
+
     if os_name == 'linux':
         print("\nOn Linux, you can use the device path directly:")
         print("cap = cv2.VideoCapture('/dev/videoX')  # Replace X with the device number")
@@ -0,0 +1,179 @@
+import bisect
+import os
+import threading
+import time
+
+import tracker_logging
+
+# Tracker metrics for monitoring the exhibit, served as Prometheus text at /metrics:
+#
+#   curl http://localhost:5000/metrics
+#
+# The tracking loop updates plain counters and fixed-bucket histograms directly
+# (a few additions per frame, no locks: it is their only writer). HTTP request
+# metrics are written from the server's threads and take a lock. Everything else
+# (capture counters, process memory and CPU) is read when /metrics is requested.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+STAGES = ('capture', 'detect', 'track', 'publish', 'display')
+FPS_SMOOTHING = 0.05  # Weight of the newest frame interval in the frame rate average
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is a bisect and three additions."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels=''):
+        prefix = labels + ',' if labels else ''
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield f'{name}_bucket{{{prefix}le="{bound:g}"}} {total}'
+        yield f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}' if labels else f'{name}_sum {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {self.count}' if labels else f'{name}_count {self.count}'
+
+def process_usage():
+    """(resident memory in bytes or None, CPU seconds) of this process."""
+    times = os.times()
+    rss = None
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass  # Not Linux
+    return rss, times.user + times.system
+
+class TrackerMetrics:
+    """Counters of the tracking loop and the HTTP API."""
+
+    def __init__(self):
+        self.frames_processed = 0
+        self.frames_missed = 0  # Stale results published while the camera had no frame
+        self.detections = 0
+        self.confidence = 0.0
+        self.state = 0
+        self.fps = 0.0
+        self.last_frame = None
+        self.stages = {stage: Histogram() for stage in STAGES}
+
+        self.requests = {}  # (path, status) -> count
+        self.request_latency = {}  # path -> Histogram
+        self.lock = threading.Lock()
+
+    def frame(self, result, processed):
+        """Count one published result; processed is False for a stale one (no frame)."""
+        now = time.monotonic()
+        if processed:
+            self.frames_processed += 1
+            if self.last_frame is not None and now > self.last_frame:
+                rate = 1.0 / (now - self.last_frame)
+                self.fps = rate if not self.fps else self.fps + FPS_SMOOTHING * (rate - self.fps)
+            self.last_frame = now
+        else:
+            self.frames_missed += 1
+        if result['detected']:
+            self.detections += 1
+        self.confidence = result['confidence']
+        self.state = result['fish'][0]['state']
+
+    def add_request_hooks(self, app):
+        """Count requests and their latency on a Flask app, per route."""
+        from flask import g, request
+
+        @app.before_request
+        def start_timer():
+            g.metrics_started = time.perf_counter()
+
+        @app.after_request
+        def record(response):
+            started = g.pop('metrics_started', None)
+            if started is not None:
+                # Label by route, not by URL, so query strings don't make new series
+                path = request.url_rule.rule if request.url_rule else 'other'
+                elapsed = time.perf_counter() - started
+                with self.lock:
+                    key = (path, response.status_code)
+                    self.requests[key] = self.requests.get(key, 0) + 1
+                    self.request_latency.setdefault(path, Histogram()).observe(elapsed)
+            return response
+
+    def render(self, health=None):
+        """Prometheus text exposition; health is TrackerService.health() for the uptime, start-up and capture."""
+        lines = []
+
+        def metric(name, kind, help_text, *samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+
+        health = health or {}
+        capture = health.get('capture')
+        captured = capture['frames'] if capture else self.frames_processed
+        dropped = capture['dropped'] if capture else 0
+
+        metric('fishtank_up', 'gauge', 'Tracking loop running', f"fishtank_up {int(bool(health.get('running')))}")
+        metric('fishtank_uptime_seconds', 'gauge', 'Seconds since tracking started',
+               f"fishtank_uptime_seconds {health.get('uptime', 0.0):.3f}")
+        startup = health.get('startup')
+        if startup:
+            metric('fishtank_startup_seconds', 'gauge', 'Time start-up took, by phase',
+                   *[f'fishtank_startup_seconds{{phase="{phase}"}} {seconds:.3f}' for phase, seconds in startup.items()])
+        metric('fishtank_frames_captured_total', 'counter', 'Frames delivered by the camera',
+               f'fishtank_frames_captured_total {captured}')
+        metric('fishtank_frames_processed_total', 'counter', 'Frames tracked',
+               f'fishtank_frames_processed_total {self.frames_processed}')
+        metric('fishtank_frames_dropped_total', 'counter', 'Frames replaced by a newer one before being tracked',
+               f'fishtank_frames_dropped_total {dropped}')
+        metric('fishtank_frames_missed_total', 'counter', 'Stale positions published while the camera had no frame',
+               f'fishtank_frames_missed_total {self.frames_missed}')
+        metric('fishtank_fps', 'gauge', 'Tracked frames per second (smoothed)', f'fishtank_fps {self.fps:.2f}')
+        metric('fishtank_detections_total', 'counter', 'Frames in which the fish was detected',
+               f'fishtank_detections_total {self.detections}')
+        metric('fishtank_confidence', 'gauge', 'Tracking confidence, 0-1', f'fishtank_confidence {self.confidence:.3f}')
+        metric('fishtank_tracking_state', 'gauge', 'Tracking state (1 searching, 2 tentative, 3 locked, '
+               '4 coasting, 5 lost)', f'fishtank_tracking_state {self.state}')
+
+        stage_lines = []
+        for stage, histogram in self.stages.items():
+            stage_lines.extend(histogram.lines('fishtank_stage_seconds', f'stage="{stage}"'))
+        metric('fishtank_stage_seconds', 'histogram', 'Time per frame in each stage of the loop', *stage_lines)
+
+        if capture:
+            metric('fishtank_capture_up', 'gauge', 'Camera delivering frames',
+                   f"fishtank_capture_up {int(capture['status'] == 'running')}")
+            metric('fishtank_capture_read_failures_total', 'counter', 'Failed camera reads',
+                   f"fishtank_capture_read_failures_total {capture['read_failures']}")
+            metric('fishtank_capture_stalls_total', 'counter', 'Times the camera stopped delivering frames',
+                   f"fishtank_capture_stalls_total {capture['stalls']}")
+            metric('fishtank_capture_reconnects_total', 'counter', 'Times the camera was reopened',
+                   f"fishtank_capture_reconnects_total {capture['reconnects']}")
+
+        with self.lock:
+            requests = sorted(self.requests.items())
+            latency = [(path, histogram) for path, histogram in sorted(self.request_latency.items())]
+            latency_lines = [line for path, histogram in latency
+                             for line in histogram.lines('fishtank_http_request_seconds', f'path="{path}"')]
+        metric('fishtank_http_requests_total', 'counter', 'HTTP requests by route and status',
+               *[f'fishtank_http_requests_total{{path="{path}",status="{status}"}} {count}'
+                 for (path, status), count in requests])
+        metric('fishtank_http_request_seconds', 'histogram', 'HTTP request handling time by route', *latency_lines)
+
+        metric('fishtank_log_records_dropped_total', 'counter', 'Log records dropped because the log queue was full',
+               f'fishtank_log_records_dropped_total {tracker_logging.dropped_records()}')
+
+        rss, cpu = process_usage()
+        if rss is not None:
+            metric('process_resident_memory_bytes', 'gauge', 'Resident memory', f'process_resident_memory_bytes {rss}')
+        metric('process_cpu_seconds_total', 'counter', 'User and system CPU time', f'process_cpu_seconds_total {cpu:.2f}')
+        metric('process_threads', 'gauge', 'Python threads', f'process_threads {threading.active_count()}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,192 @@
+import io
+import math
+import os
+import threading
+
+import cv2
+import numpy as np
+
+# Where the fish spends its time, accumulated as it swims.
+#
+# The tank (perspective-corrected, normalized 0-1) is divided into a fixed grid.
+# Every frame with a detection adds the time since the previous frame to the
+# fish's cell, so each cell holds seconds of dwell. Old visits fade with a
+# half-life: instead of multiplying the whole grid every frame, new time is
+# added with a weight that grows as exp(t / tau) and the grid is scaled back
+# down only when the weights get large, so an update touches a single cell.
+#
+# Alongside the grid it keeps running statistics (Welford's method, so no
+# history is stored): swimming speed, and stays - how long the fish remains in
+# one cell before moving on.
+#
+# Served by the tracker as /heatmap.png, /heatmap.npy and /stats, and saved to
+# disk every save_interval seconds so a restart picks up where it left off.
+
+MAX_FRAME_GAP = 0.5  # Seconds; longer gaps (fish lost, tracker paused) add no dwell
+RESCALE_LIMIT = 1e12  # Fold the growth factor back into the grid past this weight
+
+class RunningStats:
+    """Count, mean, variance and maximum of a stream of values in O(1) memory."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.max = max(self.max, value)
+
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'std': self.std(), 'max': self.max}
+
+    def state(self):
+        return [self.count, self.mean, self.m2, self.max]
+
+    def restore(self, state):
+        self.count, self.mean, self.m2, self.max = int(state[0]), *(float(v) for v in state[1:])
+
+class OccupancyMap:
+    """Decaying dwell-time histogram of the tank plus speed and stay statistics."""
+
+    def __init__(self, grid_width=64, grid_height=48, half_life=3600.0):
+        self.grid = np.zeros((grid_height, grid_width), dtype=np.float64)
+        self.half_life = half_life
+        self.rate = math.log(2) / half_life if half_life > 0 else 0.0
+        self.base_time = None  # Time at which the grid's weights are 1
+        self.last_time = None
+        self.speed = RunningStats()
+        self.stays = RunningStats()
+        self.cell = None  # Cell the fish is in and since when
+        self.cell_since = None
+        self.tracked_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def _cell(self, x, y):
+        h, w = self.grid.shape
+        return (min(max(int(y * h), 0), h - 1), min(max(int(x * w), 0), w - 1))
+
+    def _weight(self, t):
+        if not self.rate:
+            return 1.0
+        if self.base_time is None:
+            self.base_time = t
+        weight = math.exp(self.rate * (t - self.base_time))
+        if weight > RESCALE_LIMIT:
+            self.grid /= weight
+            self.base_time = t
+            weight = 1.0
+        return weight
+
+    def update(self, t, x, y, speed, detected=True):
+        """Add one frame. Only frames with a detection count towards dwell and stays."""
+        with self.lock:
+            dt = 0.0
+            if self.last_time is not None and 0 < t - self.last_time <= MAX_FRAME_GAP:
+                dt = t - self.last_time
+            self.last_time = t
+
+            if not detected:
+                self._end_stay(t)
+                return
+
+            cell = self._cell(x, y)
+            if dt:
+                weight = self._weight(t)  # May rescale the grid, so before reading the cell
+                self.grid[cell] += dt * weight
+                self.tracked_seconds += dt
+            self.speed.add(float(speed))
+
+            if cell != self.cell:
+                self._end_stay(t)
+                self.cell, self.cell_since = cell, t
+
+    def _end_stay(self, t):
+        if self.cell is not None:
+            self.stays.add(t - self.cell_since)
+            self.cell = self.cell_since = None
+
+    def heatmap(self, t=None):
+        """The grid in seconds of (decayed) dwell as of time t (default: the last update)."""
+        with self.lock:
+            grid = self.grid.copy()
+            base_time, last_time = self.base_time, self.last_time
+        if self.rate and base_time is not None:
+            grid *= math.exp(-self.rate * ((t if t is not None else last_time) - base_time))
+        return grid
+
+    def stats(self):
+        with self.lock:
+            current = None
+            if self.cell is not None:
+                current = {'cell': [self.cell[1], self.cell[0]], 'seconds': self.last_time - self.cell_since}
+            return {
+                'grid': [self.grid.shape[1], self.grid.shape[0]],
+                'half_life': self.half_life,
+                'tracked_seconds': self.tracked_seconds,
+                'speed': self.speed.to_dict(),
+                'stays': self.stays.to_dict(),
+                'current_stay': current
+            }
+
+    def render_png(self, width=320):
+        """The heatmap as a colour PNG, brightest where the fish spends most time."""
+        grid = self.heatmap()
+        peak = grid.max()
+        scaled = (255 * np.sqrt(grid / peak)).astype(np.uint8) if peak > 0 else np.zeros(grid.shape, np.uint8)
+        height = int(width * grid.shape[0] / grid.shape[1])
+        image = cv2.applyColorMap(cv2.resize(scaled, (width, height), interpolation=cv2.INTER_LINEAR),
+                                  cv2.COLORMAP_INFERNO)
+        return cv2.imencode('.png', image)[1].tobytes()
+
+    def save(self, path):
+        """Write the grid and statistics atomically (to a temporary file, then renamed)."""
+        grid = self.heatmap()
+        with self.lock:
+            state = {'speed': self.speed.state(), 'stays': self.stays.state(),
+                     'extra': [self.tracked_seconds, self.half_life]}
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as f:
+            np.savez(f, grid=grid, **{name: np.asarray(values, dtype=np.float64) for name, values in state.items()})
+        os.replace(temporary, path)
+
+    def load(self, path):
+        """Continue from a saved file. Returns False if there is none or its grid size differs."""
+        try:
+            data = np.load(path)
+        except (OSError, ValueError):
+            return False
+        if data['grid'].shape != self.grid.shape:
+            return False
+        with self.lock:
+            self.grid[:] = data['grid']
+            self.base_time = None  # The saved grid is already decayed to when it was saved
+            self.speed.restore(data['speed'])
+            self.stays.restore(data['stays'])
+            self.tracked_seconds = float(data['extra'][0])
+        return True
+
+    def add_routes(self, app):
+        """Serve /heatmap.png, /heatmap.npy and /stats from a Flask app."""
+        from flask import Response, jsonify
+
+        @app.route('/heatmap.png')
+        def heatmap_png():
+            return Response(self.render_png(), mimetype='image/png')
+
+        @app.route('/heatmap.npy')
+        def heatmap_npy():
+            buffer = io.BytesIO()
+            np.save(buffer, self.heatmap().astype(np.float32))
+            return Response(buffer.getvalue(), mimetype='application/octet-stream')
+
+        @app.route('/stats')
+        def stats():
+            return jsonify(self.stats())
@@ -0,0 +1,90 @@
+// Fixed-capacity particle pool shared by index.html, index_fixed.html and demo_p5.html.
+//
+// Particles are stored as a structure of arrays (one Float32Array per field) instead of
+// one JS object each, so spawning allocates nothing and the garbage collector has no
+// particle objects to chase. Live particles are kept packed in [0, count): removing one
+// moves the last live particle into its slot (swap-remove, O(1)), and the free list is
+// simply the tail [count, capacity), so allocation is a counter bump. When the pool is
+// full, new particles recycle existing slots in round-robin order.
+//
+// Usage:
+//   const particles = new ParticlePool(1000, ["decay"]);
+//   const n = particles.spawn(PARTICLE_FIREWORK);
+//   particles.x[n] = 100; particles.decay[n] = 0.95; ...
+//   for (let i = particles.count - 1; i >= 0; i--) { ...; if (dead) particles.kill(i); }
+//
+// Iterate backwards when killing during the loop: the particle swapped into slot i has
+// already been visited, so every particle is updated exactly once per frame.
+
+const PARTICLE_BUBBLE = 0;
+const PARTICLE_FIREWORK = 1;
+const PARTICLE_BLOSSOM = 2;
+const PARTICLE_SPARKLE = 3;
+const PARTICLE_PIXEL = 4;
+
+// Bits for the per-particle flags array
+const PARTICLE_FLAG_TRAIL = 0x01;
+const PARTICLE_FLAG_SPARKLE = 0x02;
+
+const PARTICLE_FIELDS = ["x", "y", "vx", "vy", "alpha", "size", "hue", "saturation", "brightness", "lifespan"];
+
+class ParticlePool {
+    constructor(capacity, extraFields = []) {
+        this.capacity = capacity;
+        this.count = 0;
+        this.recycleCursor = 0;
+        this.recycled = 0;  // Particles overwritten because the pool was full
+
+        // Every per-particle array, so kill() can move a particle with one loop
+        this.arrays = [];
+        for (const name of PARTICLE_FIELDS.concat(extraFields)) {
+            this[name] = new Float32Array(capacity);
+            this.arrays.push(this[name]);
+        }
+        this.type = new Uint8Array(capacity);
+        this.flags = new Uint8Array(capacity);
+        this.arrays.push(this.type, this.flags);
+    }
+
+    // Number of live particles (lets old code keep reading particles.length)
+    get length() {
+        return this.count;
+    }
+
+    // Reserve a slot and return its index. The caller fills in the fields it uses.
+    spawn(type) {
+        let i;
+        if (this.count < this.capacity) {
+            i = this.count++;
+        } else {
+            i = this.recycleCursor;
+            this.recycleCursor = (this.recycleCursor + 1) % this.capacity;
+            this.recycled++;
+        }
+        this.type[i] = type;
+        this.flags[i] = 0;
+        this.alpha[i] = 255;
+        return i;
+    }
+
+    // Remove particle i by moving the last live particle into its slot
+    kill(i) {
+        const last = --this.count;
+        if (i !== last) {
+            const arrays = this.arrays;
+            for (let a = 0; a < arrays.length; a++) {
+                arrays[a][i] = arrays[a][last];
+            }
+        }
+    }
+
+    clear() {
+        this.count = 0;
+        this.recycleCursor = 0;
+    }
+}
+
+if (typeof module !== "undefined") {
+    module.exports = { ParticlePool, PARTICLE_BUBBLE, PARTICLE_FIREWORK, PARTICLE_BLOSSOM,
+                       PARTICLE_SPARKLE, PARTICLE_PIXEL, PARTICLE_FLAG_TRAIL, PARTICLE_FLAG_SPARKLE };
+}
@@ -0,0 +1,109 @@
+// Jitter buffer for tracker positions.
+//
+// Each position carries the tracker's capture time (t, UNIX seconds) and frame
+// sequence number (seq). Instead of chasing whatever arrived last, the renderer
+// plays the fish back a fixed small delay behind the tracker's clock and
+// interpolates between the two captured positions around that moment. Network and
+// polling jitter then only shows up if a position is later than the delay; in that
+// case the last position is carried forward along its velocity for a short while.
+//
+// The tracker and browser clocks don't need to agree: the offset between them is
+// estimated from arrivals, taking the smallest (least delayed) offset seen recently.
+//
+// Usage:
+//   const buffer = new PositionBuffer(80);
+//   buffer.push({t: 1700000000.12, seq: 42, x: 0.5, y: 0.5, vx: 0, vy: 0});
+//   const s = buffer.sample();   // {x, y, vx, vy, extrapolated} or null
+
+class PositionBuffer {
+    constructor(playoutDelay = 80, maxExtrapolation = 250, capacity = 32) {
+        this.playoutDelay = playoutDelay;          // ms behind the newest capture time
+        this.maxExtrapolation = maxExtrapolation;  // ms to dead-reckon past the newest sample
+        this.capacity = capacity;
+        this.samples = [];   // Ordered by capture time, times in ms on the tracker clock
+        this.offsets = [];   // Recent (arrival - capture) values for the clock offset estimate
+        this.offset = null;  // Local clock minus tracker clock, ms
+        this.lastSeq = null;
+        this.late = 0;       // Samples that arrived after their playout time
+    }
+
+    // Add a position. Returns false for duplicates (a poll that saw the same frame twice)
+    // and for samples older than what is already buffered.
+    push(position, arrival = performance.now()) {
+        // Trackers without timestamps: treat the arrival time as the capture time
+        const t = position.t !== undefined ? position.t * 1000 : arrival - (this.offset || 0);
+
+        if (position.seq !== undefined) {
+            if (position.seq === this.lastSeq) return false;
+            this.lastSeq = position.seq;
+        }
+        const newest = this.samples[this.samples.length - 1];
+        if (newest && t <= newest.t) return false;
+
+        this.offsets.push(arrival - t);
+        if (this.offsets.length > this.capacity) this.offsets.shift();
+        this.offset = Math.min(...this.offsets);
+
+        if (t < arrival - this.offset - this.playoutDelay) this.late++;
+
+        this.samples.push({
+            t: t,
+            x: position.x,
+            y: position.y,
+            vx: position.vx || 0,
+            vy: position.vy || 0
+        });
+        if (this.samples.length > this.capacity) this.samples.shift();
+        return true;
+    }
+
+    // Position to show at local time now (ms, performance.now() clock)
+    sample(now = performance.now()) {
+        const samples = this.samples;
+        if (samples.length === 0) return null;
+
+        const target = now - this.offset - this.playoutDelay;
+        const newest = samples[samples.length - 1];
+
+        // Data is late: carry the newest position along its velocity (bounded)
+        if (target >= newest.t) {
+            const ahead = Math.min(target - newest.t, this.maxExtrapolation);
+            return {
+                x: newest.x + newest.vx * ahead / 1000,
+                y: newest.y + newest.vy * ahead / 1000,
+                vx: newest.vx,
+                vy: newest.vy,
+                extrapolated: ahead
+            };
+        }
+
+        // Find the pair of samples around the playout time (newest first: it is usually near the end)
+        let i = samples.length - 2;
+        while (i >= 0 && samples[i].t > target) i--;
+        if (i < 0) {
+            const oldest = samples[0];
+            return {x: oldest.x, y: oldest.y, vx: oldest.vx, vy: oldest.vy, extrapolated: 0};
+        }
+
+        const a = samples[i];
+        const b = samples[i + 1];
+        const f = (target - a.t) / (b.t - a.t);
+        return {
+            x: a.x + (b.x - a.x) * f,
+            y: a.y + (b.y - a.y) * f,
+            vx: a.vx + (b.vx - a.vx) * f,
+            vy: a.vy + (b.vy - a.vy) * f,
+            extrapolated: 0
+        };
+    }
+
+    // How far the newest sample is ahead of playout (ms); negative means the buffer ran dry
+    headroom(now = performance.now()) {
+        if (this.samples.length === 0) return 0;
+        return this.samples[this.samples.length - 1].t - (now - this.offset - this.playoutDelay);
+    }
+}
+
+if (typeof module !== "undefined") {
+    module.exports = { PositionBuffer };
+}
@@ -0,0 +1,87 @@
+// Decoder for the tracker's compact binary position records.
+// Layout (little-endian) mirrors position_protocol.py:
+//   header 16 bytes: magic "FT", version u8, fish count u8, seq u32, timestamp f64
+//   fish   32 bytes: id u16, state u8, flags u8, x y vx vy speed heading size (f32 each)
+
+const POSITION_PROTOCOL_VERSION = 1;
+const POSITION_HEADER_SIZE = 16;
+const POSITION_FISH_SIZE = 32;
+const POSITION_FLAG_DETECTED = 0x01;
+const POSITION_FLAG_STALE = 0x02;
+
+function decodePositionRecord(buffer) {
+    const view = new DataView(buffer);
+    if (view.byteLength < POSITION_HEADER_SIZE ||
+        view.getUint8(0) !== 0x46 || view.getUint8(1) !== 0x54 ||  // "FT"
+        view.getUint8(2) !== POSITION_PROTOCOL_VERSION) {
+        return null;
+    }
+
+    const count = view.getUint8(3);
+    if (view.byteLength < POSITION_HEADER_SIZE + count * POSITION_FISH_SIZE) {
+        return null;
+    }
+
+    const fish = [];
+    for (let i = 0; i < count; i++) {
+        const o = POSITION_HEADER_SIZE + i * POSITION_FISH_SIZE;
+        fish.push({
+            id: view.getUint16(o, true),
+            state: view.getUint8(o + 2),
+            flags: view.getUint8(o + 3),
+            x: view.getFloat32(o + 4, true),
+            y: view.getFloat32(o + 8, true),
+            vx: view.getFloat32(o + 12, true),
+            vy: view.getFloat32(o + 16, true),
+            speed: view.getFloat32(o + 20, true),
+            heading: view.getFloat32(o + 24, true),
+            size: view.getFloat32(o + 28, true)
+        });
+    }
+
+    return {
+        seq: view.getUint32(4, true),
+        t: view.getFloat64(8, true),
+        fish: fish
+    };
+}
+
+// Open a WebSocket to the tracker and call onRecord(record) for every binary record.
+// Reconnects automatically; onStatus(connected) reports connection changes.
+// Text messages (JSON) are passed to onMessage if given.
+function connectPositionStream(url, onRecord, onStatus, onMessage) {
+    let socket = null;
+    let closed = false;
+
+    function open() {
+        socket = new WebSocket(url);
+        socket.binaryType = "arraybuffer";
+
+        socket.onopen = function() {
+            if (onStatus) onStatus(true);
+        };
+
+        socket.onmessage = function(event) {
+            if (typeof event.data === "string") {
+                if (onMessage) onMessage(JSON.parse(event.data));
+                return;
+            }
+            const record = decodePositionRecord(event.data);
+            if (record) onRecord(record);
+        };
+
+        socket.onclose = function() {
+            if (onStatus) onStatus(false);
+            if (!closed) setTimeout(open, 2000);
+        };
+    }
+
+    open();
+
+    return {
+        close: function() {
+            closed = true;
+            if (socket) socket.close();
+        }
+    };
+}
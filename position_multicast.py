@@ -0,0 +1,198 @@
+import argparse
+import configparser
+import os
+import socket
+import struct
+import threading
+import time
+
+from position_protocol import decode_record
+from tracker_logging import setup_logging
+
+# UDP multicast distribution of position records (layout in position_protocol.py).
+#
+# The tracker sends each record once to a multicast group; every display PC on the
+# LAN joins the group and receives it without the tracker knowing how many there
+# are. Run the relay on each display PC to re-serve the stream locally:
+#
+#   python position_multicast.py relay     # local /position JSON + WebSocket (and the pages) for the browser
+#   python position_multicast.py listen    # print records (debugging)
+
+DEFAULT_GROUP = '239.255.42.99'
+DEFAULT_PORT = 5005
+MAX_REORDER = 64  # Frames a datagram may arrive late by; further back means the sender restarted
+
+def load_multicast_settings():
+    """Read the [Multicast] section of config.ini, falling back to defaults."""
+    config = configparser.ConfigParser()
+    config.read(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini'))
+    return {
+        'enabled': config.getboolean('Multicast', 'enabled', fallback=False),
+        'group': config.get('Multicast', 'group', fallback=DEFAULT_GROUP),
+        'port': config.getint('Multicast', 'port', fallback=DEFAULT_PORT),
+        'ttl': config.getint('Multicast', 'ttl', fallback=1),
+        'interface': config.get('Multicast', 'interface', fallback='0.0.0.0'),
+        'http_port': config.getint('Server', 'port', fallback=5000),
+        'ws_port': config.getint('Server', 'ws_port', fallback=5001),
+        'web': config.getboolean('Server', 'web', fallback=True)
+    }
+
+class MulticastPublisher:
+    """Send position records to a multicast group. Sending never blocks the caller."""
+
+    def __init__(self, group=DEFAULT_GROUP, port=DEFAULT_PORT, ttl=1, interface='0.0.0.0'):
+        self.address = (group, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        # TTL 1 keeps datagrams on the local network segment
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        if interface != '0.0.0.0':
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+        self.sock.setblocking(False)
+        self.sent = 0
+        self.dropped = 0
+
+    def publish(self, record):
+        try:
+            self.sock.sendto(record, self.address)
+            self.sent += 1
+        except OSError:
+            # Full socket buffer or no route: drop this record, the next frame replaces it
+            self.dropped += 1
+
+    def close(self):
+        self.sock.close()
+
+class MulticastSubscriber:
+    """Receive position records from a multicast group on a background thread.
+
+    on_record(record) is called with each decoded record (see decode_record), with
+    the datagram itself under 'raw' so it can be forwarded without re-encoding.
+    A record a few frames older than the last one seen (by sequence number, and
+    captured no later) arrived out of order and is discarded. One further back, or
+    captured later, means the sender started counting again (tracker restarted,
+    replay started): the subscriber follows the new numbering.
+    """
+
+    def __init__(self, on_record, group=DEFAULT_GROUP, port=DEFAULT_PORT, interface='0.0.0.0'):
+        self.on_record = on_record
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            # Lets several subscribers share the port on one machine
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.sock.bind(('', port))
+        membership = struct.pack('4s4s', socket.inet_aton(group), socket.inet_aton(interface))
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        self.sock.settimeout(1.0)
+        self.last_seq = None
+        self.last_t = None
+        self.received = 0
+        self.out_of_order = 0
+        self.resyncs = 0
+        self.running = False
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._receive_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.sock.close()
+
+    def _is_late(self, record):
+        """True for a late datagram to drop; notes a resync when the numbering restarted."""
+        if self.last_seq is None:
+            return False
+        # Sequence numbers wrap at 2^32, so compare modulo
+        behind = (self.last_seq - record['seq']) & 0xFFFFFFFF
+        if behind == 0 or behind >= 0x80000000:
+            return False  # Same frame again, or newer
+        if behind <= MAX_REORDER and record['t'] <= self.last_t:
+            return True
+        self.resyncs += 1
+        return False
+
+    def _receive_loop(self):
+        while self.running:
+            try:
+                data = self.sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            try:
+                record = decode_record(data)
+            except ValueError:
+                continue
+
+            if self._is_late(record):
+                self.out_of_order += 1
+                continue
+            self.last_seq = record['seq']
+            self.last_t = record['t']
+            record['raw'] = data
+            self.received += 1
+            self.on_record(record)
+
+def run_relay(settings, http_port, ws_port):
+    """Re-serve multicast records to the local browser as /position JSON and a WebSocket."""
+    from position_server import PositionServer
+
+    server = PositionServer(http_port, ws_port, web=settings['web'])
+
+    def on_record(record):
+        # Forward the datagram as-is; only the JSON view needs decoding
+        server.publish(record['seq'], record['t'], record['fish'], record=record['raw'])
+
+    subscriber = MulticastSubscriber(on_record, settings['group'], settings['port'], settings['interface'])
+    subscriber.start()
+    server.start()
+
+    print(f"Relaying {settings['group']}:{settings['port']} to http://0.0.0.0:{http_port}/position"
+          + (f" and ws://0.0.0.0:{ws_port}" if ws_port else "") + ". Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        subscriber.stop()
+        server.stop()
+
+def main():
+    setup_logging()  # Console only, for the relay's server messages
+    settings = load_multicast_settings()
+
+    parser = argparse.ArgumentParser(description="Subscribe to the fish tracker's multicast position stream")
+    parser.add_argument('mode', choices=['relay', 'listen'], help="relay: serve positions to a local browser; listen: print them")
+    parser.add_argument('--group', default=settings['group'])
+    parser.add_argument('--port', type=int, default=settings['port'])
+    parser.add_argument('--interface', default=settings['interface'], help="Local interface address to join on")
+    parser.add_argument('--http-port', type=int, default=settings['http_port'], help="relay: local /position port")
+    parser.add_argument('--ws-port', type=int, default=settings['ws_port'], help="relay: local WebSocket port (0 disables)")
+    args = parser.parse_args()
+    settings.update(group=args.group, port=args.port, interface=args.interface)
+
+    if args.mode == 'relay':
+        run_relay(settings, args.http_port, args.ws_port)
+        return
+
+    def print_record(record):
+        latency = (time.time() - record['t']) * 1000
+        for fish in record['fish']:
+            print(f"#{record['seq']} fish {fish['id']}: x={fish['x']:.3f}, y={fish['y']:.3f}, "
+                  f"speed={fish['speed']:.2f} ({latency:.1f} ms old)")
+
+    subscriber = MulticastSubscriber(print_record, settings['group'], settings['port'], settings['interface'])
+    subscriber.start()
+    print(f"Listening on {settings['group']}:{settings['port']}. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        subscriber.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import struct
+
+# Compact binary position record, all fields little-endian.
+#
+# Header (16 bytes):
+#   magic       2s   b'FT'
+#   version     B    PROTOCOL_VERSION
+#   fish_count  B    number of fish records that follow
+#   seq         I    frame sequence number (wraps at 2^32)
+#   timestamp   d    capture time of the frame, UNIX seconds
+#
+# Fish record (32 bytes each):
+#   id          H    fish id
+#   state       B    tracking state (0 = unknown)
+#   flags       B    FLAG_* bits
+#   x, y        2f   normalized tank position (0-1)
+#   vx, vy      2f   velocity, tank units per second
+#   speed       f    tank units per second
+#   heading     f    radians, 0 = +x, positive towards +y
+#   size        f    apparent length, normalized tank units
+#
+# position_decoder.js mirrors this layout for the browser.
+
+MAGIC = b'FT'
+PROTOCOL_VERSION = 1
+
+HEADER = struct.Struct('<2sBBId')
+FISH = struct.Struct('<HBB7f')
+
+FLAG_DETECTED = 0x01  # Position comes from a detection in this frame
+FLAG_STALE = 0x02     # Position is held or predicted, not freshly measured
+
+FISH_FIELDS = ('x', 'y', 'vx', 'vy', 'speed', 'heading', 'size')
+
+def encode_record(seq, timestamp, fish):
+    """Pack one frame's positions. fish is a list of position dicts (see FISH_FIELDS),
+    each optionally carrying 'id', 'state' and 'flags'."""
+    parts = [HEADER.pack(MAGIC, PROTOCOL_VERSION, len(fish), seq & 0xFFFFFFFF, timestamp)]
+    for i, f in enumerate(fish):
+        parts.append(FISH.pack(f.get('id', i), f.get('state', 0), f.get('flags', 0),
+                               *(f.get(name, 0.0) for name in FISH_FIELDS)))
+    return b''.join(parts)
+
+def decode_record(data):
+    """Unpack a record made by encode_record. Raises ValueError on malformed data."""
+    if len(data) < HEADER.size:
+        raise ValueError("Record too short")
+
+    magic, version, count, seq, timestamp = HEADER.unpack_from(data)
+    if magic != MAGIC or version != PROTOCOL_VERSION:
+        raise ValueError(f"Unknown record format {magic!r} v{version}")
+    if len(data) < HEADER.size + count * FISH.size:
+        raise ValueError("Record truncated")
+
+    fish = []
+    for i in range(count):
+        values = FISH.unpack_from(data, HEADER.size + i * FISH.size)
+        f = dict(zip(FISH_FIELDS, values[3:]))
+        f['id'], f['state'], f['flags'] = values[:3]
+        fish.append(f)
+
+    return {'seq': seq, 't': timestamp, 'fish': fish}
@@ -0,0 +1,393 @@
+import argparse
+import configparser
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+import numpy as np
+from flask import Flask, abort, jsonify, request, Response, send_from_directory
+from flask_cors import CORS
+
+from position_protocol import encode_record, FISH_FIELDS, FLAG_DETECTED
+from websocket_push import WebSocketBroadcaster
+from position_multicast import MulticastPublisher, DEFAULT_GROUP, DEFAULT_PORT
+from tracker_logging import setup_logging
+
+log = logging.getLogger('position_server')
+
+# Serves fish positions to the displays: /position (JSON), /position.bin (binary
+# record), the WebSocket push stream and optionally UDP multicast.
+#
+# fish_tracker.py feeds it from the camera. Run on its own, it plays back a
+# recorded session or generates swimming fish, so the web effects can be developed
+# and the serving path load-tested without a camera:
+#
+#   python position_server.py replay recordings/trajectory_20240101_120000.ftlog
+#   python position_server.py simulate --fish 20 --rate 60
+#
+# Playback is controlled through /replay (GET for status; POST or query parameters
+# seek=<seconds>, speed=<factor>, pause=1, resume=1).
+#
+# With web=True the same port also serves the display pages (index.html and the
+# scripts next to it) and config.json, built from config.ini on every request, so
+# the kiosk browser needs no separate web server.
+
+WEB_ROOT = os.path.dirname(os.path.abspath(__file__))
+WEB_FILES = ('.html', '.js', '.css')  # Only these are served, never config.ini, recordings etc.
+
+class PositionServer:
+    """HTTP, WebSocket and multicast publishing of the latest positions."""
+
+    def __init__(self, port=5000, ws_port=5001, multicast=None, web=False):
+        self.port = port
+        self.ws_port = ws_port
+        self.multicast = multicast  # dict(group, port, ttl, interface) or None
+        self.ws_broadcaster = None
+        self.multicast_publisher = None
+
+        default = {"x": 0.5, "y": 0.5, "vx": 0.0, "vy": 0.0, "speed": 0.0, "heading": 0.0, "size": 0.0}
+        self.payload = dict(default, state=0, confidence=0.0, t=time.time(), seq=0, fish=[])
+        self.record = encode_record(0, self.payload["t"], [])
+
+        self.app = Flask(__name__, static_folder=None)
+        CORS(self.app)  # Enable CORS for all routes
+
+        # Latest position stamped with its frame's capture time and sequence number
+        @self.app.route('/position')
+        def get_position():
+            return jsonify(self.payload)
+
+        # Same data in the compact binary layout from position_protocol.py
+        @self.app.route('/position.bin')
+        def get_position_binary():
+            return Response(self.record, mimetype='application/octet-stream')
+
+        if web:
+            self.add_web_routes(self.app)
+
+    @staticmethod
+    def add_web_routes(app):
+        """Serve the display pages and config.json (same layout as config.ini)."""
+
+        @app.route('/')
+        def index():
+            return send_from_directory(WEB_ROOT, 'index.html')
+
+        @app.route('/config.json')
+        def config_json():
+            config = configparser.ConfigParser()
+            config.read(os.path.join(WEB_ROOT, 'config.ini'))
+            return jsonify({section: dict(config.items(section)) for section in config.sections()})
+
+        @app.route('/<path:filename>')
+        def web_file(filename):
+            if not filename.endswith(WEB_FILES):
+                abort(404)
+            return send_from_directory(WEB_ROOT, filename)
+
+    def start(self):
+        server_thread = threading.Thread(target=self.app.run,
+                                         kwargs={'host': '0.0.0.0', 'port': self.port, 'threaded': True})
+        server_thread.daemon = True
+        server_thread.start()
+
+        if self.ws_port:
+            try:
+                self.ws_broadcaster = WebSocketBroadcaster(port=self.ws_port)
+                self.ws_broadcaster.start()
+                log.info("Binary position stream on ws://0.0.0.0:%d", self.ws_port, extra={'key': 'position_server:ws'})
+            except OSError as e:
+                log.warning("Could not start WebSocket stream on port %d: %s", self.ws_port, e,
+                            extra={'key': 'position_server:ws'})
+                self.ws_broadcaster = None
+
+        if self.multicast:
+            try:
+                self.multicast_publisher = MulticastPublisher(self.multicast['group'], self.multicast['port'],
+                                                              self.multicast['ttl'], self.multicast['interface'])
+                log.info("Publishing positions to multicast group %s:%d", self.multicast['group'], self.multicast['port'],
+                         extra={'key': 'position_server:multicast'})
+            except OSError as e:
+                log.warning("Could not set up multicast publishing: %s", e, extra={'key': 'position_server:multicast'})
+
+    def stop(self):
+        if self.ws_broadcaster:
+            self.ws_broadcaster.stop()
+        if self.multicast_publisher:
+            self.multicast_publisher.close()
+
+    def publish(self, seq, timestamp, fish, record=None):
+        """Make one frame's positions current on every channel.
+
+        fish is a list of position dicts (see FISH_FIELDS) with optional 'id',
+        'state', 'flags' and 'confidence'. The first fish is also served at the top
+        level of /position for displays that follow a single fish. Pass record to forward an
+        already encoded binary record instead of encoding it again.
+        """
+        if record is None:
+            record = encode_record(seq, timestamp, fish)
+
+        listed = [dict({name: float(f.get(name, 0.0)) for name in FISH_FIELDS},
+                       id=f.get('id', i), state=f.get('state', 0), flags=f.get('flags', 0),
+                       confidence=float(f.get('confidence', 1.0)))
+                  for i, f in enumerate(fish)]
+        payload = {name: listed[0][name] for name in FISH_FIELDS + ('state', 'confidence')} \
+            if listed else dict(self.payload)
+        payload.update(t=timestamp, seq=seq, fish=listed)
+
+        # Swap whole objects so request threads never see a half-updated frame
+        self.payload = payload
+        self.record = record
+
+        if self.ws_broadcaster:
+            self.ws_broadcaster.publish(record)
+        if self.multicast_publisher:
+            self.multicast_publisher.publish(record)
+
+    def publish_event(self, event):
+        """Push an event (see events.py) to WebSocket clients as a JSON text message.
+
+        Unlike positions, events are never replaced by newer ones before they go out.
+        """
+        if self.ws_broadcaster:
+            self.ws_broadcaster.publish(json.dumps(event, separators=(',', ':')), binary=False, replace=False)
+
+class TrajectorySource:
+    """Frames of recorded trajectory logs (see trajectory_log.py), addressed by session time.
+
+    The logs stay memory-mapped: only a per-frame index (first row and time) is
+    kept, and a frame's rows are read from its file when it is played.
+    """
+
+    def __init__(self, logs):
+        # In recording order, whatever order the files were listed in
+        self.logs = sorted((log for log in logs if len(log)), key=lambda log: float(log['t'][0]))
+        if not self.logs:
+            raise ValueError("Recording is empty")
+        self.starts = []  # Per file: the first row of every frame
+        times = []
+        for log in self.logs:
+            # A frame is a run of rows with the same sequence number
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(log['seq'].astype(np.int64)) != 0) + 1))
+            self.starts.append(starts)
+            times.append(np.asarray(log['t'][starts], dtype=np.float64))
+        # Index of each file's first frame in the whole session
+        self.file_offsets = np.cumsum([0] + [len(starts) for starts in self.starts])
+        self.frames = int(self.file_offsets[-1])
+        # Close the gaps between files (tracker stopped, restarted): each file
+        # follows the previous one a frame period after its last frame
+        intervals = np.concatenate([np.diff(t) for t in times])
+        period = float(np.median(intervals)) if len(intervals) else 1.0 / 30
+        end = -period
+        for i, t in enumerate(times):
+            times[i] = t - t[0] + end + period
+            end = times[i][-1]
+        self.times = np.concatenate(times)
+        self.duration = float(self.times[-1])
+
+    def frame_at(self, session_time):
+        index = max(0, int(np.searchsorted(self.times, session_time, side='right')) - 1)
+        file = int(np.searchsorted(self.file_offsets, index, side='right')) - 1
+        log, starts = self.logs[file], self.starts[file]
+        frame = index - self.file_offsets[file]
+        end = starts[frame + 1] if frame + 1 < len(starts) else len(log)
+        return [dict(zip(log.dtype.names, row.tolist())) for row in log[starts[frame]:end]]
+
+class SimulatedSource:
+    """Procedural fish swimming smooth, overlapping loops around the tank."""
+
+    def __init__(self, count=1, seed=0):
+        rng = np.random.default_rng(seed)
+        self.count = count
+        self.duration = None  # Endless
+        # Lissajous curves with different frequencies and phases for every fish
+        self.freq = rng.uniform(0.05, 0.25, size=(count, 2)) * 2 * math.pi
+        self.phase = rng.uniform(0, 2 * math.pi, size=(count, 2))
+        self.amplitude = rng.uniform(0.2, 0.42, size=(count, 2))
+        self.size = rng.uniform(0.05, 0.12, size=count)
+
+    def frame_at(self, session_time):
+        angle = self.freq * session_time + self.phase
+        pos = 0.5 + self.amplitude * np.sin(angle)
+        vel = self.amplitude * self.freq * np.cos(angle)
+        fish = []
+        for i in range(self.count):
+            vx, vy = vel[i]
+            fish.append({'id': i, 'flags': FLAG_DETECTED, 'x': pos[i, 0], 'y': pos[i, 1], 'vx': vx, 'vy': vy,
+                         'speed': math.hypot(vx, vy), 'heading': math.atan2(vy, vx), 'size': self.size[i]})
+        return fish
+
+class Playback:
+    """Publish a source at a fixed rate on a seekable, speed-controlled session clock."""
+
+    def __init__(self, source, server, rate=30.0, speed=1.0, loop=True):
+        self.source = source
+        self.server = server
+        self.period = 1.0 / rate
+        self.speed = speed
+        self.loop = loop
+        self.paused = False
+        self.lock = threading.Lock()
+        self.session_base = 0.0
+        self.wall_base = time.monotonic()
+        self.seq = 0
+        self.running = False
+
+        @server.app.route('/replay', methods=['GET', 'POST'])
+        def replay_control():
+            values = request.get_json(silent=True) or request.values
+            # Check every value before changing anything; nan or inf would wreck the session clock
+            numbers = {}
+            for name in ('seek', 'speed'):
+                if name in values:
+                    try:
+                        numbers[name] = float(values[name])
+                    except (TypeError, ValueError):
+                        numbers[name] = math.nan
+                    if not math.isfinite(numbers[name]) or numbers[name] < 0:
+                        return jsonify({'error': f"{name} must be a finite number, 0 or more"}), 400
+            if 'seek' in numbers:
+                self.seek(numbers['seek'])
+            if 'speed' in numbers:
+                self.set_speed(numbers['speed'])
+            if values.get('pause'):
+                self.pause()
+            if values.get('resume'):
+                self.resume()
+            return jsonify(self.status())
+
+    def session_time(self):
+        with self.lock:
+            if self.paused:
+                t = self.session_base
+            else:
+                t = self.session_base + (time.monotonic() - self.wall_base) * self.speed
+        duration = self.source.duration
+        if duration is not None and t > duration:
+            t = t % duration if self.loop and duration > 0 else duration
+        return t
+
+    def _rebase(self, session_time):
+        self.session_base = session_time
+        self.wall_base = time.monotonic()
+
+    def seek(self, seconds):
+        with self.lock:
+            self._rebase(max(0.0, seconds))
+
+    def set_speed(self, speed):
+        current = self.session_time()
+        with self.lock:
+            self._rebase(current)
+            self.speed = speed
+
+    def pause(self):
+        current = self.session_time()
+        with self.lock:
+            self._rebase(current)
+            self.paused = True
+
+    def resume(self):
+        with self.lock:
+            self._rebase(self.session_base)
+            self.paused = False
+
+    def status(self):
+        return {'time': self.session_time(), 'duration': self.source.duration, 'speed': self.speed,
+                'paused': self.paused, 'seq': self.seq}
+
+    def run(self):
+        """Publish frames until stop() is called (blocks)."""
+        self.running = True
+        next_tick = time.monotonic()
+        while self.running:
+            fish = self.source.frame_at(self.session_time())
+            # Restamp with the current time so displays see a live stream; scale the
+            # velocities so dead reckoning matches the playback speed
+            scale = 0.0 if self.paused else self.speed
+            for f in fish:
+                f['vx'] *= scale
+                f['vy'] *= scale
+                f['speed'] *= abs(scale)
+            self.seq += 1
+            self.server.publish(self.seq, time.time(), fish)
+
+            # Schedule against the ideal tick times so the rate doesn't drift
+            next_tick += self.period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+
+    def stop(self):
+        self.running = False
+
+def load_server_settings():
+    """Ports and multicast settings from config.ini."""
+    config = configparser.ConfigParser()
+    config.read(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini'))
+    multicast = None
+    if config.getboolean('Multicast', 'enabled', fallback=False):
+        multicast = {
+            'group': config.get('Multicast', 'group', fallback=DEFAULT_GROUP),
+            'port': config.getint('Multicast', 'port', fallback=DEFAULT_PORT),
+            'ttl': config.getint('Multicast', 'ttl', fallback=1),
+            'interface': config.get('Multicast', 'interface', fallback='0.0.0.0')
+        }
+    return {
+        'port': config.getint('Server', 'port', fallback=5000),
+        'ws_port': config.getint('Server', 'ws_port', fallback=5001),
+        'web': config.getboolean('Server', 'web', fallback=True),
+        'multicast': multicast
+    }
+
+def main():
+    setup_logging()  # Console only, for the server's messages
+    settings = load_server_settings()
+
+    parser = argparse.ArgumentParser(description="Serve recorded or simulated fish positions without a camera")
+    parser.add_argument('mode', choices=['replay', 'simulate'])
+    parser.add_argument('paths', nargs='*', help="replay: trajectory logs (default: everything in the [Recording] directory)")
+    parser.add_argument('--fish', type=int, default=1, help="simulate: number of fish (max 255)")
+    parser.add_argument('--seed', type=int, default=0, help="simulate: random seed for the swim paths")
+    parser.add_argument('--rate', type=float, default=30.0, help="Frames published per second")
+    parser.add_argument('--speed', type=float, default=1.0, help="Playback speed factor")
+    parser.add_argument('--start', type=float, default=0.0, help="Start this many seconds into the session")
+    parser.add_argument('--no-loop', action='store_true', help="replay: hold the last frame instead of looping")
+    parser.add_argument('--port', type=int, default=settings['port'])
+    parser.add_argument('--ws-port', type=int, default=settings['ws_port'], help="0 disables the WebSocket stream")
+    args = parser.parse_args()
+
+    if args.mode == 'replay':
+        from trajectory_log import list_logs, open_logs
+        paths = args.paths or list_logs()
+        if not paths:
+            print("❌ No trajectory logs to replay. Record some with [Recording] enabled = true.")
+            return
+        source = TrajectorySource(open_logs(paths))
+        print(f"Replaying {len(paths)} file(s), {source.duration / 60:.1f} min, {source.frames} frames")
+    else:
+        source = SimulatedSource(min(args.fish, 255), args.seed)
+        print(f"Simulating {source.count} fish")
+
+    server = PositionServer(args.port, args.ws_port, settings['multicast'], settings['web'])
+    playback = Playback(source, server, args.rate, args.speed, loop=not args.no_loop)
+    playback.seek(args.start)
+    server.start()
+    print(f"Server running on port {args.port} at {args.rate:g} frames/s. Press Ctrl+C to stop.")
+    if settings['web']:
+        print(f"Display page at http://localhost:{args.port}/")
+
+    try:
+        playback.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -26,20 +26,12 @@ python -c "import configparser, json; config = configparser.ConfigParser(); conf
 goto :start
 
 :start
-:: Start the HTTP server
-start cmd /k "python -m http.server 8080"
-
-:: Start the fish tracker
-start cmd /k "python fish_tracker.py"
-
-:: Wait a moment for servers to start
-timeout /t 3
-
-:: Start Chrome in kiosk mode
-start chrome --kiosk --incognito http://localhost:8080
+:: Start the fish tracker, which also serves the web pages; the launcher restarts it
+:: if it fails and opens Chrome in kiosk mode once it is ready
+start cmd /k "python launcher.py"
 
 echo Fish tank started. Close this window to exit.
-echo To stop completely, close all command windows that were opened.
+echo To stop completely, press Ctrl+C in the launcher window.
 goto :end
 
 :calibrate_area
@@ -1,36 +1,7 @@
 #!/bin/bash
 
-# Start in background
+# Start the tracker and the kiosk browser as one process tree (see launcher.py).
+# The tracker serves the display pages itself, is restarted if it fails, and
+# everything stops on Ctrl+C or ./stop_fish_tank.sh.
 cd "$(dirname "$0")"
-
-# Start web server for the visual effects
-python3 -m http.server 8080 &
-HTTP_PID=$!
-
-# Start fish tracker
-python3 fish_tracker.py &
-TRACKER_PID=$!
-
-# Start browser in fullscreen kiosk mode
-if [[ "$OSTYPE" == "darwin"* ]]; then
-  # macOS
-  open -a "Google Chrome" --args --kiosk --incognito http://localhost:8080
-elif [[ "$OSTYPE" == "linux-gnu"* ]]; then
-  # Linux
-  chromium-browser --kiosk --incognito http://localhost:8080 &
-else
-  # Windows
-  start chrome --kiosk --incognito http://localhost:8080
-fi
-BROWSER_PID=$!
-
-# Save PIDs for clean shutdown
-echo $HTTP_PID > http_server.pid
-echo $TRACKER_PID > tracker.pid
-echo $BROWSER_PID > browser.pid
-
-echo "Fish tank started. Press Ctrl+C to stop."
-
-# Wait for interrupt
-trap "kill $(cat http_server.pid) $(cat tracker.pid) $(cat browser.pid 2>/dev/null); rm *.pid; exit" INT
-wait
\ No newline at end of file
+exec python3 "$(pwd)/launcher.py" "$@"
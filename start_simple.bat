@@ -13,23 +13,10 @@ python -c "import configparser, json; config = configparser.ConfigParser(); conf
 echo Using fixed version of index.html...
 copy /Y index_fixed.html index.html
 
-:: Start the HTTP server
-echo Starting web server on port 8080...
-start cmd /k "python -m http.server 8080"
-
-:: Wait a moment
-timeout /t 2 > nul
-
-:: Start the fish tracker
+:: Start the fish tracker, which also serves the web pages, and Chrome in a
+:: new window once it is ready (not kiosk mode for debugging)
 echo Starting fish tracking...
-start cmd /k "python fish_tracker.py"
-
-:: Wait a moment
-timeout /t 3 > nul
-
-:: Start Chrome in a new window (not kiosk mode for debugging)
-echo Starting browser...
-start chrome http://localhost:8080
+start cmd /k "python launcher.py --no-kiosk"
 
 echo.
 echo If you encounter issues:
@@ -1,20 +1,16 @@
 #!/bin/bash
 
-# Kill all processes
+# Ask the launcher to stop; it stops the tracker (which saves its state) and the browser
 cd "$(dirname "$0")"
-if [ -f http_server.pid ]; then
-    kill $(cat http_server.pid) 2>/dev/null
-    rm http_server.pid
+LAUNCHER="$(pwd)/launcher.py"
+if ! pkill -TERM -f "$LAUNCHER"; then
+    echo "Fish tank is not running."
+    exit 0
 fi
 
-if [ -f tracker.pid ]; then
-    kill $(cat tracker.pid) 2>/dev/null
-    rm tracker.pid
-fi
-
-if [ -f browser.pid ]; then
-    kill $(cat browser.pid) 2>/dev/null
-    rm browser.pid
-fi
+for i in $(seq 15); do
+    pgrep -f "$LAUNCHER" > /dev/null || break
+    sleep 1
+done
 
-echo "Fish tank stopped."
\ No newline at end of file
+echo "Fish tank stopped."
@@ -0,0 +1,212 @@
+import atexit
+import configparser
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+# Logging for the tracker, set up once by the program (fish_tracker.py or launcher.py main):
+#
+#   log = logging.getLogger('fish_tracker')
+#   log.info("Opening %s...", source.name)
+#   log.debug("Frame %d", seq, extra={'key': 'frame', 'sample': 30, 'fields': {'seq': seq, 'ms': ms}})
+#
+# Records are filtered and queued on the calling thread and written by a single
+# background thread, so a slow disk or console never holds up detection. The
+# queue is bounded; when it is full new records are dropped and counted rather
+# than waited for.
+#
+# Every record has a key: extra={'key': ...}, or else its message template, so
+# "%s" style arguments share one key. Each key may log at most rate_limit records
+# per second (bursts of rate_burst); what is held back is counted and reported on
+# the next record of that key as 'suppressed'. extra={'sample': n} keeps one
+# record in n of its key, for per-frame diagnostics.
+#
+# The console gets the plain messages as before. The log file, if any, gets one
+# JSON object per line - t, level, logger, msg, key, the 'fields' and
+# 'suppressed' - and is rotated at max_mb, keeping `backups` old files.
+
+LOGGER_NAMES = ('fish_tracker', 'frame_sources', 'events', 'launcher', 'camera_capture', 'position_server')
+MAX_KEYS = 10000  # Rate limiter state is forgotten past this many keys
+
+def load_logging_settings(config_file):
+    """[Logging] settings from a config file, defaults if it or the section is missing."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    path = config.get('Logging', 'file', fallback='logs/tracker.log').strip()
+    if path and not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(config_file)), path)
+    return {
+        'level': config.get('Logging', 'level', fallback='info').strip().upper(),
+        'file': path or None,
+        'max_mb': config.getfloat('Logging', 'max_mb', fallback=10.0),
+        'backups': config.getint('Logging', 'backups', fallback=5),
+        'json_console': config.getboolean('Logging', 'json_console', fallback=False),
+        'queue_size': config.getint('Logging', 'queue_size', fallback=10000),
+        'rate_limit': config.getfloat('Logging', 'rate_limit', fallback=1.0),
+        'rate_burst': config.getint('Logging', 'rate_burst', fallback=5)
+    }
+
+def default_logging_settings():
+    """Console only."""
+    return {'level': 'INFO', 'file': None, 'max_mb': 10.0, 'backups': 5, 'json_console': False,
+            'queue_size': 10000, 'rate_limit': 1.0, 'rate_burst': 5}
+
+class RateLimitFilter(logging.Filter):
+    """Per-key token bucket and 1-in-n sampling; stamps record.key and record.suppressed."""
+
+    def __init__(self, rate, burst):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.keys = {}  # key -> [tokens, last time, suppressed, sample counter]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, 'key', None) or f"{record.name}:{record.msg}"
+        record.key = key
+        now = time.monotonic()
+        with self.lock:
+            state = self.keys.get(key)
+            if state is None:
+                if len(self.keys) >= MAX_KEYS:
+                    self.keys.clear()
+                state = self.keys[key] = [float(self.burst), now, 0, 0]
+            sample = getattr(record, 'sample', 1)
+            if sample > 1:
+                state[3] += 1
+                if state[3] % sample != 1:
+                    return False
+            if self.rate > 0:
+                state[0] = min(state[0] + (now - state[1]) * self.rate, self.burst)
+                state[1] = now
+                if state[0] < 1.0:
+                    state[2] += 1
+                    return False
+                state[0] -= 1.0
+            record.suppressed, state[2] = state[2], 0
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback here, the writer thread gets plain text
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record):
+        entry = {
+            't': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'key': getattr(record, 'key', None)
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, separators=(',', ':'))
+
+class ConsoleFormatter(logging.Formatter):
+    """The message as the tracker used to print it, with 'Warning:'/'Error:' in front where due."""
+
+    def format(self, record):
+        text = record.getMessage()
+        if record.levelno >= logging.ERROR:
+            text = "Error: " + text
+        elif record.levelno >= logging.WARNING:
+            text = "Warning: " + text
+        if getattr(record, 'suppressed', 0):
+            text += f" ({record.suppressed} similar suppressed)"
+        if record.exc_text:
+            text += "\n" + record.exc_text
+        return text
+
+_listener = None
+_queue_handler = None
+
+def setup_logging(settings=None):
+    """Route the tracker's loggers through the queue to the console and the log file.
+
+    Calling it again replaces the previous setup.
+    """
+    global _listener, _queue_handler
+    settings = settings or default_logging_settings()
+    shutdown_logging()
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(JsonFormatter() if settings['json_console'] else ConsoleFormatter())
+    handlers = [console]
+    if settings['file']:
+        try:
+            os.makedirs(os.path.dirname(settings['file']), exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                settings['file'], maxBytes=int(settings['max_mb'] * 1024 * 1024),
+                backupCount=settings['backups'], encoding='utf-8')
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+        except OSError as e:
+            print(f"Warning: Could not open log file {settings['file']}: {e}")
+
+    log_queue = queue.Queue(maxsize=settings['queue_size'])
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(RateLimitFilter(settings['rate_limit'], settings['rate_burst']))
+    _listener = logging.handlers.QueueListener(log_queue, *handlers)
+    _listener.start()
+
+    level = getattr(logging, settings['level'], logging.INFO)
+    for name in LOGGER_NAMES:
+        logger = logging.getLogger(name)
+        logger.handlers[:] = [_queue_handler]
+        logger.setLevel(level)
+        logger.propagate = False
+
+def shutdown_logging():
+    """Write out what is queued and stop the writer thread."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    if _queue_handler is not None:
+        for name in LOGGER_NAMES:
+            logger = logging.getLogger(name)
+            if _queue_handler in logger.handlers:
+                logger.removeHandler(_queue_handler)
+        _queue_handler = None
+
+# Whatever is still queued is written out when the program exits
+atexit.register(shutdown_logging)
+
+def dropped_records():
+    """Records dropped because the queue was full since setup_logging()."""
+    return _queue_handler.dropped if _queue_handler else 0
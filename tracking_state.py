@@ -0,0 +1,194 @@
+import numpy as np
+
+# Tracking state machine for a single fish.
+#
+#   SEARCHING  nothing seen yet: full-frame detection, the largest blob is a candidate
+#   TENTATIVE  a candidate must reappear within `gate` of itself for `lock_frames`
+#              frames before the published position moves to it
+#   LOCKED     the fish is followed: detection runs only in a window around the
+#              predicted position, and only blobs within `gate` of it are taken
+#   COASTING   the fish was missed: the position is held, the window and the gate
+#              widen, and confidence fades over `coast_time` seconds
+#   LOST       coasting ran out: back to full-frame search, as SEARCHING
+#
+# A reflection or a second red object can only take over the published position
+# by surviving TENTATIVE, so a single bright frame no longer makes the fish jump.
+#
+# The state numbers are what goes into the 'state' byte of the binary position
+# record (position_protocol.py, 0 = unknown).
+
+SEARCHING = 1
+TENTATIVE = 2
+LOCKED = 3
+COASTING = 4
+LOST = 5
+
+STATE_NAMES = {0: 'unknown', SEARCHING: 'searching', TENTATIVE: 'tentative',
+               LOCKED: 'locked', COASTING: 'coasting', LOST: 'lost'}
+
+def load_tracking_settings(config):
+    """State machine settings from the [Tracking] section, with defaults for older configs."""
+    return {
+        'roi': config.getboolean('Tracking', 'roi', fallback=True),
+        'roi_margin': config.getfloat('Tracking', 'roi_margin', fallback=2.0),
+        'min_roi': config.getint('Tracking', 'min_roi', fallback=96),
+        'gate': config.getfloat('Tracking', 'gate', fallback=0.2),
+        'lock_frames': config.getint('Tracking', 'lock_frames', fallback=3),
+        'coast_time': config.getfloat('Tracking', 'coast_time', fallback=0.5),
+        'background_interval': config.getint('Tracking', 'background_interval', fallback=5)
+    }
+
+def default_tracking_settings():
+    return {'roi': True, 'roi_margin': 2.0, 'min_roi': 96, 'gate': 0.2, 'lock_frames': 3,
+            'coast_time': 0.5, 'background_interval': 5}
+
+class TrackState:
+    """Decides where to look for the fish and whether a detection is believed.
+
+    Per frame: search_roi(t) gives the pixel window to detect in (None = full
+    frame), select(...) picks the blob to use, update(...) advances the state.
+    Positions are normalized tank coordinates, the window is in frame pixels.
+    """
+
+    def __init__(self, settings, frame_width, frame_height):
+        self.settings = settings
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.reset()
+
+    def reset(self):
+        self.state = SEARCHING
+        self.confidence = 0.0
+        self.hits = 0  # Consistent detections while TENTATIVE
+        self.position = None  # Last believed (or tentative) tank position
+        self.velocity = (0.0, 0.0)  # Tank units per second
+        self.pixel = None  # Last believed blob centre in frame pixels
+        self.pixel_velocity = (0.0, 0.0)
+        self.pixel_size = 0.0  # Longer side of the fish's bounding box
+        self.seen = None  # Time of the last believed detection
+        self.coast_confidence = 0.0
+
+    @property
+    def name(self):
+        return STATE_NAMES[self.state]
+
+    @property
+    def locked(self):
+        return self.state == LOCKED
+
+    def _elapsed(self, t):
+        return min(max(t - self.seen, 0.0), self.settings['coast_time']) if self.seen is not None else 0.0
+
+    def predicted(self, t):
+        """Where the fish should be now in tank coordinates, or None while searching."""
+        if self.position is None:
+            return None
+        if self.state not in (LOCKED, COASTING):
+            return self.position
+        dt = self._elapsed(t)
+        return (self.position[0] + self.velocity[0] * dt, self.position[1] + self.velocity[1] * dt)
+
+    def gate(self, t):
+        """Largest believable distance from the prediction; widens while coasting."""
+        gate = self.settings['gate']
+        if self.state == COASTING:
+            gate *= 1 + self._elapsed(t) / self.settings['coast_time']
+        return gate
+
+    def search_roi(self, t):
+        """(x0, y0, x1, y1) pixel window to detect in, or None to search the whole frame."""
+        if not self.settings['roi'] or self.state not in (LOCKED, COASTING) or self.pixel is None:
+            return None
+        dt = self._elapsed(t)
+        cx = self.pixel[0] + self.pixel_velocity[0] * dt
+        cy = self.pixel[1] + self.pixel_velocity[1] * dt
+        half = max(self.settings['min_roi'] / 2, self.settings['roi_margin'] * self.pixel_size)
+        if self.state == COASTING:
+            half *= 1 + dt / self.settings['coast_time']
+        x0, x1 = int(max(cx - half, 0)), int(min(cx + half, self.frame_width))
+        y0, y1 = int(max(cy - half, 0)), int(min(cy + half, self.frame_height))
+        if x1 - x0 < 8 or y1 - y0 < 8:
+            return None
+        return (x0, y0, x1, y1)
+
+    def select(self, positions, areas, t):
+        """Index of the blob to use as this frame's measurement, or None.
+
+        positions is (N, 2) tank coordinates of the valid blobs, areas their sizes.
+        """
+        if len(positions) == 0:
+            return None
+        if self.state in (SEARCHING, LOST):
+            return int(np.argmax(areas))
+
+        # The blob nearest to where the fish should be, if it is close enough
+        reference = self.predicted(t)
+        distances = np.hypot(positions[:, 0] - reference[0], positions[:, 1] - reference[1])
+        nearest = int(np.argmin(distances))
+        if distances[nearest] < self.gate(t):
+            return nearest
+        # A candidate that didn't come back makes way for the largest blob
+        return int(np.argmax(areas)) if self.state == TENTATIVE else None
+
+    def update(self, t, measurement=None):
+        """Advance the state with this frame's measurement.
+
+        measurement is None or a dict with the tank 'position', the pixel 'center'
+        and the pixel 'size' of the selected blob. Returns True when it was
+        accepted as the fish (the published position should follow it).
+        """
+        s = self.settings
+        if measurement is None:
+            if self.state == LOCKED:
+                self.state = COASTING
+                self.coast_confidence = self.confidence
+            if self.state == COASTING:
+                elapsed = t - self.seen
+                if elapsed >= s['coast_time']:
+                    self.state = LOST
+                    self.confidence = 0.0
+                else:
+                    self.confidence = self.coast_confidence * (1 - elapsed / s['coast_time'])
+            elif self.state == TENTATIVE:
+                # One miss ends a candidate; the fish has to show up consistently
+                self.state = LOST if self.seen is not None else SEARCHING
+                self.hits = 0
+                self.confidence = 0.0
+            return False
+
+        position = measurement['position']
+        if self.state in (SEARCHING, LOST) or (
+                self.state == TENTATIVE and
+                np.hypot(position[0] - self.position[0], position[1] - self.position[1]) >= s['gate']):
+            # A new candidate
+            self.state = TENTATIVE
+            self.hits = 1
+        elif self.state == TENTATIVE:
+            self.hits += 1
+
+        if self.state == TENTATIVE:
+            self.position = position
+            if self.hits < s['lock_frames']:
+                self.confidence = 0.5 * self.hits / s['lock_frames']
+                return False
+            # Confirmed: follow it from here, without velocity carried over from before
+            self.state = LOCKED
+            self.velocity = self.pixel_velocity = (0.0, 0.0)
+            self.pixel = self.seen = None
+            self.confidence = 0.5
+
+        # LOCKED (or confirmed, or found again while coasting)
+        self.state = LOCKED
+        center = measurement['center']
+        if self.seen is not None and t > self.seen:
+            dt = t - self.seen
+            self.velocity = (0.5 * self.velocity[0] + 0.5 * (position[0] - self.position[0]) / dt,
+                             0.5 * self.velocity[1] + 0.5 * (position[1] - self.position[1]) / dt)
+            self.pixel_velocity = (0.5 * self.pixel_velocity[0] + 0.5 * (center[0] - self.pixel[0]) / dt,
+                                   0.5 * self.pixel_velocity[1] + 0.5 * (center[1] - self.pixel[1]) / dt)
+        self.position = position
+        self.pixel = center
+        self.pixel_size = measurement['size']
+        self.seen = t
+        self.confidence += 0.25 * (1.0 - self.confidence)
+        return True
@@ -0,0 +1,200 @@
+import argparse
+import collections
+import configparser
+import glob
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+# Fixed-width binary trajectory log.
+#
+# Each file starts with a 16-byte header followed by one 48-byte row per fish per
+# frame (RECORD_DTYPE, little-endian). Because every row has the same size, a file
+# can be opened with np.memmap and sliced like an array without reading it:
+#
+#   log = open_log('recordings/trajectory_20240101_120000.ftlog')
+#   log['x'], log['t'], log[log['flags'] & 1]
+#
+# The tracker hands rows to TrajectoryRecorder.record(), which only appends to a
+# queue; a background thread packs and writes them every flush_interval seconds
+# and starts a new file once the current one reaches rotate_bytes.
+
+MAGIC = b'FTTRAJ\r\n'
+LOG_VERSION = 1
+HEADER = struct.Struct('<8sII')  # magic, version, row size
+
+RECORD_DTYPE = np.dtype([
+    ('t', '<f8'),           # capture time of the frame, UNIX seconds
+    ('seq', '<u4'),         # frame sequence number
+    ('id', '<u2'),          # fish id
+    ('state', 'u1'),        # tracking state (0 = unknown)
+    ('flags', 'u1'),        # FLAG_* bits from position_protocol.py
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('vx', '<f4'),
+    ('vy', '<f4'),
+    ('speed', '<f4'),
+    ('heading', '<f4'),
+    ('size', '<f4'),
+    ('confidence', '<f4')   # detection confidence, 0-1
+])
+
+LOG_EXTENSION = '.ftlog'
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini')
+
+class TrajectoryRecorder:
+    """Append tracking results to rotating .ftlog files from a background thread."""
+
+    def __init__(self, directory='recordings', rotate_bytes=64 * 1024 * 1024, flush_interval=1.0):
+        self.directory = directory
+        self.rotate_bytes = rotate_bytes
+        self.flush_interval = flush_interval
+        self.queue = collections.deque()  # append/popleft are thread-safe
+        self.file = None
+        self.path = None
+        self.file_bytes = 0
+        self.rows_written = 0
+        self.files = []
+        self.running = False
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.running = True
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self._write_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Write everything still queued and close the current file."""
+        self.running = False
+        self.wake.set()
+        self.thread.join()
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def record(self, seq, timestamp, fish):
+        """Queue one frame. fish is a list of position dicts as sent to encode_record,
+        optionally with 'confidence'. Cheap enough to call from the capture loop."""
+        self.queue.append((seq, timestamp, fish))
+
+    def _write_loop(self):
+        while self.running:
+            self.wake.wait(self.flush_interval)
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        rows = []
+        while self.queue:
+            seq, timestamp, fish = self.queue.popleft()
+            for i, f in enumerate(fish):
+                rows.append((timestamp, seq & 0xFFFFFFFF, f.get('id', i), f.get('state', 0), f.get('flags', 0),
+                             f.get('x', 0.0), f.get('y', 0.0), f.get('vx', 0.0), f.get('vy', 0.0),
+                             f.get('speed', 0.0), f.get('heading', 0.0), f.get('size', 0.0),
+                             f.get('confidence', 0.0)))
+        if not rows:
+            return
+
+        data = np.array(rows, dtype=RECORD_DTYPE).tobytes()
+        if self.file is None or self.file_bytes + len(data) > self.rotate_bytes:
+            self._rotate()
+        self.file.write(data)
+        self.file.flush()
+        self.file_bytes += len(data)
+        self.rows_written += len(rows)
+
+    def _rotate(self):
+        if self.file:
+            self.file.close()
+        stamp = time.strftime('%Y%m%d_%H%M%S')
+        path = os.path.join(self.directory, f"trajectory_{stamp}{LOG_EXTENSION}")
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(self.directory, f"trajectory_{stamp}_{n}{LOG_EXTENSION}")
+            n += 1
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, LOG_VERSION, RECORD_DTYPE.itemsize))
+        self.file_bytes = HEADER.size
+        self.path = path
+        self.files.append(path)
+
+def open_log(path):
+    """Memory-map a trajectory file as a read-only structured array (RECORD_DTYPE).
+
+    Nothing is read until the rows are used. A row cut short by a crash or a
+    file still being written is ignored.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"{path}: not a trajectory log")
+    magic, version, row_size = HEADER.unpack(header)
+    if magic != MAGIC or version != LOG_VERSION or row_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path}: unsupported trajectory log (version {version}, row size {row_size})")
+
+    rows = (os.path.getsize(path) - HEADER.size) // RECORD_DTYPE.itemsize
+    if rows == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER.size, shape=(rows,))
+
+def recording_directory(config_file=CONFIG_FILE, config=None):
+    """The [Recording] directory, a relative one resolved against config.ini's folder.
+
+    Pass config to use an already read ConfigParser.
+    """
+    if config is None:
+        config = configparser.ConfigParser()
+        config.read(config_file)
+    directory = config.get('Recording', 'directory', fallback='recordings')
+    if not os.path.isabs(directory):
+        directory = os.path.join(os.path.dirname(os.path.abspath(config_file)), directory)
+    return directory
+
+def list_logs(directory=None):
+    """Trajectory files in a directory (default: the one the tracker records to), oldest first."""
+    if directory is None:
+        directory = recording_directory()
+    return sorted(glob.glob(os.path.join(directory, '*' + LOG_EXTENSION)), key=os.path.getmtime)
+
+def open_logs(paths):
+    """Memory-map several files (e.g. a rotated session) as a list of arrays."""
+    return [open_log(path) for path in paths]
+
+def fish_track(log, fish_id=0):
+    """Rows of one fish, in capture order."""
+    return log[log['id'] == fish_id]
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect fish tracker trajectory logs")
+    parser.add_argument('paths', nargs='*', help="Log files (default: everything in the [Recording] directory)")
+    parser.add_argument('--csv', help="Also export the rows to this CSV file")
+    args = parser.parse_args()
+
+    paths = args.paths or list_logs()
+    if not paths:
+        print(f"No trajectory logs found in {recording_directory()}.")
+        return
+
+    logs = open_logs(paths)
+    for path, log in zip(paths, logs):
+        if len(log) == 0:
+            print(f"📄 {path}: empty")
+            continue
+        duration = log['t'][-1] - log['t'][0]
+        detected = np.count_nonzero(log['flags'] & 1)
+        print(f"📄 {path}: {len(log)} rows, {duration / 60:.1f} min, "
+              f"{len(np.unique(log['id']))} fish, {100 * detected / len(log):.0f}% detected")
+
+    if args.csv:
+        rows = np.concatenate(logs)
+        np.savetxt(args.csv, rows, delimiter=',', header=','.join(RECORD_DTYPE.names), comments='',
+                   fmt=['%.6f', '%d', '%d', '%d', '%d'] + ['%.6f'] * 8)
+        print(f"✅ Exported {len(rows)} rows to {args.csv}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import base64
+import hashlib
+import selectors
+import socket
+import struct
+import threading
+
+# Minimal push-only WebSocket server (RFC 6455) built on the standard library.
+# Browsers connect and receive every published message; anything they send other
+# than ping/close is ignored. Slow clients never hold up the publisher: only the
+# newest position is kept, and a client that can't take it in time is dropped.
+
+WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+def make_frame(payload, opcode):
+    """Build an unmasked, unfragmented server-to-client frame."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+class WebSocketBroadcaster:
+    """Push the latest message to every connected browser from background threads."""
+
+    def __init__(self, host='0.0.0.0', port=5001, send_timeout=0.2):
+        self.host = host
+        self.port = port
+        self.send_timeout = send_timeout
+        self.clients = []
+        self.clients_lock = threading.Lock()
+        self.send_lock = threading.Lock()  # Frames from the two threads must not interleave
+        self.pending = []  # (frame, replaceable) waiting to be sent
+        self.pending_ready = threading.Condition()
+        self.running = False
+
+    def start(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((self.host, self.port))
+        self.server.listen(16)
+        self.port = self.server.getsockname()[1]
+        self.running = True
+
+        for target in (self._accept_loop, self._send_loop):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        with self.pending_ready:
+            self.pending_ready.notify()
+        self.server.close()
+        with self.clients_lock:
+            for client in self.clients:
+                client.close()
+            self.clients = []
+
+    def publish(self, payload, binary=True, replace=True):
+        """Queue a message for every client.
+
+        With replace=True (positions) the message supersedes any earlier replaceable
+        message that hasn't gone out yet; replace=False (events) always gets delivered.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        frame = make_frame(payload, OPCODE_BINARY if binary else OPCODE_TEXT)
+        with self.pending_ready:
+            if replace:
+                self.pending = [item for item in self.pending if not item[1]]
+            self.pending.append((frame, replace))
+            self.pending_ready.notify()
+
+    def client_count(self):
+        with self.clients_lock:
+            return len(self.clients)
+
+    def _send_loop(self):
+        while self.running:
+            with self.pending_ready:
+                while not self.pending and self.running:
+                    self.pending_ready.wait()
+                frames, self.pending = self.pending, []
+
+            for frame, _ in frames:
+                self._send_to_all(frame)
+
+    def _send_to_all(self, frame):
+        with self.clients_lock:
+            clients = list(self.clients)
+
+        for client in clients:
+            try:
+                with self.send_lock:
+                    client.sendall(frame)
+            except OSError:
+                self._drop(client)
+
+    def _drop(self, client):
+        with self.clients_lock:
+            if client in self.clients:
+                self.clients.remove(client)
+        try:
+            client.close()
+        except OSError:
+            pass
+
+    def _accept_loop(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.server, selectors.EVENT_READ)
+        registered = set()
+
+        while self.running:
+            # Watch connected clients for close/ping frames
+            with self.clients_lock:
+                current = set(self.clients)
+            for client in current - registered:
+                selector.register(client, selectors.EVENT_READ)
+            for client in registered - current:
+                try:
+                    selector.unregister(client)
+                except (KeyError, ValueError):
+                    pass
+            registered = current
+
+            try:
+                events = selector.select(timeout=1.0)
+            except (OSError, ValueError):
+                if not self.running:
+                    break
+                continue
+
+            for key, _ in events:
+                if key.fileobj is self.server:
+                    try:
+                        conn, _ = self.server.accept()
+                    except OSError:
+                        continue
+                    self._handshake(conn)
+                else:
+                    self._read_from(key.fileobj)
+
+        selector.close()
+
+    def _handshake(self, conn):
+        try:
+            conn.settimeout(2.0)
+            request = b''
+            while b'\r\n\r\n' not in request:
+                chunk = conn.recv(4096)
+                if not chunk or len(request) > 16384:
+                    raise OSError("Incomplete handshake")
+                request += chunk
+
+            headers = {}
+            for line in request.decode('latin-1').split('\r\n')[1:]:
+                if ':' in line:
+                    name, value = line.split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+
+            key = headers.get('sec-websocket-key')
+            if key is None or 'websocket' not in headers.get('upgrade', '').lower():
+                conn.sendall(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n')
+                conn.close()
+                return
+
+            accept = base64.b64encode(hashlib.sha1(key.encode('ascii') + WEBSOCKET_GUID).digest())
+            conn.sendall(b'HTTP/1.1 101 Switching Protocols\r\n'
+                         b'Upgrade: websocket\r\n'
+                         b'Connection: Upgrade\r\n'
+                         b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+
+            conn.settimeout(self.send_timeout)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self.clients_lock:
+                self.clients.append(conn)
+        except OSError:
+            conn.close()
+
+    def _read_from(self, client):
+        try:
+            header = client.recv(2)
+            if len(header) < 2:
+                raise OSError("Connection closed")
+
+            opcode = header[0] & 0x0F
+            length = header[1] & 0x7F
+            if length == 126:
+                length = struct.unpack('!H', self._recv_exact(client, 2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', self._recv_exact(client, 8))[0]
+            if length > 65536:
+                raise OSError("Client frame too large")
+
+            # Client frames are always masked
+            mask = self._recv_exact(client, 4) if header[1] & 0x80 else b'\0\0\0\0'
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self._recv_exact(client, length)))
+
+            if opcode == OPCODE_CLOSE:
+                raise OSError("Client closed")
+            if opcode == OPCODE_PING:
+                with self.send_lock:
+                    client.sendall(make_frame(payload, OPCODE_PONG))
+        except OSError:
+            self._drop(client)
+
+    @staticmethod
+    def _recv_exact(client, n):
+        data = b''
+        while len(data) < n:
+            chunk = client.recv(n - len(data))
+            if not chunk:
+                raise OSError("Connection closed")
+            data += chunk
+        return data
@@ -0,0 +1,30 @@
+import cv2
+
+# Luma and red-difference (Cr) planes for the single-channel detection path.
+#
+# Red stands out in Cr alone, so the fish can be thresholded on one channel
+# instead of converting the whole frame to HSV, and background subtraction only
+# needs brightness. From a BGR frame that is one YCrCb conversion; from a raw
+# YUYV camera frame (2 bytes per pixel) both planes are read straight out of the
+# camera's own format and no BGR image is made at all.
+
+def bgr_planes(frame, ycrcb=None, luma=None, cr=None):
+    """(luma, cr) from a BGR frame. Pass buffers to have them filled instead of allocated."""
+    ycrcb = cv2.cvtColor(frame, cv2.COLOR_BGR2YCrCb, dst=ycrcb)
+    return cv2.extractChannel(ycrcb, 0, dst=luma), cv2.extractChannel(ycrcb, 1, dst=cr)
+
+def yuyv_planes(raw, width, height, luma=None, cr=None, cr_half=None):
+    """(luma, cr) from a raw YUYV frame (CAP_PROP_CONVERT_RGB off).
+
+    YUYV packs two pixels into Y0 U Y1 V, so chroma has half the horizontal
+    resolution; Cr (V) is widened back to full width to line up with luma.
+    Pass buffers to have them filled instead of allocated.
+    """
+    luma = cv2.cvtColor(raw.reshape(height, width, 2), cv2.COLOR_YUV2GRAY_YUYV, dst=luma)
+    cr_half = cv2.extractChannel(raw.reshape(height, width // 2, 4), 3, dst=cr_half)
+    cr = cv2.resize(cr_half, (width, height), dst=cr, interpolation=cv2.INTER_NEAREST)
+    return luma, cr
+
+def yuyv_to_bgr(raw, width, height):
+    """Full-colour view of a raw YUYV frame (only needed for display)."""
+    return cv2.cvtColor(raw.reshape(height, width, 2), cv2.COLOR_YUV2BGR_YUYV)